@@ -1,23 +1,12 @@
 import json
-import re
-import sys
-from groq import Groq
-from config import GROQ_API_KEY, user_histories
+from contextlib import aclosing
+from typing import Awaitable, Callable, List, Optional
+from dialogue_history import history_manager
 from utils import load_system_prompt, log_message, combine_character_prompt
+from llm_client import llm_client, PRIORITY_BACKGROUND
+from response_validator import TELEGRAM_MAX_MESSAGE_LENGTH, StreamingValidator, find_corruption
 
-# Initialize the Groq API client
-if not GROQ_API_KEY:
-    print("WARNING: GROQ_API_KEY not configured. Groq-powered features will be disabled.", file=sys.stderr)
-    client = None
-else:
-    try:
-        client = Groq(api_key=GROQ_API_KEY)
-    except Exception as exc:
-        print(f"WARNING: Failed to initialise Groq client: {exc}. Features will be disabled.", file=sys.stderr)
-        client = None
-
-# Telegram's message length limit
-TELEGRAM_MAX_MESSAGE_LENGTH = 4096
+WORD_SPOTTER_PROMPT_FILE = "prompts/prompt_lexicographer.md"
 
 def validate_ai_response(response: str, character_key: str = None) -> tuple[bool, str]:
     """
@@ -35,69 +24,12 @@ def validate_ai_response(response: str, character_key: str = None) -> tuple[bool
         response = response[:TELEGRAM_MAX_MESSAGE_LENGTH-50] + "..."
         return True, response
     
-    # Check for suspiciously long responses that might indicate corruption
-    if len(response) > 2000:
-        # For longer responses, do additional corruption checks
-        char_variety = len(set(response.replace(' ', '').replace('\n', '').replace('\t', '')))
-        if char_variety < 20:  # Very low character variety suggests repetition
-            print(f"WARNING: Suspiciously long response with low character variety ({char_variety} unique chars)")
-            return False, _get_fallback_response(character_key)
-    
-    # Check for corruption patterns
-    corruption_patterns = [
-        # Excessive repetition of random words
-        r'\b(\w+)(\s+\1){10,}',  # Same word repeated 10+ times
-        # Random code-like patterns
-        r'(BuilderFactory|externalActionCode|RODUCTION|\.visitInsn){5,}',
-        # Excessive dashes or special characters
-        r'[-]{20,}',
-        # Random programming terms repeated
-        r'(PSI|MAV|Basel|Toastr|contaminants|roscope){5,}',
-        # Excessive parentheses or brackets
-        r'[\(\)\[\]]{10,}',
-        # Excessive quotes (new pattern for the reported issue)
-        r'["\'"]{15,}',  # 15+ consecutive quote characters
-        # Repeated test/option strings (new pattern)
-        r'(test){8,}',  # "test" repeated 8+ times
-        r'(option){8,}',  # "option" repeated 8+ times
-        # Comma-separated repeated words (new pattern)
-        r'("[^"]*",\s*){20,}',  # 20+ comma-separated quoted items
-        # Excessive commas
-        r'[,]{10,}',  # 10+ consecutive commas
-    ]
-    
-    for pattern in corruption_patterns:
-        if re.search(pattern, response, re.IGNORECASE):
-            print(f"WARNING: Corrupted AI response detected (pattern: {pattern[:20]}...)")
-            print(f"Corrupted response preview: {response[:200]}...")
-            return False, _get_fallback_response(character_key)
-    
-    # Check for excessive repetition of any phrase
-    words = response.split()
-    if len(words) > 50:  # Only check longer responses
-        # Look for phrases repeated more than 5 times
-        for i in range(len(words) - 2):
-            phrase = ' '.join(words[i:i+3])
-            if response.count(phrase) > 5:
-                print(f"WARNING: Excessive phrase repetition detected: '{phrase}'")
-                return False, _get_fallback_response(character_key)
-    
-    # Check for reasonable character-to-word ratio (detect gibberish)
-    if len(words) > 10:
-        avg_word_length = len(response.replace(' ', '')) / len(words)
-        if avg_word_length > 15:  # Unusually long average word length
-            print(f"WARNING: Suspicious word length pattern (avg: {avg_word_length})")
-            return False, _get_fallback_response(character_key)
-    
-    # Check for incomplete or cut-off responses that might indicate corruption
-    suspicious_endings = [
-        'AssistantClass', '<|python_tag|>', '<|reserved_special_token_', '"}"}"}"}',
-        'scalablytyped', 'надлеж', 'кто-то', '...",",",",",",",",",",",",",",",",",",",",'
-    ]
-    for ending in suspicious_endings:
-        if ending.lower() in response.lower():
-            print(f"WARNING: Suspicious token/pattern detected: '{ending[:20]}...'")
-            return False, _get_fallback_response(character_key)
+    # Single-pass corruption checks (see response_validator)
+    problem = find_corruption(response)
+    if problem:
+        print(f"WARNING: Corrupted AI response detected ({problem})")
+        print(f"Corrupted response preview: {response[:200]}...")
+        return False, _get_fallback_response(character_key)
     
     return True, response
 
@@ -118,129 +50,187 @@ def _get_fallback_response(character_key: str = None) -> str:
 
 def clear_user_conversation_history(user_id: int):
     """Clears conversation history for a user, useful when corruption is detected."""
-    history_key = str(user_id)
-    if history_key in user_histories:
-        print(f"WARNING: Clearing conversation history for user {user_id} due to corruption")
-        user_histories[history_key] = []
-        log_message(user_id, "history_cleared", "Conversation history cleared due to AI corruption", None)
+    print(f"WARNING: Clearing conversation history for user {user_id} due to corruption")
+    history_manager.clear(user_id)
+    log_message(user_id, "history_cleared", "Conversation history cleared due to AI corruption", None)
+
 
 
+def _build_dialogue_messages(user_id, user_message: str, system_prompt: str, character_key: str = None) -> list:
+    """Builds the completion messages: the character's system prompt, budgeted history, user message.
+
+    The system prompt comes from prompt_registry and already tells the model
+    which character it is speaking as.
+    """
+    messages = [{"role": "system", "content": system_prompt}]
+    messages.extend(history_manager.build_messages(user_id, character_key))
+    messages.append({"role": "user", "content": user_message})
+    return messages
 
-async def ask_for_dialogue(user_id, user_message: str, system_prompt: str, character_key: str = None) -> str:
-    """The main function for all dialogue-based AI calls. Always expects and returns a simple string."""
-    # Use shared conversation history so characters can see what others have said
-    # but enhance the system prompt to clearly identify the speaking character
-    history_key = str(user_id)
+def _clean_dialogue_reply(user_id, character_key: str, assistant_reply: str) -> Optional[str]:
+    """Validates and cleans a raw completion. Returns None for an empty completion."""
+    if not assistant_reply or assistant_reply.strip() == "":
+        print(f"WARNING: Empty response from AI for user {user_id}")
+        return None
     
-    if history_key not in user_histories:
-        user_histories[history_key] = []
+    # Validate the AI response for corruption and excessive length
+    is_valid, validated_response = validate_ai_response(assistant_reply, character_key)
+    if not is_valid:
+        print(f"WARNING: AI response validation failed for user {user_id}, using fallback")
+        log_message(user_id, "ai_validation_failed", f"Original response preview: {assistant_reply[:200]}...", None)
+        
+        # Clear conversation history more aggressively when corruption is detected
+        # Lowered threshold from 5000 to 2000 chars, and also clear on certain patterns
+        should_clear_history = (
+            len(assistant_reply) > 2000 or  # Long corrupted responses
+            '"""""""' in assistant_reply or  # Quote repetition pattern
+            'testtesttest' in assistant_reply or  # Test repetition pattern
+            'optionoptionoption' in assistant_reply or  # Option repetition pattern
+            assistant_reply.count(',') > 50  # Excessive commas
+        )
+        
+        if should_clear_history:
+            print(f"WARNING: Severe AI corruption detected for user {user_id}, clearing conversation history")
+            clear_user_conversation_history(user_id)
+        
+        assistant_reply = validated_response
+    else:
+        assistant_reply = validated_response
     
-    # Enhance system prompt with character identity reminder
+    # Clean up any character name prefixes from the response
     if character_key:
+        # Remove patterns like "tim: ", "fiona: ", "Tim Kane: ", etc.
         from config import CHARACTER_DATA  # Local import to avoid circular dependency
         char_data = CHARACTER_DATA.get(character_key, {})
         char_name = char_data.get("full_name", character_key)
-        enhanced_system_prompt = f"{system_prompt}\n\nIMPORTANT: You are {char_name}. You must respond ONLY as {char_name}, speaking in first person about YOUR OWN experiences and observations. Do not speak for other characters or describe their actions."
+        
+        # Try to remove various patterns of character name prefixes
+        patterns_to_remove = [
+            f"[{character_key}]: ",
+            f"[{character_key.lower()}]: ",
+            f"[{character_key.upper()}]: ",
+            f"[{char_name}]: ",
+            f"{character_key}: ",
+            f"{character_key.lower()}: ",
+            f"{character_key.upper()}: ",
+            f"{char_name}: ",
+            f"*{char_name}:* ",
+            f"**{char_name}:** ",
+        ]
+        
+        for pattern in patterns_to_remove:
+            if assistant_reply.startswith(pattern):
+                assistant_reply = assistant_reply[len(pattern):].strip()
+                break
+    return assistant_reply
+
+def _record_dialogue(user_id, user_message: str, character_key: str, assistant_reply: str, private: bool = False):
+    """Appends an exchange to the public thread or the character's private thread, tagged with the speaker."""
+    # Store the conversation with character identification
+    if character_key:
+        tagged_user_message = f"[Detective to {character_key}]: {user_message}"
+        tagged_assistant_reply = f"[{character_key}]: {assistant_reply}"
     else:
-        enhanced_system_prompt = system_prompt
-    
-    messages = [{"role": "system", "content": enhanced_system_prompt}]
-    messages.extend(user_histories[history_key][-10:])
-    messages.append({"role": "user", "content": user_message})
+        tagged_user_message = user_message
+        tagged_assistant_reply = assistant_reply
+        
+    # Older turns beyond the history limit are folded into the rolling summary
+    history_manager.append(user_id, [
+        {"role": "user", "content": tagged_user_message}, 
+        {"role": "assistant", "content": tagged_assistant_reply}
+    ], character_key, private)
+
+async def _finish_dialogue_reply(user_id, user_message: str, character_key: str, assistant_reply: str,
+                                 history_turn: Optional[Callable[[], Awaitable]] = None,
+                                 private: bool = False) -> str:
+    """Cleans a raw completion and records the exchange once it is this reply's turn in the history."""
+    reply = _clean_dialogue_reply(user_id, character_key, assistant_reply)
+    if reply is None:
+        return "I'm not sure how to respond to that."
+    if history_turn is not None:
+        await history_turn()
+    _record_dialogue(user_id, user_message, character_key, reply, private)
+    return reply
+
+async def ask_for_dialogue(user_id, user_message: str, system_prompt: str, character_key: str = None,
+                           history_turn: Optional[Callable[[], Awaitable]] = None, private: bool = False) -> str:
+    """The main function for all dialogue-based AI calls. Always expects and returns a simple string.
+
+    ``history_turn`` is awaited before the exchange is appended to the shared
+    history, so replies generated concurrently are still recorded in order.
+    With ``private`` set the exchange goes to the character's private thread,
+    which no other character sees.
+    """
+    messages = _build_dialogue_messages(user_id, user_message, system_prompt, character_key)
     
-    if client is None:
-        return False, _get_fallback_response(character_key), []
+    if not llm_client.available:
+        return _get_fallback_response(character_key)
 
     try:
-        chat_completion = client.chat.completions.create(model="llama-3.3-70b-versatile", messages=messages, temperature=0.7)  # Reduced from 0.8 for more stability
-        assistant_reply = chat_completion.choices[0].message.content
-        
-        if not assistant_reply or assistant_reply.strip() == "":
-            print(f"WARNING: Empty response from AI for user {user_id}")
-            return "I'm not sure how to respond to that."
-        
-        # Validate the AI response for corruption and excessive length
-        is_valid, validated_response = validate_ai_response(assistant_reply, character_key)
-        if not is_valid:
-            print(f"WARNING: AI response validation failed for user {user_id}, using fallback")
-            log_message(user_id, "ai_validation_failed", f"Original response preview: {assistant_reply[:200]}...", None)
-            
-            # Clear conversation history more aggressively when corruption is detected
-            # Lowered threshold from 5000 to 2000 chars, and also clear on certain patterns
-            should_clear_history = (
-                len(assistant_reply) > 2000 or  # Long corrupted responses
-                '"""""""' in assistant_reply or  # Quote repetition pattern
-                'testtesttest' in assistant_reply or  # Test repetition pattern
-                'optionoptionoption' in assistant_reply or  # Option repetition pattern
-                assistant_reply.count(',') > 50  # Excessive commas
-            )
-            
-            if should_clear_history:
-                print(f"WARNING: Severe AI corruption detected for user {user_id}, clearing conversation history")
-                clear_user_conversation_history(user_id)
-            
-            assistant_reply = validated_response
-        else:
-            assistant_reply = validated_response
-        
-        # Clean up any character name prefixes from the response
-        if character_key:
-            # Remove patterns like "tim: ", "fiona: ", "Tim Kane: ", etc.
-            from config import CHARACTER_DATA  # Local import to avoid circular dependency
-            char_data = CHARACTER_DATA.get(character_key, {})
-            char_name = char_data.get("full_name", character_key)
-            
-            # Try to remove various patterns of character name prefixes
-            patterns_to_remove = [
-                f"[{character_key}]: ",
-                f"[{character_key.lower()}]: ",
-                f"[{character_key.upper()}]: ",
-                f"[{char_name}]: ",
-                f"{character_key}: ",
-                f"{character_key.lower()}: ",
-                f"{character_key.upper()}: ",
-                f"{char_name}: ",
-                f"*{char_name}:* ",
-                f"**{char_name}:** ",
-            ]
-            
-            for pattern in patterns_to_remove:
-                if assistant_reply.startswith(pattern):
-                    assistant_reply = assistant_reply[len(pattern):].strip()
-                    break
-        
-        # Store the conversation with character identification
-        if character_key:
-            tagged_user_message = f"[Detective to {character_key}]: {user_message}"
-            tagged_assistant_reply = f"[{character_key}]: {assistant_reply}"
-        else:
-            tagged_user_message = user_message
-            tagged_assistant_reply = assistant_reply
-            
-        user_histories[history_key].extend([
-            {"role": "user", "content": tagged_user_message}, 
-            {"role": "assistant", "content": tagged_assistant_reply}
-        ])
-        if len(user_histories[history_key]) > 20: 
-            user_histories[history_key] = user_histories[history_key][-20:]
-        return assistant_reply
+        assistant_reply = await llm_client.complete(messages, temperature=0.7)  # Reduced from 0.8 for more stability
+        return await _finish_dialogue_reply(user_id, user_message, character_key, assistant_reply, history_turn, private)
     except Exception as e:
         print(f"ERROR: Failed in ask_for_dialogue for user {user_id}: {e}")
         log_message(user_id, "dialogue_error", f"ask_for_dialogue failed: {e}", None)
         return "Sorry, a server error occurred."
 
-async def ask_tutor_for_analysis(user_id: int, text_to_analyze: str) -> dict:
-    """A special function that calls the Tutor for text analysis and expects a JSON response."""
+async def stream_dialogue(user_id, user_message: str, system_prompt: str, character_key: str = None,
+                          history_turn: Optional[Callable[[], Awaitable]] = None, private: bool = False):
+    """Streaming variant of ask_for_dialogue.
+
+    Yields ("delta", text) for each generated chunk and finally ("done", reply),
+    where reply is exactly what ask_for_dialogue would have returned. Deltas are
+    raw model output; the final reply is validated and cleaned, so clients
+    should replace the streamed text with it. A generation that starts to look
+    corrupted is abandoned early and the fallback is returned instead.
+    """
+    messages = _build_dialogue_messages(user_id, user_message, system_prompt, character_key)
+
+    if not llm_client.available:
+        yield "done", _get_fallback_response(character_key)
+        return
+
+    validator = StreamingValidator()
+    try:
+        # Closing the stream when we stop early releases the LLM slot and the connection right away
+        async with aclosing(llm_client.stream(messages, temperature=0.7)) as deltas:
+            async for delta in deltas:
+                if not validator.feed(delta):
+                    print(f"WARNING: Streamed AI response for user {user_id} looks corrupted ({validator.problem}), stopping early")
+                    break
+                yield "delta", delta
+        if validator.problem:
+            log_message(user_id, "ai_validation_failed", f"Original response preview: {validator.text[:200]}...", None)
+            reply = _get_fallback_response(character_key)
+        else:
+            reply = await _finish_dialogue_reply(user_id, user_message, character_key, validator.text, history_turn, private)
+    except Exception as e:
+        print(f"ERROR: Failed in stream_dialogue for user {user_id}: {e}")
+        log_message(user_id, "dialogue_error", f"stream_dialogue failed: {e}", None)
+        reply = "Sorry, a server error occurred."
+    yield "done", reply
+
+async def ask_tutor_for_analysis(user_id: int, text_to_analyze: str, raise_errors: bool = False) -> dict:
+    """A special function that calls the Tutor for text analysis and expects a JSON response.
+
+    Runs at background LLM priority. With ``raise_errors``, a failed LLM call
+    is raised instead of reported as "no improvement needed", so a background
+    job can retry it.
+    """
     from config import CHARACTER_DATA # Local import to avoid circular dependency
     tutor_prompt = load_system_prompt(CHARACTER_DATA["tutor"]["prompt_file"])
     analysis_request = f"Analyze this text: '{text_to_analyze}'"
     messages = [{"role": "system", "content": tutor_prompt}, {"role": "user", "content": analysis_request}]
-    if client is None:
+    if not llm_client.available:
+        return {"improvement_needed": False, "feedback": ""}
+    try:
+        response_text = await llm_client.complete(messages, temperature=0.5, priority=PRIORITY_BACKGROUND)
+    except Exception as e:
+        if raise_errors:
+            raise
+        log_message(user_id, "tutor_error", f"Tutor analysis call failed: {e}", None)
         return {"improvement_needed": False, "feedback": ""}
     try:
-        chat_completion = client.chat.completions.create(model="llama-3.3-70b-versatile", messages=messages, temperature=0.5)
-        response_text = chat_completion.choices[0].message.content
-        
         # Validate response for corruption
         is_valid, validated_response = validate_ai_response(response_text)
         if not is_valid:
@@ -253,21 +243,87 @@ async def ask_tutor_for_analysis(user_id: int, text_to_analyze: str) -> dict:
         log_message(user_id, "tutor_error", f"Could not parse tutor analysis JSON: {e}", None)
         return {"improvement_needed": False, "feedback": ""}
 
-async def ask_tutor_for_explanation(user_id: int, text_to_explain: str, original_message: str = "") -> dict:
-    """A special function that calls the Tutor for an explanation and expects a JSON response."""
+async def ask_tutor_for_batch_analysis(texts: List[str]) -> List[dict]:
+    """Analyzes several texts in one Tutor call. Returns one analysis dict per text, in order.
+
+    Used by background jobs, so a failed call or an unusable response is raised
+    and the job is retried. That includes a response that leaves a text out,
+    so no text is recorded as analyzed without a result.
+    """
+    from config import CHARACTER_DATA # Local import to avoid circular dependency
+    tutor_prompt = load_system_prompt(CHARACTER_DATA["tutor"]["prompt_file"])
+    numbered = [{"id": index, "text": text} for index, text in enumerate(texts, start=1)]
+    analysis_request = (
+        "Analyze each of these texts separately, as in Task 1: "
+        f"{json.dumps(numbered, ensure_ascii=False)}\n"
+        "Respond ONLY with a JSON object with one key, \"results\": an array with one object per text, "
+        "each with the keys \"id\" (the text's id), \"improvement_needed\" (boolean) and \"feedback\" (string)."
+    )
+    messages = [{"role": "system", "content": tutor_prompt}, {"role": "user", "content": analysis_request}]
+    no_feedback = {"improvement_needed": False, "feedback": ""}
+    if not llm_client.available:
+        return [dict(no_feedback) for _ in texts]
+    
+    response_text = await llm_client.complete(messages, temperature=0.5, priority=PRIORITY_BACKGROUND)
+    # Not validate_ai_response: its length cap would cut a long batch response in half
+    problem = find_corruption(response_text or "")
+    if problem:
+        raise ValueError(f"Corrupted tutor batch response ({problem})")
+    results = json.loads(response_text[response_text.find("{"):response_text.rfind("}") + 1]).get("results")
+    if not isinstance(results, list):
+        raise ValueError("Tutor batch response has no results array")
+    
+    by_id = {}
+    for result in results:
+        if not isinstance(result, dict):
+            continue
+        # Models often return the id as a string ("1")
+        try:
+            by_id[int(str(result.get("id")).strip())] = result
+        except ValueError:
+            continue
+    missing = [index for index in range(1, len(texts) + 1) if index not in by_id]
+    if missing:
+        raise ValueError(f"Tutor batch response has no results for ids {missing}")
+    return [by_id[index] for index in range(1, len(texts) + 1)]
+
+async def ask_tutor_for_explanation(user_id: int, text_to_explain: str, original_message: str = "",
+                                    language_level: str = None) -> dict:
+    """A special function that calls the Tutor for an explanation and expects a JSON response.
+
+    Explanations are shared across participants through explanation_cache, and
+    concurrent requests for the same explanation share one tutor call.
+    """
+    from config import CHARACTER_DATA
+    from explanation_cache import explanation_cache
+    from prompt_registry import prompt_registry
+    from single_flight import make_key, single_flight
+    
+    cache_key = explanation_cache.make_key(text_to_explain, original_message, language_level,
+                                           prompt_registry.file_hash(CHARACTER_DATA["tutor"]["prompt_file"]))
+    return await single_flight.run(
+        make_key("ask_tutor_for_explanation", cache_key),
+        lambda: _explain(user_id, text_to_explain, original_message, cache_key),
+    )
+
+async def _explain(user_id: int, text_to_explain: str, original_message: str, cache_key: str) -> dict:
     from config import CHARACTER_DATA
+    from explanation_cache import explanation_cache
     tutor_prompt = load_system_prompt(CHARACTER_DATA["tutor"]["prompt_file"])
     
+    cached = await explanation_cache.get(cache_key)
+    if cached is not None:
+        return cached
+    
     explanation_request = f"Please explain the meaning of: '{text_to_explain}'."
     if original_message:
         explanation_request += f" Original message: '{original_message}'"
         
     messages = [{"role": "system", "content": tutor_prompt}, {"role": "user", "content": explanation_request}]
-    if client is None:
+    if not llm_client.available:
         return {}
     try:
-        chat_completion = client.chat.completions.create(model="llama-3.3-70b-versatile", messages=messages, temperature=0.5)
-        response_text = chat_completion.choices[0].message.content
+        response_text = await llm_client.complete(messages, temperature=0.5)
         
         # Validate response for corruption
         is_valid, validated_response = validate_ai_response(response_text)
@@ -276,7 +332,10 @@ async def ask_tutor_for_explanation(user_id: int, text_to_explain: str, original
             log_message(user_id, "tutor_validation_failed", f"Corrupted tutor response: {response_text[:200]}...", None)
             return {}
         
-        return json.loads(validated_response)
+        explanation = json.loads(validated_response)
+        if isinstance(explanation, dict) and explanation:
+            await explanation_cache.put(cache_key, explanation)
+        return explanation
     except (json.JSONDecodeError, Exception) as e:
         log_message(user_id, "tutor_error", f"Could not parse tutor explanation JSON: {e}", None)
         return {}
@@ -309,11 +368,10 @@ async def ask_tutor_for_final_summary(user_id: int, progress_data: dict) -> dict
         summary_request += ". Please provide a warm summary using the good-areas to improve-good structure."
     
     messages = [{"role": "system", "content": tutor_prompt}, {"role": "user", "content": summary_request}]
-    if client is None:
+    if not llm_client.available:
         return {"summary": "Great job completing the game! You showed curiosity and engagement with English. Keep practicing and you'll continue to improve!"}
     try:
-        chat_completion = client.chat.completions.create(model="llama-3.3-70b-versatile", messages=messages, temperature=0.7)
-        response_text = chat_completion.choices[0].message.content
+        response_text = await llm_client.complete(messages, temperature=0.7)
         
         # Validate response for corruption
         is_valid, validated_response = validate_ai_response(response_text)
@@ -329,14 +387,24 @@ async def ask_tutor_for_final_summary(user_id: int, progress_data: dict) -> dict
 
 
 async def ask_word_spotter(text_to_analyze: str) -> list:
-    """Asks the Word Spotter AI to find difficult words in a text."""
-    prompt = load_system_prompt("prompts/prompt_lexicographer.md")
+    """Asks the Word Spotter AI to find difficult words in a text.
+
+    Concurrent requests for the same text share one call.
+    """
+    from prompt_registry import prompt_registry
+    from single_flight import make_key, single_flight
+    
+    key = make_key("ask_word_spotter", " ".join(text_to_analyze.split()),
+                   prompt_registry.file_hash(WORD_SPOTTER_PROMPT_FILE))
+    return await single_flight.run(key, lambda: _spot_words(text_to_analyze))
+
+async def _spot_words(text_to_analyze: str) -> list:
+    prompt = load_system_prompt(WORD_SPOTTER_PROMPT_FILE)
     messages = [{"role": "system", "content": prompt}, {"role": "user", "content": text_to_analyze}]
-    if client is None:
+    if not llm_client.available:
         return []
     try:
-        chat_completion = client.chat.completions.create(model="llama-3.3-70b-versatile", messages=messages, temperature=0.2)
-        response_text = chat_completion.choices[0].message.content
+        response_text = await llm_client.complete(messages, temperature=0.2)
         
         # Validate response for corruption
         is_valid, validated_response = validate_ai_response(response_text)
@@ -351,7 +419,12 @@ async def ask_word_spotter(text_to_analyze: str) -> list:
         print(f"Error calling Word Spotter or parsing JSON: {e}"); return []
 
 async def ask_director(user_id: int, context_text: str, message: str) -> dict:
-    """Asks the Director LLM for the next scene and returns it as a dictionary."""
+    """Asks the Director LLM for the next scene and returns it as a dictionary.
+
+    user_id is the participant code. Director decisions are logged to the
+    participant's chat history next to the player message, where the
+    classifier trainer pairs them.
+    """
     from predefined_responses import try_predefined_response
     from config import GAME_STATE
     
@@ -367,7 +440,7 @@ async def ask_director(user_id: int, context_text: str, message: str) -> dict:
         
         if predefined_response:
             print(f"DEBUG: Using predefined response for user {user_id}: {predefined_response}")
-            log_message(user_id, "director_predefined", f"Used predefined response for message: {message[:100]}", None)
+            log_message(0, "director_predefined", f"Used predefined response for message: {message[:100]}", user_id)
             return predefined_response
         else:
             print(f"DEBUG: No predefined response found for user {user_id}, falling back to AI director")
@@ -377,24 +450,29 @@ async def ask_director(user_id: int, context_text: str, message: str) -> dict:
         traceback.print_exc()
         # Continue to AI director as fallback
     
+    # Then the local intent classifier; uncertain messages go to the AI director
+    from director_classifier import director_classifier
+    local_decision, predicted_label, confidence = director_classifier.decide(message)
+    if local_decision:
+        print(f"DEBUG: Director classifier predicted '{predicted_label}' ({confidence:.2f}) for user {user_id}")
+        log_message(0, "director_local", f"Predicted {predicted_label} ({confidence:.2f}) for message: {message[:100]}", user_id)
+        return local_decision
+    
     # Fallback to AI Director
     director_prompt = load_system_prompt("prompts/prompt_director.md")
     full_context_for_director = f"Context: \"{context_text}\"\nMessage: \"{message}\""
     director_messages = [{"role": "system", "content": director_prompt}, {"role": "user", "content": full_context_for_director}]
     try:
-        if client is None:
-            raise RuntimeError("Groq client not available")
         print(f"DEBUG: Calling director for user {user_id} with context: {context_text[:100]}...")
-        chat_completion = client.chat.completions.create(model="llama-3.3-70b-versatile", messages=director_messages, temperature=0.5)
-        response_text = chat_completion.choices[0].message.content
+        response_text = await llm_client.complete(director_messages, temperature=0.5)
         print(f"DEBUG: Director raw response for user {user_id}: {response_text[:200]}...")
-        log_message(user_id, "director", response_text, None)
+        log_message(0, "director", response_text, user_id)
         
         # Validate response for corruption before parsing JSON
         is_valid, validated_response = validate_ai_response(response_text)
         if not is_valid:
             print(f"WARNING: Director response validation failed for user {user_id}")
-            log_message(user_id, "director_validation_failed", f"Corrupted director response: {response_text[:200]}...", None)
+            log_message(0, "director_validation_failed", f"Corrupted director response: {response_text[:200]}...", user_id)
             return {"scene": []}
         
         # Try to parse the JSON response
@@ -415,15 +493,16 @@ async def ask_director(user_id: int, context_text: str, message: str) -> dict:
                 print(f"ERROR: Director 'scene' is not a list: {type(director_decision['scene'])}")
                 return {"scene": []}
             
+            director_classifier.record_shadow(predicted_label, confidence, director_decision)
             return director_decision
             
         except json.JSONDecodeError as json_error:
             print(f"ERROR: Failed to parse director JSON response: {json_error}")
             print(f"Director response text: {response_text}")
-            log_message(user_id, "director_error", f"JSON parse error: {json_error}. Response: {response_text[:500]}", None)
+            log_message(0, "director_error", f"JSON parse error: {json_error}. Response: {response_text[:500]}", user_id)
             return {"scene": []}
             
     except Exception as e:
         print(f"ERROR: Failed to call director: {e}")
-        log_message(user_id, "director_error", f"Director call failed: {e}", None)
+        log_message(0, "director_error", f"Director call failed: {e}", user_id)
         return {"scene": []}
\ No newline at end of file
@@ -0,0 +1,82 @@
+"""
+Batching of tutor text analysis.
+
+Instead of one tutor call (with the whole tutor prompt) per player message,
+messages from all participants are collected for a short window and analyzed
+together in one background job. The batch is sent when the window closes or
+when it reaches TUTOR_BATCH_MAX_MESSAGES. Each submitted message still gets
+its own future resolving to its feedback.
+"""
+
+import asyncio
+import logging
+import uuid
+from typing import Any, Dict, List, Optional, Tuple
+
+from config import TUTOR_BATCH_MAX_MESSAGES, TUTOR_BATCH_WINDOW_SECONDS
+from job_queue import job_queue
+
+logger = logging.getLogger(__name__)
+
+BATCH_JOB_KIND = "text_analysis_batch"
+
+
+class AnalysisBatcher:
+    """Collects texts into batch jobs on the background job queue."""
+
+    def __init__(self, queue=job_queue, window: float = TUTOR_BATCH_WINDOW_SECONDS,
+                 max_messages: int = TUTOR_BATCH_MAX_MESSAGES):
+        self._queue = queue
+        self.window = window
+        self.max_messages = max(1, max_messages)
+        self._pending: List[Tuple[Dict[str, Any], asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self.stats = {"messages": 0, "batches": 0, "dropped": 0}
+
+    def submit(self, participant_code: str, text: str) -> asyncio.Future:
+        """Add a text to the current batch. The future resolves to its feedback, or None."""
+        loop = asyncio.get_running_loop()
+        item = {"id": uuid.uuid4().hex, "participant_code": participant_code, "text": text}
+        future = loop.create_future()
+        self._pending.append((item, future))
+        self.stats["messages"] += 1
+        if len(self._pending) >= self.max_messages:
+            self.flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window, self.flush)
+        return future
+
+    def flush(self):
+        """Send the collected texts as one batch job now."""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if not batch:
+            return
+
+        job = self._queue.submit(BATCH_JOB_KIND, items=[item for item, _ in batch])
+        if job is None:
+            self.stats["dropped"] += len(batch)
+            for _, future in batch:
+                if not future.done():
+                    future.set_result(None)
+            return
+        self.stats["batches"] += 1
+
+        def deliver(done: asyncio.Future):
+            results = done.result() or {}
+            for item, future in batch:
+                if not future.done():
+                    future.set_result(results.get(item["id"]))
+        job.add_done_callback(deliver)
+
+    def get_stats(self) -> Dict[str, Any]:
+        batches = self.stats["batches"]
+        sent = self.stats["messages"] - self.stats["dropped"] - len(self._pending)
+        return dict(self.stats, pending=len(self._pending),
+                    avg_batch_size=round(sent / batches, 2) if batches else None)
+
+
+# Global instance
+analysis_batcher = AnalysisBatcher()
@@ -0,0 +1,143 @@
+"""
+Local pre-filter deciding whether a player message needs tutor analysis.
+
+Runs before a grammar analysis job is queued and skips messages the tutor
+has nothing useful to say about:
+
+- too short: fewer than TUTOR_FILTER_MIN_WORDS words once character names
+  are removed ("yes", "ok", "Tim, why?");
+- unrecognized: most words are not English words known to the game (the
+  vocabulary of the game texts and prompts plus common function words), e.g.
+  a message in another language or keyboard mashing; the tutor is told to
+  ignore typos anyway;
+- duplicate: the participant already had the same normalized text analyzed.
+  Texts are recorded as analyzed by the analysis job once it succeeds
+  (mark_analyzed), so a text whose job failed is analyzed again next time.
+"""
+
+import logging
+import os
+import re
+from typing import Any, Dict, Optional, Set
+
+from bounded_store import BoundedStore
+from config import (
+    CHARACTER_DATA,
+    SUSPECT_KEYS,
+    TUTOR_FILTER_CACHE_ENTRIES,
+    TUTOR_FILTER_ENABLED,
+    TUTOR_FILTER_MIN_KNOWN_RATIO,
+    TUTOR_FILTER_MIN_WORDS,
+)
+
+logger = logging.getLogger(__name__)
+
+_BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+_VOCABULARY_DIRS = ("game_texts", "prompts")
+_WORD = re.compile(r"[^\W\d_]+(?:'[^\W\d_]+)?")
+
+_COMMON_WORDS = set("""
+a about after again all am an and any are as at be because been before being both but by can could did do
+does doing done down during each few for from had has have having he her here hers him his how i if in into
+is it its just me more most my no nor not now of off on once only or other our out over own same she should
+so some such than that the their them then there these they this those through to too under until up very
+was we were what when where which while who whom why will with would you your yours yes ok okay hi hello
+thanks thank please sorry
+""".split())
+
+
+def normalize_text(text: str) -> str:
+    return " ".join(word.lower() for word in _WORD.findall(text or ""))
+
+
+def singular(word: str) -> str:
+    """The word without a single possessive or plural suffix ("clues" -> "clue", "class" stays)."""
+    if word.endswith("'s"):
+        return word[:-2]
+    if word.endswith("ies") and len(word) > 4:
+        return word[:-3] + "y"
+    if word.endswith("es") and word[:-2].endswith(("s", "x", "z", "ch", "sh")):
+        return word[:-2]
+    if word.endswith("s") and not word.endswith(("ss", "us")) and len(word) > 3:
+        return word[:-1]
+    return word
+
+
+class AnalysisFilter:
+    """Decides per message whether the LLM grammar analysis is worth running, and counts the outcomes."""
+
+    def __init__(self, enabled: bool = TUTOR_FILTER_ENABLED, min_words: int = TUTOR_FILTER_MIN_WORDS,
+                 min_known_ratio: float = TUTOR_FILTER_MIN_KNOWN_RATIO,
+                 cache_entries: int = TUTOR_FILTER_CACHE_ENTRIES):
+        self.enabled = enabled
+        self.min_words = min_words
+        self.min_known_ratio = min_known_ratio
+        self._analyzed = BoundedStore("analyzed_texts", max_entries=cache_entries)
+        self._vocabulary: Optional[Set[str]] = None
+        self._names = {part.lower() for char_key in SUSPECT_KEYS
+                       for part in [char_key] + CHARACTER_DATA[char_key]["full_name"].split()}
+        self.stats = {"checked": 0, "analyzed": 0, "skipped_short": 0, "skipped_unrecognized": 0,
+                      "skipped_duplicate": 0}
+
+    def _load_vocabulary(self) -> Set[str]:
+        if self._vocabulary is None:
+            vocabulary = set(_COMMON_WORDS)
+            for directory in _VOCABULARY_DIRS:
+                for root, _, names in os.walk(os.path.join(_BASE_DIR, directory)):
+                    for name in names:
+                        if not name.endswith((".txt", ".md")):
+                            continue
+                        try:
+                            with open(os.path.join(root, name), "r", encoding="utf-8-sig") as file:
+                                vocabulary.update(normalize_text(file.read()).split())
+                        except OSError as e:
+                            logger.warning(f"Could not read {name} for the analysis filter vocabulary: {e}")
+            self._vocabulary = vocabulary
+            logger.info(f"Analysis filter vocabulary: {len(vocabulary)} words")
+        return self._vocabulary
+
+    def _skip_reason(self, participant_code: str, text: str) -> Optional[str]:
+        normalized = normalize_text(text)
+        words = [word for word in normalized.split() if word not in self._names]
+        if len(words) < self.min_words:
+            return "short"
+
+        vocabulary = self._load_vocabulary()
+        known = sum(1 for word in words if word in vocabulary or singular(word) in vocabulary)
+        if known / len(words) < self.min_known_ratio:
+            return "unrecognized"
+
+        if self._key(participant_code, normalized) in self._analyzed:
+            return "duplicate"
+        return None
+
+    @staticmethod
+    def _key(participant_code: str, normalized: str) -> str:
+        return f"{participant_code}\x1f{normalized}"
+
+    def should_analyze(self, participant_code: str, text: str) -> bool:
+        """True if the text should go to the tutor."""
+        if not self.enabled:
+            return True
+        self.stats["checked"] += 1
+        reason = self._skip_reason(participant_code, text)
+        if reason:
+            self.stats[f"skipped_{reason}"] += 1
+            logger.debug(f"Participant {participant_code}: skipping tutor analysis ({reason})")
+            return False
+        self.stats["analyzed"] += 1
+        return True
+
+    def mark_analyzed(self, participant_code: str, text: str):
+        """Record a successful analysis, so the same text isn't analyzed again for this participant."""
+        if self.enabled:
+            self._analyzed[self._key(participant_code, normalize_text(text))] = True
+
+    def get_stats(self) -> Dict[str, Any]:
+        checked = self.stats["checked"]
+        skipped = checked - self.stats["analyzed"]
+        return dict(self.stats, skip_rate=round(skipped / checked, 3) if checked else None)
+
+
+# Global instance
+analysis_filter = AnalysisFilter()
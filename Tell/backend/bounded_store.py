@@ -0,0 +1,165 @@
+"""
+Bounded in-memory key/value store with LRU and idle-TTL eviction.
+
+Used for the per-participant globals in config (GAME_STATE, user_histories,
+message_cache) so memory stays flat on a long-running instance instead of
+growing with total traffic.
+"""
+
+import time
+import logging
+from collections import OrderedDict
+from collections.abc import MutableMapping
+from typing import Any, Awaitable, Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class BoundedStore(MutableMapping):
+    """Dict-like store that evicts least recently used and idle entries.
+
+    Args:
+        name: Label used in log messages and stats.
+        max_entries: Maximum number of entries kept (0 = unlimited).
+        idle_ttl: Seconds after the last access before an entry expires (0 = never).
+        max_size: Maximum total size as measured by ``sizer`` (0 = unlimited).
+        sizer: Returns the size of a value; defaults to counting every entry as 1.
+        on_evict: Called as ``on_evict(key, value)`` before an entry is dropped.
+        loader: Async ``loader(key)`` used by ``get_or_load`` to reload a missing entry.
+    """
+
+    def __init__(self, name: str, max_entries: int = 0, idle_ttl: float = 0, max_size: int = 0,
+                 sizer: Optional[Callable[[Any], int]] = None,
+                 on_evict: Optional[Callable[[Any, Any], None]] = None,
+                 loader: Optional[Callable[[Any], Awaitable[Any]]] = None):
+        self.name = name
+        self.max_entries = max_entries
+        self.idle_ttl = idle_ttl
+        self.max_size = max_size
+        self.sizer = sizer
+        self.on_evict = on_evict
+        self.loader = loader
+        # key -> [value, last_access, size]; ordered from least to most recently used
+        self._entries: "OrderedDict[Any, list]" = OrderedDict()
+        self.total_size = 0
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0, "expirations": 0, "loads": 0}
+
+    def _size_of(self, value: Any) -> int:
+        if self.sizer is None:
+            return 1
+        try:
+            return max(0, int(self.sizer(value)))
+        except Exception:
+            return 1
+
+    def _is_expired(self, entry: list, now: float) -> bool:
+        return bool(self.idle_ttl) and now - entry[1] > self.idle_ttl
+
+    def _drop(self, key: Any, reason: str):
+        value, _, size = self._entries.pop(key)
+        self.total_size -= size
+        self.stats["expirations" if reason == "expired" else "evictions"] += 1
+        if self.on_evict is not None:
+            try:
+                self.on_evict(key, value)
+            except Exception as e:
+                logger.error(f"{self.name}: eviction callback failed for {key}: {e}")
+
+    def _evict(self, now: float):
+        """Drop expired entries and then least recently used ones until within bounds."""
+        # Entries are ordered by last access, so expired ones are at the front
+        while self._entries:
+            key, entry = next(iter(self._entries.items()))
+            if not self._is_expired(entry, now):
+                break
+            self._drop(key, "expired")
+        while self._entries and (
+            (self.max_entries and len(self._entries) > self.max_entries)
+            or (self.max_size and self.total_size > self.max_size and len(self._entries) > 1)
+        ):
+            key = next(iter(self._entries))
+            self._drop(key, "evicted")
+
+    def __getitem__(self, key: Any) -> Any:
+        entry = self._entries.get(key)
+        now = time.monotonic()
+        if entry is None or self._is_expired(entry, now):
+            if entry is not None:
+                self._drop(key, "expired")
+            self.stats["misses"] += 1
+            raise KeyError(key)
+        entry[1] = now
+        self._entries.move_to_end(key)
+        self.stats["hits"] += 1
+        return entry[0]
+
+    def __setitem__(self, key: Any, value: Any):
+        now = time.monotonic()
+        size = self._size_of(value)
+        old = self._entries.get(key)
+        if old is not None and self._is_expired(old, now):
+            # The expired value leaves through on_evict like any other
+            self._drop(key, "expired")
+        elif old is not None:
+            del self._entries[key]
+            self.total_size -= old[2]
+        self._entries[key] = [value, now, size]
+        self.total_size += size
+        self._evict(now)
+
+    def __delitem__(self, key: Any):
+        value, _, size = self._entries.pop(key)
+        self.total_size -= size
+
+    def __contains__(self, key: Any) -> bool:
+        entry = self._entries.get(key)
+        if entry is None:
+            return False
+        if self._is_expired(entry, time.monotonic()):
+            self._drop(key, "expired")
+            return False
+        return True
+
+    def __iter__(self):
+        return iter(list(self._entries.keys()))
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def touch(self, key: Any, value: Any = None):
+        """Re-measure an entry after it was mutated in place (e.g. a list that grew)."""
+        entry = self._entries.get(key)
+        if entry is None:
+            return
+        new_size = self._size_of(entry[0] if value is None else value)
+        self.total_size += new_size - entry[2]
+        entry[2] = new_size
+        entry[1] = time.monotonic()
+        self._entries.move_to_end(key)
+        self._evict(entry[1])
+
+    async def get_or_load(self, key: Any, default: Any = None) -> Any:
+        """Return an entry, reloading it with ``loader`` if it is missing."""
+        try:
+            return self[key]
+        except KeyError:
+            pass
+        if self.loader is None:
+            return default
+        value = await self.loader(key)
+        if value is None:
+            return default
+        # Another request may have populated the entry while we were loading
+        if key in self:
+            return self[key]
+        self.stats["loads"] += 1
+        self[key] = value
+        return value
+
+    def sweep(self):
+        """Evict expired entries without waiting for the next insert."""
+        self._evict(time.monotonic())
+
+    def get_stats(self) -> dict:
+        """Current counters plus size accounting."""
+        return dict(self.stats, entries=len(self._entries), total_size=self.total_size)
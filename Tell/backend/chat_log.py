@@ -0,0 +1,100 @@
+"""
+Buffered, append-only chat history writer.
+
+Log lines are kept in a per-participant in-memory buffer and written by a
+background flusher thread, so storage is never on the request path. Each
+flush appends the pending lines to the readable history file in one call
+(on GCS: one small segment upload plus a server-side compose), instead of
+downloading and re-uploading the whole history for every line.
+"""
+
+import atexit
+import logging
+import threading
+from typing import Dict, List
+
+from config import CHAT_LOG_FLUSH_INTERVAL_SECONDS, CHAT_LOG_MAX_BUFFERED_LINES
+from shared.backend.storage_backend import get_storage_backend
+
+logger = logging.getLogger(__name__)
+
+
+class ChatLogWriter:
+    """Buffers chat history lines per log file and appends them in batches."""
+
+    def __init__(self, flush_interval: float = CHAT_LOG_FLUSH_INTERVAL_SECONDS,
+                 max_buffered_lines: int = CHAT_LOG_MAX_BUFFERED_LINES):
+        self.flush_interval = flush_interval
+        self.max_buffered_lines = max_buffered_lines
+        self._buffers: Dict[str, List[str]] = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+        self._warned_no_storage = False
+
+    def _ensure_thread(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stopped.clear()
+            self._thread = threading.Thread(target=self._run, name="chat-log-flusher", daemon=True)
+            self._thread.start()
+
+    def append(self, blob_name: str, line: str):
+        """Queue one formatted log line for the given history file. Never blocks on I/O."""
+        with self._lock:
+            buffer = self._buffers.setdefault(blob_name, [])
+            buffer.append(line)
+            buffer_full = len(buffer) >= self.max_buffered_lines
+            self._ensure_thread()
+        if buffer_full:
+            self._wakeup.set()
+
+    def pending_lines(self) -> int:
+        """Number of lines not yet written to storage."""
+        with self._lock:
+            return sum(len(lines) for lines in self._buffers.values())
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self.flush()
+
+    def flush(self):
+        """Write every buffered line to storage. Safe to call from any thread."""
+        with self._flush_lock:
+            with self._lock:
+                pending = self._buffers
+                self._buffers = {}
+            if not pending:
+                return
+
+            storage = get_storage_backend()
+            if not storage:
+                if not self._warned_no_storage:
+                    print("WARNING: No storage backend configured. Chat logging is disabled.")
+                    self._warned_no_storage = True
+                return
+
+            for blob_name, lines in pending.items():
+                try:
+                    storage.append_text(blob_name, "".join(lines))
+                except Exception as e:
+                    print(f"[ERROR] Failed to write log to storage ({blob_name}): {e}")
+                    # Put the lines back in front of anything logged meanwhile
+                    with self._lock:
+                        self._buffers[blob_name] = lines + self._buffers.get(blob_name, [])
+
+    def close(self):
+        """Stop the flusher thread and write out everything still buffered."""
+        self._stopped.set()
+        self._wakeup.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout=self.flush_interval + 5)
+        self.flush()
+
+
+# Global instance
+chat_log_writer = ChatLogWriter()
+atexit.register(chat_log_writer.close)
@@ -1,4 +1,6 @@
+import os
 import bootstrap  # noqa: F401  # ensures shared modules are on sys.path
+from bounded_store import BoundedStore
 from shared.backend.config import (
     get_secret,
     TELEGRAM_TOKEN,
@@ -12,6 +14,120 @@ TOTAL_CLUES = 4
 # Character keys for all suspects in the game
 SUSPECT_KEYS = ["tim", "pauline", "fiona", "ronnie"]
 
+# --- LLM Client Settings ---
+# Model used for all Groq chat completions
+LLM_MODEL = os.getenv("LLM_MODEL", "llama-3.3-70b-versatile")
+# Maximum number of LLM calls in flight at once per instance
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "16"))
+# Per-call timeout in seconds (covers queueing for a slot and the request itself)
+LLM_TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT_SECONDS", "30"))
+# Size of the pooled HTTP connection pool towards the Groq API
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "32"))
+
+# --- Chat Log Settings ---
+# Seconds between background flushes of buffered chat history lines
+CHAT_LOG_FLUSH_INTERVAL_SECONDS = float(os.getenv("CHAT_LOG_FLUSH_INTERVAL_SECONDS", "5"))
+# Flush a participant's buffer early once it holds this many lines
+CHAT_LOG_MAX_BUFFERED_LINES = int(os.getenv("CHAT_LOG_MAX_BUFFERED_LINES", "50"))
+
+# --- Game State Persistence Settings ---
+# Coalesce game state saves and upload them in the background
+GAME_STATE_WRITE_BEHIND = os.getenv("GAME_STATE_WRITE_BEHIND", "true").lower() in ("1", "true", "yes")
+# Seconds to wait after the first change before uploading a participant's state
+GAME_STATE_SAVE_DELAY_SECONDS = float(os.getenv("GAME_STATE_SAVE_DELAY_SECONDS", "3"))
+# Attempts of a state upload that conflicts with a write by another instance (merged before each retry)
+GAME_STATE_SAVE_MAX_ATTEMPTS = int(os.getenv("GAME_STATE_SAVE_MAX_ATTEMPTS", "3"))
+
+# --- Scene Execution Settings ---
+# Generate independent character replies of a director scene concurrently
+SCENE_CONCURRENT_ACTIONS = os.getenv("SCENE_CONCURRENT_ACTIONS", "true").lower() in ("1", "true", "yes")
+
+# --- Prompt Settings ---
+# Recompile prompts when files under prompts/ change (development only)
+PROMPT_HOT_RELOAD = os.getenv("PROMPT_HOT_RELOAD", "false").lower() in ("1", "true", "yes")
+# Seconds between checks for changed prompt files
+PROMPT_RELOAD_INTERVAL_SECONDS = float(os.getenv("PROMPT_RELOAD_INTERVAL_SECONDS", "2"))
+
+# --- Dialogue History Settings ---
+# Tokens of shared history (summary plus recent turns) sent with each character prompt
+DIALOGUE_HISTORY_TOKEN_BUDGET = int(os.getenv("DIALOGUE_HISTORY_TOKEN_BUDGET", "1200"))
+# Per-character overrides, e.g. "narrator=600,pauline=1600"
+DIALOGUE_HISTORY_TOKEN_BUDGETS = {
+    name.strip(): int(value)
+    for name, _, value in (item.partition("=") for item in os.getenv("DIALOGUE_HISTORY_TOKEN_BUDGETS", "").split(","))
+    if name.strip() and value.strip()
+}
+# Recent turns kept verbatim; older turns are folded into the rolling summary
+DIALOGUE_HISTORY_MAX_TOKENS = int(os.getenv("DIALOGUE_HISTORY_MAX_TOKENS", "3000"))
+# Length cap and model for the rolling summary of older turns
+DIALOGUE_SUMMARY_MAX_TOKENS = int(os.getenv("DIALOGUE_SUMMARY_MAX_TOKENS", "300"))
+DIALOGUE_SUMMARY_MODEL = os.getenv("DIALOGUE_SUMMARY_MODEL", "llama-3.1-8b-instant")
+
+# --- Background Job Settings ---
+# Workers running background jobs (tutor analysis); their LLM calls yield to interactive ones
+BACKGROUND_WORKERS = int(os.getenv("BACKGROUND_WORKERS", "2"))
+# Jobs that can wait in the queue; new jobs are dropped when it is full
+BACKGROUND_QUEUE_MAX_SIZE = int(os.getenv("BACKGROUND_QUEUE_MAX_SIZE", "1000"))
+# Attempts per job and the base delay of the exponential backoff between them
+BACKGROUND_JOB_MAX_ATTEMPTS = int(os.getenv("BACKGROUND_JOB_MAX_ATTEMPTS", "3"))
+BACKGROUND_JOB_RETRY_BASE_SECONDS = float(os.getenv("BACKGROUND_JOB_RETRY_BASE_SECONDS", "2"))
+# Save jobs still pending at shutdown to storage and resume them on the next start
+BACKGROUND_JOB_PERSIST = os.getenv("BACKGROUND_JOB_PERSIST", "true").lower() in ("1", "true", "yes")
+
+# --- Tutor Analysis Batching ---
+# Analyze player messages in batches (one tutor call for several messages) instead of one call each
+TUTOR_BATCH_ANALYSIS = os.getenv("TUTOR_BATCH_ANALYSIS", "true").lower() in ("1", "true", "yes")
+# Seconds to collect messages before a batch is sent, and the largest batch
+TUTOR_BATCH_WINDOW_SECONDS = float(os.getenv("TUTOR_BATCH_WINDOW_SECONDS", "3"))
+TUTOR_BATCH_MAX_MESSAGES = int(os.getenv("TUTOR_BATCH_MAX_MESSAGES", "8"))
+
+# --- Tutor Analysis Pre-filter ---
+# Skip the tutor analysis for messages it has nothing useful to say about
+TUTOR_FILTER_ENABLED = os.getenv("TUTOR_FILTER_ENABLED", "true").lower() in ("1", "true", "yes")
+# Messages with fewer words than this (character names not counted) are skipped
+TUTOR_FILTER_MIN_WORDS = int(os.getenv("TUTOR_FILTER_MIN_WORDS", "3"))
+# Messages where fewer than this share of words are recognized English words are skipped
+TUTOR_FILTER_MIN_KNOWN_RATIO = float(os.getenv("TUTOR_FILTER_MIN_KNOWN_RATIO", "0.5"))
+# Remembered (participant, text) pairs, so repeated texts are analyzed only once
+TUTOR_FILTER_CACHE_ENTRIES = int(os.getenv("TUTOR_FILTER_CACHE_ENTRIES", "20000"))
+
+# --- Participant Lock Settings ---
+# Log a warning when a request waits longer than this for the participant's state lock
+PARTICIPANT_LOCK_WARN_SECONDS = float(os.getenv("PARTICIPANT_LOCK_WARN_SECONDS", "2"))
+
+# --- Director Classifier Settings ---
+# Local intent classifier in front of the LLM director: off, shadow (measure only) or active
+DIRECTOR_CLASSIFIER_MODE = os.getenv("DIRECTOR_CLASSIFIER_MODE", "shadow").lower()
+# Minimum predicted probability for a scene to be built locally instead of asking the LLM
+DIRECTOR_CLASSIFIER_THRESHOLD = float(os.getenv("DIRECTOR_CLASSIFIER_THRESHOLD", "0.9"))
+# Model file written by scripts/train_director_classifier.py
+DIRECTOR_CLASSIFIER_MODEL_PATH = os.getenv(
+    "DIRECTOR_CLASSIFIER_MODEL_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "models", "director_classifier.json")
+)
+
+# --- WebSocket Channel Settings ---
+# Seconds a new connection has to send its auth frame before it is closed
+WS_AUTH_TIMEOUT_SECONDS = float(os.getenv("WS_AUTH_TIMEOUT_SECONDS", "10"))
+
+# --- Explanation Cache Settings ---
+# Tutor explanations shared across participants, kept in memory and in storage
+EXPLANATION_CACHE_MAX_ENTRIES = int(os.getenv("EXPLANATION_CACHE_MAX_ENTRIES", "5000"))
+EXPLANATION_CACHE_IDLE_TTL_SECONDS = float(os.getenv("EXPLANATION_CACHE_IDLE_TTL_SECONDS", "86400"))
+EXPLANATION_CACHE_PERSIST = os.getenv("EXPLANATION_CACHE_PERSIST", "true").lower() in ("1", "true", "yes")
+
+# --- In-Memory Store Limits ---
+# Participants whose game state stays in memory; evicted states are saved and reloaded on demand
+GAME_STATE_MAX_ENTRIES = int(os.getenv("GAME_STATE_MAX_ENTRIES", "2000"))
+GAME_STATE_IDLE_TTL_SECONDS = float(os.getenv("GAME_STATE_IDLE_TTL_SECONDS", "7200"))
+# Participants whose dialogue history stays in memory
+USER_HISTORY_MAX_ENTRIES = int(os.getenv("USER_HISTORY_MAX_ENTRIES", "2000"))
+USER_HISTORY_IDLE_TTL_SECONDS = float(os.getenv("USER_HISTORY_IDLE_TTL_SECONDS", "7200"))
+# Messages kept for explanations, bounded by count and total characters
+MESSAGE_CACHE_MAX_ENTRIES = int(os.getenv("MESSAGE_CACHE_MAX_ENTRIES", "20000"))
+MESSAGE_CACHE_MAX_CHARS = int(os.getenv("MESSAGE_CACHE_MAX_CHARS", "20000000"))
+MESSAGE_CACHE_IDLE_TTL_SECONDS = float(os.getenv("MESSAGE_CACHE_IDLE_TTL_SECONDS", "7200"))
+
 # --- Character & Actor Data ---
 CHARACTER_DATA = {
     "tim": {"prompt_file": "prompts/prompt_tim.md", "full_name": "Tim Kane", "emoji": "📚", "image": "tim.png"},
@@ -25,7 +141,18 @@ CHARACTER_DATA = {
 }
 
 # --- Global State Variables ---
-GAME_STATE = {}
-user_histories = {}
-message_cache = {}
+# GAME_STATE persistence and reload callbacks are attached by game_state_manager
+GAME_STATE = BoundedStore("game_state", max_entries=GAME_STATE_MAX_ENTRIES, idle_ttl=GAME_STATE_IDLE_TTL_SECONDS)
+user_histories = BoundedStore(
+    "user_histories",
+    max_entries=USER_HISTORY_MAX_ENTRIES,
+    idle_ttl=USER_HISTORY_IDLE_TTL_SECONDS,
+)
+message_cache = BoundedStore(
+    "message_cache",
+    max_entries=MESSAGE_CACHE_MAX_ENTRIES,
+    idle_ttl=MESSAGE_CACHE_IDLE_TTL_SECONDS,
+    max_size=MESSAGE_CACHE_MAX_CHARS,
+    sizer=lambda entry: len(entry.get("text", "")) if isinstance(entry, dict) else len(str(entry)),
+)
 
@@ -0,0 +1,205 @@
+"""
+Token-budgeted dialogue memory with per-character threads and rolling summaries.
+
+Every participant has a shared public thread (what was said in front of
+everyone) and a private thread per character (the interrogation with that
+character alone). A character's prompt is assembled only from the public
+thread and its own private thread, so one suspect never sees another's
+private interrogation.
+
+Each entry carries its token estimate. Recent turns of a thread are kept
+verbatim up to DIALOGUE_HISTORY_MAX_TOKENS; older turns are folded into the
+thread's rolling summary by a small model in a background task, off the
+request path. A prompt gets the summaries plus as many of the newest turns
+(of both threads, in conversation order) as fit the speaking character's
+token budget.
+"""
+
+import asyncio
+import logging
+from typing import Any, Dict, List, Optional, Set
+
+from config import (
+    DIALOGUE_HISTORY_MAX_TOKENS,
+    DIALOGUE_HISTORY_TOKEN_BUDGET,
+    DIALOGUE_HISTORY_TOKEN_BUDGETS,
+    DIALOGUE_SUMMARY_MAX_TOKENS,
+    DIALOGUE_SUMMARY_MODEL,
+    user_histories,
+)
+from llm_client import llm_client, PRIORITY_BACKGROUND
+from utils import estimate_tokens, load_system_prompt
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_PROMPT_FILE = "prompts/prompt_summarizer.md"
+PUBLIC_THREAD = "public"
+
+# Strong references to summary tasks that are still running
+_running: Set[asyncio.Task] = set()
+
+
+def thread_name(character_key: Optional[str], private: bool) -> str:
+    return f"private:{character_key}" if private and character_key else PUBLIC_THREAD
+
+
+class ConversationThread:
+    """Verbatim recent turns of one thread, its summary and turns waiting to be summarized."""
+
+    def __init__(self):
+        self.entries: List[Dict[str, Any]] = []  # {"role", "content", "tokens", "seq"}
+        self.tokens = 0
+        self.summary = ""
+        self.pending: List[Dict[str, Any]] = []  # evicted, not yet in the summary
+        self.summarizing = False
+
+
+class ConversationMemory:
+    """One participant's threads, keyed by thread name."""
+
+    def __init__(self):
+        self.threads: Dict[str, ConversationThread] = {}
+        self.seq = 0  # orders entries across threads
+
+    def thread(self, name: str) -> ConversationThread:
+        return self.threads.setdefault(name, ConversationThread())
+
+
+class HistoryManager:
+    """Appends to and assembles prompts from the per-participant memories in ``user_histories``."""
+
+    def __init__(self, store=user_histories, max_tokens: int = DIALOGUE_HISTORY_MAX_TOKENS,
+                 budget: int = DIALOGUE_HISTORY_TOKEN_BUDGET, budgets: Optional[Dict[str, int]] = None,
+                 summary_max_tokens: int = DIALOGUE_SUMMARY_MAX_TOKENS, summary_model: str = DIALOGUE_SUMMARY_MODEL):
+        self._store = store
+        self.max_tokens = max_tokens
+        self.budget = budget
+        self.budgets = DIALOGUE_HISTORY_TOKEN_BUDGETS if budgets is None else budgets
+        self.summary_max_tokens = summary_max_tokens
+        self.summary_model = summary_model
+        self.stats = {"summaries": 0, "summary_failures": 0, "summarized_entries": 0, "omitted_entries": 0}
+
+    def _memory(self, user_id) -> ConversationMemory:
+        key = str(user_id)
+        memory = self._store.get(key)
+        if not isinstance(memory, ConversationMemory):
+            memory = ConversationMemory()
+            self._store[key] = memory
+        return memory
+
+    def budget_for(self, character_key: Optional[str]) -> int:
+        return self.budgets.get(character_key or "", self.budget)
+
+    def append(self, user_id, messages: List[Dict[str, str]], character_key: Optional[str] = None,
+               private: bool = False):
+        """Append messages ({"role", "content"}) to the public thread or the character's private thread.
+
+        The oldest turns of a thread over the limit are folded into its summary.
+        """
+        memory = self._memory(user_id)
+        thread = memory.thread(thread_name(character_key, private))
+        for message in messages:
+            tokens = estimate_tokens(message["content"])
+            memory.seq += 1
+            thread.entries.append({"role": message["role"], "content": message["content"],
+                                   "tokens": tokens, "seq": memory.seq})
+            thread.tokens += tokens
+
+        # Evict whole exchanges, always keeping the newest one
+        while thread.tokens > self.max_tokens and len(thread.entries) > 2:
+            for entry in thread.entries[:2]:
+                thread.tokens -= entry["tokens"]
+                thread.pending.append(entry)
+            del thread.entries[:2]
+
+        if thread.pending and not thread.summarizing:
+            self._schedule_summary(thread)
+
+    def clear(self, user_id):
+        self._store[str(user_id)] = ConversationMemory()
+
+    def build_messages(self, user_id, character_key: Optional[str] = None) -> List[Dict[str, str]]:
+        """History messages for a character's prompt: summaries, then the newest turns that fit the budget.
+
+        Only the public thread and the character's own private thread are used.
+        """
+        memory = self._memory(user_id)
+        names = [PUBLIC_THREAD]
+        if character_key:
+            names.append(thread_name(character_key, True))
+        threads = [(name, memory.threads[name]) for name in names if name in memory.threads]
+        remaining = self.budget_for(character_key)
+        messages: List[Dict[str, str]] = []
+
+        for name, thread in threads:
+            if thread.summary:
+                where = "in front of everyone" if name == PUBLIC_THREAD else "in private"
+                summary = f"Summary of the earlier conversation {where}:\n{thread.summary}"
+                remaining -= estimate_tokens(summary)
+                messages.append({"role": "system", "content": summary})
+
+        entries = sorted((entry for _, thread in threads for entry in thread.entries), key=lambda entry: entry["seq"])
+        recent = []
+        for index in range(len(entries) - 1, -1, -1):
+            entry = entries[index]
+            if entry["tokens"] > remaining:
+                self.stats["omitted_entries"] += index + 1
+                break
+            remaining -= entry["tokens"]
+            recent.append({"role": entry["role"], "content": entry["content"]})
+        messages.extend(reversed(recent))
+        return messages
+
+    # --- Rolling summary ---
+
+    def _schedule_summary(self, thread: ConversationThread):
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return  # Summarized on the next append made from a request
+        thread.summarizing = True
+        task = loop.create_task(self._summarize(thread))
+        _running.add(task)
+        task.add_done_callback(_running.discard)
+
+    async def _summarize(self, thread: ConversationThread):
+        try:
+            # Turns evicted while a summary is being written are picked up by the next round
+            while thread.pending:
+                batch = thread.pending[:]
+                summary = await self._summarize_batch(thread.summary, batch)
+                if summary:
+                    thread.summary = summary
+                    self.stats["summaries"] += 1
+                    self.stats["summarized_entries"] += len(batch)
+                else:
+                    self.stats["summary_failures"] += 1
+                # On failure the turns are dropped rather than retried, like the old hard truncation
+                del thread.pending[:len(batch)]
+        finally:
+            thread.summarizing = False
+
+    async def _summarize_batch(self, summary: str, batch: List[Dict[str, Any]]) -> Optional[str]:
+        if not llm_client.available:
+            return None
+        transcript = "\n".join(entry["content"] if entry["role"] == "user" else f"  {entry['content']}" for entry in batch)
+        messages = [
+            {"role": "system", "content": load_system_prompt(SUMMARY_PROMPT_FILE)},
+            {"role": "user", "content": f"Current notes:\n{summary or '(none yet)'}\n\nNext part of the conversation:\n{transcript}"},
+        ]
+        try:
+            text = (await llm_client.complete(messages, temperature=0.2, model=self.summary_model,
+                                             priority=PRIORITY_BACKGROUND)).strip()
+        except Exception as e:
+            logger.warning(f"Failed to summarize dialogue history: {e}")
+            return None
+        # Keep the summary within its budget even if the model rambles
+        max_chars = self.summary_max_tokens * 4
+        return text[:max_chars].rsplit(" ", 1)[0] if len(text) > max_chars else text
+
+    def get_stats(self) -> Dict[str, Any]:
+        return dict(self.stats, summaries_running=len(_running))
+
+
+# Global instance
+history_manager = HistoryManager()
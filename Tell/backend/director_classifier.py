@@ -0,0 +1,225 @@
+"""
+Local intent classifier in front of the LLM director.
+
+A multinomial naive Bayes model over word unigrams and bigrams, trained
+offline by scripts/train_director_classifier.py from the director decisions
+in the chat history logs. A decision is reduced to its label: which
+characters reply, in order ("tim+fiona"), or ``llm`` for scenes the model
+can't reproduce (director notes, reactions). For a confident prediction the
+scene is built from a template instead of calling the LLM director; anything
+uncertain still goes to the LLM.
+
+Modes (DIRECTOR_CLASSIFIER_MODE):
+    off     the classifier is not consulted
+    shadow  the LLM director always runs; predictions are only compared with
+            its decisions to measure accuracy and coverage at the threshold
+    active  confident predictions replace the LLM director call
+"""
+
+import json
+import logging
+import math
+import os
+import re
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from config import (
+    CHARACTER_DATA,
+    DIRECTOR_CLASSIFIER_MODE,
+    DIRECTOR_CLASSIFIER_MODEL_PATH,
+    DIRECTOR_CLASSIFIER_THRESHOLD,
+)
+
+logger = logging.getLogger(__name__)
+
+MODEL_VERSION = 1
+# Label of scenes that only the LLM director can produce
+ESCALATE_LABEL = "llm"
+# Log a shadow-mode summary every this many comparisons
+SHADOW_REPORT_EVERY = 50
+
+_TOKEN = re.compile(r"\w+")
+
+_TRIGGER_TEMPLATE = (
+    "The detective asks: \"{message}\". Answer in character with what you know, "
+    "in your own words, and stay consistent with what has already been said."
+)
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased word unigrams plus bigrams."""
+    words = _TOKEN.findall((text or "").lower())
+    return words + [f"{first} {second}" for first, second in zip(words, words[1:])]
+
+
+def scene_label(decision: Dict[str, Any]) -> Optional[str]:
+    """Label of a director decision, or None if it holds no usable scene."""
+    scene = decision.get("scene") if isinstance(decision, dict) else None
+    if not isinstance(scene, list) or not scene:
+        return None
+    characters = []
+    for action in scene:
+        if not isinstance(action, dict):
+            return ESCALATE_LABEL
+        data = action.get("data")
+        if action.get("action") != "character_reply" or not isinstance(data, dict) \
+                or data.get("character_key") not in CHARACTER_DATA:
+            return ESCALATE_LABEL
+        if data["character_key"] not in characters:
+            characters.append(data["character_key"])
+    return "+".join(characters)
+
+
+def scene_for_label(label: str, message: str) -> Dict[str, Any]:
+    """Director decision with one templated reply per character of the label.
+
+    The replies don't depend on each other, so they are generated concurrently
+    even if the player's message names another character.
+    """
+    trigger = _TRIGGER_TEMPLATE.format(message=message.strip().replace('"', "'"))
+    return {"scene": [
+        {"action": "character_reply",
+         "data": {"character_key": char_key, "trigger_message": trigger, "depends_on": []}}
+        for char_key in label.split("+")
+    ]}
+
+
+class DirectorClassifier:
+    """Naive Bayes text classifier mapping a player message to a scene label."""
+
+    def __init__(self, path: str = DIRECTOR_CLASSIFIER_MODEL_PATH, mode: str = DIRECTOR_CLASSIFIER_MODE,
+                 threshold: float = DIRECTOR_CLASSIFIER_THRESHOLD):
+        self.path = path
+        self.mode = mode if mode in ("off", "shadow", "active") else "off"
+        self.threshold = threshold
+        self._model: Optional[Dict[str, Any]] = None
+        self._vocabulary: Set[str] = set()
+        self.stats = {
+            "predictions": 0, "confident": 0, "served_locally": 0,
+            "shadow_compared": 0, "shadow_agreed": 0, "shadow_confident": 0, "shadow_confident_agreed": 0,
+        }
+
+    # --- Training and persistence ---
+
+    @staticmethod
+    def train(examples: Iterable[Tuple[str, str]]) -> Dict[str, Any]:
+        """Build a model from (message, label) pairs."""
+        class_counts: Dict[str, int] = {}
+        token_counts: Dict[str, Dict[str, int]] = {}
+        for message, label in examples:
+            class_counts[label] = class_counts.get(label, 0) + 1
+            counts = token_counts.setdefault(label, {})
+            for token in tokenize(message):
+                counts[token] = counts.get(token, 0) + 1
+        vocabulary = {token for counts in token_counts.values() for token in counts}
+        return {
+            "version": MODEL_VERSION,
+            "examples": sum(class_counts.values()),
+            "class_counts": class_counts,
+            "token_counts": token_counts,
+            "token_totals": {label: sum(counts.values()) for label, counts in token_counts.items()},
+            "vocabulary_size": len(vocabulary),
+        }
+
+    def set_model(self, model: Optional[Dict[str, Any]]):
+        self._model = model
+        self._vocabulary = {token for counts in model["token_counts"].values() for token in counts} if model else set()
+
+    def _load(self) -> Optional[Dict[str, Any]]:
+        if self._model is not None:
+            return self._model or None
+        self._model = {}
+        try:
+            with open(self.path, "r", encoding="utf-8") as file:
+                model = json.load(file)
+        except FileNotFoundError:
+            logger.info(f"No director classifier model at {self.path}, using the LLM director for all messages")
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning(f"Could not read director classifier model: {e}")
+            return None
+        if model.get("version") != MODEL_VERSION or not model.get("class_counts"):
+            logger.warning(f"Ignoring director classifier model with version {model.get('version')}")
+            return None
+        self.set_model(model)
+        logger.info(f"Loaded director classifier trained on {model['examples']} decisions "
+                    f"({len(model['class_counts'])} labels), mode {self.mode}")
+        return model
+
+    # --- Prediction ---
+
+    def predict(self, message: str) -> Tuple[Optional[str], float]:
+        """Most probable label and its posterior probability; (None, 0.0) without a model or known words."""
+        model = self._load()
+        tokens = [token for token in tokenize(message) if model and token in self._vocabulary]
+        if not tokens:
+            return None, 0.0
+
+        total_examples = model["examples"]
+        vocabulary_size = model["vocabulary_size"]
+        scores = {}
+        for label, count in model["class_counts"].items():
+            counts = model["token_counts"].get(label, {})
+            denominator = model["token_totals"].get(label, 0) + vocabulary_size
+            score = math.log(count / total_examples)
+            for token in tokens:
+                score += math.log((counts.get(token, 0) + 1) / denominator)
+            scores[label] = score
+
+        best = max(scores, key=scores.get)
+        # Posterior via log-sum-exp over all labels
+        top = scores[best]
+        confidence = 1.0 / sum(math.exp(score - top) for score in scores.values())
+        return best, confidence
+
+    def decide(self, message: str) -> Tuple[Optional[Dict[str, Any]], Optional[str], float]:
+        """In active mode, a templated decision for a confident prediction.
+
+        Returns (decision or None, predicted label, confidence). The label is
+        passed back to ``record_shadow`` once the LLM director has decided.
+        """
+        if self.mode == "off":
+            return None, None, 0.0
+        label, confidence = self.predict(message)
+        if label is None:
+            return None, None, 0.0
+        self.stats["predictions"] += 1
+        confident = confidence >= self.threshold
+        if confident:
+            self.stats["confident"] += 1
+        if self.mode == "active" and confident and label != ESCALATE_LABEL:
+            self.stats["served_locally"] += 1
+            return scene_for_label(label, message), label, confidence
+        return None, label, confidence
+
+    def record_shadow(self, label: Optional[str], confidence: float, decision: Dict[str, Any]):
+        """Compare a prediction with the LLM director's decision for the same message."""
+        actual = scene_label(decision)
+        if label is None or actual is None:
+            return
+        agreed = label == actual
+        self.stats["shadow_compared"] += 1
+        self.stats["shadow_agreed"] += agreed
+        if confidence >= self.threshold:
+            self.stats["shadow_confident"] += 1
+            self.stats["shadow_confident_agreed"] += agreed
+        logger.debug(f"Director classifier: predicted {label} ({confidence:.2f}), director chose {actual}")
+        if self.stats["shadow_compared"] % SHADOW_REPORT_EVERY == 0:
+            logger.info(f"Director classifier shadow report: {self.get_stats()}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Counters plus accuracy overall and at the threshold, and the share of messages above it."""
+        compared = self.stats["shadow_compared"]
+        confident = self.stats["shadow_confident"]
+        return dict(
+            self.stats,
+            mode=self.mode,
+            threshold=self.threshold,
+            accuracy=round(self.stats["shadow_agreed"] / compared, 3) if compared else None,
+            confident_accuracy=round(self.stats["shadow_confident_agreed"] / confident, 3) if confident else None,
+            coverage=round(confident / compared, 3) if compared else None,
+        )
+
+
+# Global instance
+director_classifier = DirectorClassifier()
@@ -0,0 +1,118 @@
+"""
+Shared cache for tutor explanations.
+
+Most explain requests are for the same words in the same static game texts,
+so explanations are shared across participants. Entries are keyed by the
+normalized word, source text, language level and a hash of the tutor prompt
+(editing the prompt invalidates the cache). They live in a bounded in-memory
+store backed by the storage layer, so they survive restarts and are shared
+between instances.
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import re
+from typing import Any, Dict, Optional
+
+import bootstrap  # noqa: F401
+
+from bounded_store import BoundedStore
+from config import (
+    EXPLANATION_CACHE_MAX_ENTRIES,
+    EXPLANATION_CACHE_IDLE_TTL_SECONDS,
+    EXPLANATION_CACHE_PERSIST,
+)
+from shared.backend.storage_backend import get_storage_backend
+
+logger = logging.getLogger(__name__)
+
+_WHITESPACE = re.compile(r"\s+")
+# Punctuation clicked along with a word ("alibi," / "'alibi'") doesn't change the explanation
+_EDGE_PUNCTUATION = " \t\n.,;:!?\"'()[]{}«»“”‘’*_"
+
+
+def normalize_word(word: str) -> str:
+    return _WHITESPACE.sub(" ", (word or "").strip(_EDGE_PUNCTUATION)).casefold()
+
+
+def normalize_text(text: str) -> str:
+    return _WHITESPACE.sub(" ", (text or "").strip())
+
+
+class ExplanationCache:
+    """Two-level (memory, then storage) cache of tutor explanation dicts."""
+
+    def __init__(self, max_entries: int = EXPLANATION_CACHE_MAX_ENTRIES,
+                 idle_ttl: float = EXPLANATION_CACHE_IDLE_TTL_SECONDS,
+                 persist: bool = EXPLANATION_CACHE_PERSIST):
+        self._memory = BoundedStore("explanation_cache", max_entries=max_entries, idle_ttl=idle_ttl)
+        self.persist = persist
+        self.stats = {"hits": 0, "storage_hits": 0, "misses": 0, "stores": 0, "storage_errors": 0}
+
+    @staticmethod
+    def make_key(word: str, source_text: str, language_level: Optional[str], prompt_hash: str) -> str:
+        """Cache key for an explanation of word in source_text at a language level.
+
+        ``prompt_hash`` is the tutor prompt's hash from prompt_registry.file_hash.
+        """
+        parts = [normalize_word(word), normalize_text(source_text), (language_level or "").upper(), prompt_hash]
+        return hashlib.sha256("\x1f".join(parts).encode("utf-8")).hexdigest()
+
+    def _blob_name(self, key: str) -> str:
+        return f"explanation_cache/{key[:2]}/{key}.json"
+
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Return a cached explanation, or None on a miss."""
+        try:
+            explanation = self._memory[key]
+            self.stats["hits"] += 1
+            return explanation
+        except KeyError:
+            pass
+
+        storage = get_storage_backend() if self.persist else None
+        if storage is not None:
+            try:
+                content = await asyncio.to_thread(storage.read_text, self._blob_name(key))
+                if content:
+                    explanation = json.loads(content)
+                    self._memory[key] = explanation
+                    self.stats["storage_hits"] += 1
+                    return explanation
+            except Exception as e:
+                self.stats["storage_errors"] += 1
+                logger.warning(f"Failed to read cached explanation {key}: {e}")
+
+        self.stats["misses"] += 1
+        return None
+
+    async def put(self, key: str, explanation: Dict[str, Any]):
+        """Store an explanation in memory and, if enabled, in the storage layer."""
+        self._memory[key] = explanation
+        self.stats["stores"] += 1
+
+        storage = get_storage_backend() if self.persist else None
+        if storage is None:
+            return
+        try:
+            await asyncio.to_thread(
+                storage.write_text,
+                self._blob_name(key),
+                json.dumps(explanation, ensure_ascii=False, separators=(",", ":")),
+                content_type="application/json; charset=utf-8"
+            )
+        except Exception as e:
+            self.stats["storage_errors"] += 1
+            logger.warning(f"Failed to persist cached explanation {key}: {e}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Hit/miss counters plus the in-memory store's size and evictions."""
+        lookups = self.stats["hits"] + self.stats["storage_hits"] + self.stats["misses"]
+        hit_rate = (self.stats["hits"] + self.stats["storage_hits"]) / lookups if lookups else 0.0
+        return dict(self.stats, hit_rate=round(hit_rate, 3), memory=self._memory.get_stats())
+
+
+# Global instance
+explanation_cache = ExplanationCache()
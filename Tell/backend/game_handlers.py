@@ -6,7 +6,7 @@ import logging
 import json
 import time
 import random
-from typing import Dict, List, Optional
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional
 
 import bootstrap  # noqa: F401
 
@@ -14,7 +14,8 @@ from utils import load_system_prompt, combine_character_prompt, save_message_to_
 from config import GAME_STATE, CHARACTER_DATA, SUSPECT_KEYS, TOTAL_CLUES
 from game_state_manager import game_state_manager
 from shared.backend.progress_manager import progress_manager
-from ai_services import ask_for_dialogue
+from ai_services import ask_for_dialogue, stream_dialogue
+from scene_executor import run_scene, scene_dependencies
 
 logger = logging.getLogger(__name__)
 
@@ -52,23 +53,21 @@ async def start_game_handler(participant_code: str) -> List[Dict]:
     
     # Check for existing game state
     saved_state_data = await game_state_manager.load_game_state(participant_code)
-    
-    if saved_state_data and saved_state_data.get("state"):
-        saved_state = saved_state_data["state"]
-        
-        # If game completed, start fresh
-        if saved_state.get("game_completed"):
-            logger.info(f"Participant {participant_code}: Previous game completed, starting fresh")
-            await game_state_manager.delete_game_state(participant_code)
-            progress_manager.clear_user_progress(participant_code, participant_code)
-    
-    # Initialize or restore game state
-    if participant_code not in GAME_STATE:
-        GAME_STATE[participant_code] = initialize_game_state(participant_code)
+    saved_state = (saved_state_data or {}).get("state") or {}
+    
+    # If game completed, start fresh
+    completed = bool(saved_state.get("game_completed"))
+    if completed:
+        logger.info(f"Participant {participant_code}: Previous game completed, starting fresh")
+        await game_state_manager.delete_game_state(participant_code)
+        progress_manager.clear_user_progress(participant_code, participant_code)
+    
+    # Restore the game state (from memory, or from storage if it was evicted) or initialize a new one
+    state = None if completed else await GAME_STATE.get_or_load(participant_code)
+    if not state or state.get("game_completed"):
+        state = GAME_STATE[participant_code] = initialize_game_state(participant_code)
         logger.info(f"Participant {participant_code}: Game state initialized")
     
-    state = GAME_STATE[participant_code]
-    
     # Start with welcome message
     welcome_text = load_system_prompt("game_texts/onboarding_1_welcome.txt")
     
@@ -98,7 +97,7 @@ async def start_game_handler(participant_code: str) -> List[Dict]:
 async def handle_onboarding_button(participant_code: str, action: str) -> List[Dict]:
     """Handle onboarding button clicks."""
     messages = []
-    state = GAME_STATE.get(participant_code)
+    state = await GAME_STATE.get_or_load(participant_code)
     
     if not state:
         return [{"type": "error", "content": "Game not initialized. Please restart."}]
@@ -153,7 +152,7 @@ async def handle_onboarding_button(participant_code: str, action: str) -> List[D
 async def handle_language_adjustment(participant_code: str, action: str) -> List[Dict]:
     """Handle language level adjustments (easier/more advanced)."""
     messages = []
-    state = GAME_STATE.get(participant_code)
+    state = await GAME_STATE.get_or_load(participant_code)
     
     if not state:
         return [{"type": "error", "content": "Game not initialized."}]
@@ -233,7 +232,7 @@ async def handle_language_adjustment(participant_code: str, action: str) -> List
 async def handle_language_confirmation(participant_code: str) -> List[Dict]:
     """Handle language level confirmation and proceed to game."""
     messages = []
-    state = GAME_STATE.get(participant_code)
+    state = await GAME_STATE.get_or_load(participant_code)
     
     if not state:
         return [{"type": "error", "content": "Game not initialized."}]
@@ -271,7 +270,7 @@ async def handle_language_confirmation(participant_code: str) -> List[Dict]:
 async def handle_case_intro(participant_code: str, action: str) -> List[Dict]:
     """Handle case introduction sequence."""
     messages = []
-    state = GAME_STATE.get(participant_code)
+    state = await GAME_STATE.get_or_load(participant_code)
     
     if not state:
         return [{"type": "error", "content": "Game not initialized."}]
@@ -363,7 +362,7 @@ async def handle_case_intro(participant_code: str, action: str) -> List[Dict]:
 async def start_investigation(participant_code: str) -> List[Dict]:
     """Start the main investigation."""
     messages = []
-    state = GAME_STATE.get(participant_code)
+    state = await GAME_STATE.get_or_load(participant_code)
     
     if not state:
         return [{"type": "error", "content": "Game not initialized."}]
@@ -393,7 +392,7 @@ async def start_investigation(participant_code: str) -> List[Dict]:
 async def handle_main_menu(participant_code: str) -> List[Dict]:
     """Show main game menu."""
     messages = []
-    state = GAME_STATE.get(participant_code)
+    state = await GAME_STATE.get_or_load(participant_code)
     
     if not state:
         return [{"type": "error", "content": "Game not initialized."}]
@@ -419,7 +418,7 @@ async def handle_main_menu(participant_code: str) -> List[Dict]:
 async def handle_menu_talk(participant_code: str) -> List[Dict]:
     """Show character selection for talking."""
     messages = []
-    state = GAME_STATE.get(participant_code)
+    state = await GAME_STATE.get_or_load(participant_code)
     
     if not state:
         return [{"type": "error", "content": "Game not initialized."}]
@@ -454,7 +453,7 @@ async def handle_menu_talk(participant_code: str) -> List[Dict]:
 async def handle_character_talk(participant_code: str, character_key: str) -> List[Dict]:
     """Initiate conversation with a specific character."""
     messages = []
-    state = GAME_STATE.get(participant_code)
+    state = await GAME_STATE.get_or_load(participant_code)
     
     if not state:
         return [{"type": "error", "content": "Game not initialized."}]
@@ -519,20 +518,93 @@ async def handle_character_talk(participant_code: str, character_key: str) -> Li
     return messages
 
 
-async def handle_private_message(participant_code: str, message_text: str) -> List[Dict]:
-    """Handle message in private conversation mode."""
-    messages = []
-    state = GAME_STATE.get(participant_code)
+def _message_event(message: Dict) -> Dict:
+    return {"event": "message", "data": message}
+
+
+async def _collect_messages(events: AsyncIterator[Dict]) -> List[Dict]:
+    """Drain a message event stream into the list returned by the JSON endpoints."""
+    return [event["data"] async for event in events if event["event"] == "message"]
+
+
+async def _character_reply_events(participant_code: str, char_key: str, trigger: str,
+                                  system_prompt: str, stream: bool,
+                                  history_turn: Optional[Callable[[], Awaitable]] = None,
+                                  private: bool = False) -> AsyncIterator[Dict]:
+    """Generate one character reply as events.
+
+    With ``stream`` set, a ``character_start`` event and ``token`` events carry
+    the reply while it is generated; the closing ``message`` event holds the
+    final, validated text and the same ``stream_id``. Without it only the
+    ``message`` event is produced. The message has a ``message_id`` only if
+    the character actually replied. ``private`` keeps the exchange in the
+    character's private thread.
+    """
+    char_data = CHARACTER_DATA[char_key]
+    character_info = {
+        "character": char_key,
+        "character_name": char_data["full_name"],
+        "character_emoji": char_data["emoji"],
+        "character_image": char_data.get("image"),
+    }
+    stream_id = generate_message_id() if stream else None
+
+    try:
+        if stream:
+            yield {"event": "character_start", "data": dict(character_info, stream_id=stream_id)}
+            reply_text = ""
+            async for kind, text in stream_dialogue(participant_code, trigger, system_prompt, char_key,
+                                                    history_turn=history_turn, private=private):
+                if kind == "delta":
+                    yield {"event": "token", "data": {"stream_id": stream_id, "delta": text}}
+                else:
+                    reply_text = text
+        else:
+            reply_text = await ask_for_dialogue(
+                participant_code,
+                trigger,
+                system_prompt,
+                char_key,
+                history_turn=history_turn,
+                private=private
+            )
+        
+        if reply_text:
+            message_id = generate_message_id()
+            save_message_to_cache(message_id, reply_text, char_key)
+            
+            # Log character response
+            log_message(0, f"character_{char_key}", reply_text, participant_code)
+            
+            message = {"type": "character", **character_info, "content": reply_text,
+                       "message_id": message_id, "show_explain": True}
+        else:
+            logger.error(f"Character '{char_key}' generated empty reply")
+            message = {"type": "character", **character_info,
+                       "content": "[Character is thinking...]", "show_explain": False}
+    except Exception as e:
+        logger.error(f"Failed to get character reply from '{char_key}': {e}")
+        message = {"type": "character", **character_info,
+                   "content": "[Character is thinking...]", "show_explain": False}
+
+    if stream_id is not None:
+        message["stream_id"] = stream_id
+    yield _message_event(message)
+
+
+async def stream_private_message(participant_code: str, message_text: str, stream: bool = True) -> AsyncIterator[Dict]:
+    """Handle message in private conversation mode, producing message events."""
+    state = await GAME_STATE.get_or_load(participant_code)
     
     if not state:
-        return [{"type": "error", "content": "Game not initialized."}]
+        yield _message_event({"type": "error", "content": "Game not initialized."})
+        return
     
     char_key = state.get("current_character")
     
     if not char_key or char_key not in CHARACTER_DATA:
-        return [{"type": "error", "content": "No active character conversation."}]
-    
-    char_data = CHARACTER_DATA[char_key]
+        yield _message_event({"type": "error", "content": "No active character conversation."})
+        return
     
     # Check if this is first interrogation
     if char_key in SUSPECT_KEYS and char_key not in state.get("suspects_interrogated", set()):
@@ -553,67 +625,31 @@ async def handle_private_message(participant_code: str, message_text: str) -> Li
     # Log user message
     log_message(0, "user", message_text, participant_code)
     
-    try:
-        reply_text = await ask_for_dialogue(
-            participant_code,
-            context_trigger,
-            system_prompt,
-            char_key
-        )
-        
-        if reply_text:
-            message_id = generate_message_id()
-            save_message_to_cache(message_id, reply_text, char_key)
-            
-            # Log character response
-            log_message(0, f"character_{char_key}", reply_text, participant_code)
-            
-            messages.append({
-                "type": "character",
-                "character": char_key,
-                "character_name": char_data["full_name"],
-                "character_emoji": char_data["emoji"],
-                "character_image": char_data.get("image"),
-                "content": reply_text,
-                "message_id": message_id,
-                "show_explain": True
-            })
-        else:
-            logger.error(f"Character '{char_key}' generated empty reply")
-            messages.append({
-                "type": "character",
-                "character": char_key,
-                "character_name": char_data["full_name"],
-                "character_emoji": char_data["emoji"],
-                "character_image": char_data.get("image"),
-                "content": "[Character is thinking...]",
-                "show_explain": False
-            })
-    except Exception as e:
-        logger.error(f"Failed to get character reply from '{char_key}': {e}")
-        messages.append({
-            "type": "character",
-            "character": char_key,
-            "character_name": char_data["full_name"],
-            "character_emoji": char_data["emoji"],
-            "character_image": char_data.get("image"),
-            "content": "[Character is thinking...]",
-            "show_explain": False
-        })
+    async for event in _character_reply_events(participant_code, char_key, context_trigger, system_prompt, stream,
+                                               private=True):
+        yield event
     
     # Save state
     await game_state_manager.save_game_state(participant_code, state)
-    
-    return messages
 
 
-async def handle_public_message(participant_code: str, message_text: str) -> List[Dict]:
-    """Handle message in public conversation mode using director logic."""
-    messages = []
-    state = GAME_STATE.get(participant_code)
+async def handle_private_message(participant_code: str, message_text: str) -> List[Dict]:
+    """Handle message in private conversation mode."""
+    return await _collect_messages(stream_private_message(participant_code, message_text, stream=False))
+
+
+async def stream_public_message(participant_code: str, message_text: str, stream: bool = True) -> AsyncIterator[Dict]:
+    """Handle message in public conversation mode using director logic, producing message events.
+
+    Each scene action is emitted as soon as it is ready, so with ``stream``
+    set a client can show the first character speaking while the rest of the
+    scene is still being generated.
+    """
+    state = await GAME_STATE.get_or_load(participant_code)
     
     if not state:
-        return [{"type": "error", "content": "Game not initialized."}]
+        yield _message_event({"type": "error", "content": "Game not initialized."})
+        return
     
     # First, check for direct character addressing
     from predefined_responses import extract_character_from_message_strict
@@ -621,8 +657,6 @@ async def handle_public_message(participant_code: str, message_text: str) -> Lis
     character_key = extract_character_from_message_strict(message_text)
     if character_key and character_key in CHARACTER_DATA:
         # Handle direct character addressing
-        char_data = CHARACTER_DATA[character_key]
-        
         # Get current language level
         current_language_level = state.get("current_language_level", "B1")
         system_prompt = combine_character_prompt(character_key, current_language_level)
@@ -636,58 +670,12 @@ async def handle_public_message(participant_code: str, message_text: str) -> Lis
         # Log user message
         log_message(0, "user", message_text, participant_code)
         
-        try:
-            reply_text = await ask_for_dialogue(
-                participant_code,
-                context_trigger,
-                system_prompt,
-                character_key
-            )
-            
-            if reply_text:
-                message_id = generate_message_id()
-                save_message_to_cache(message_id, reply_text, character_key)
-                
-                # Log character response
-                log_message(0, f"character_{character_key}", reply_text, participant_code)
-                
-                messages.append({
-                    "type": "character",
-                    "character": character_key,
-                    "character_name": char_data["full_name"],
-                    "character_emoji": char_data["emoji"],
-                    "character_image": char_data.get("image"),
-                    "content": reply_text,
-                    "message_id": message_id,
-                    "show_explain": True
-                })
-            else:
-                logger.error(f"Character '{character_key}' generated empty reply for direct addressing")
-                messages.append({
-                    "type": "character",
-                    "character": character_key,
-                    "character_name": char_data["full_name"],
-                    "character_emoji": char_data["emoji"],
-                    "character_image": char_data.get("image"),
-                    "content": "[Character is thinking...]",
-                    "show_explain": False
-                })
-        except Exception as e:
-            logger.error(f"Failed to get direct character reply from '{character_key}': {e}")
-            messages.append({
-                "type": "character",
-                "character": character_key,
-                "character_name": char_data["full_name"],
-                "character_emoji": char_data["emoji"],
-                "character_image": char_data.get("image"),
-                "content": "[Character is thinking...]",
-                "show_explain": False
-            })
+        async for event in _character_reply_events(participant_code, character_key, context_trigger, system_prompt, stream):
+            yield event
         
         # Save state
         await game_state_manager.save_game_state(participant_code, state)
-        
-        return messages
+        return
     
     # No direct addressing, use director logic
     topic_memory = state.get("topic_memory", {"topic": "None", "spoken": [], "predefined_used": []})
@@ -719,99 +707,62 @@ async def handle_public_message(participant_code: str, message_text: str) -> Lis
     
     if not scene:
         logger.warning(f"Participant {participant_code}: Director returned an empty scene")
-        return [{"type": "system", "content": "The investigation continues..."}]
+        yield _message_event({"type": "system", "content": "The investigation continues..."})
+        return
+    
+    # Execute scene actions; independent character replies are generated concurrently
+    dependencies = scene_dependencies(scene)
+    logger.info(f"Participant {participant_code}: Executing scene with {len(scene)} actions, dependencies: {dependencies}")
+    current_language_level = state.get("current_language_level", "B1")
     
-    # Execute scene actions
-    logger.info(f"Participant {participant_code}: Executing scene with {len(scene)} actions")
-    for scene_action in scene:
+    def scene_action_runner(scene_action: Dict):
         action_type = scene_action.get("action")
         data = scene_action.get("data", {})
         
-        if action_type == "director_note":
-            # Director narrative/guidance message
-            message = data.get("message", "The investigation continues...")
-            
-            # Log director note
-            log_message(0, "director_note", message, participant_code)
-            
-            messages.append({
-                "type": "system",
-                "content": message
-            })
-            
-        elif action_type in ["character_reply", "character_reaction"]:
-            char_key = data.get("character_key")
-            trigger_msg = data.get("trigger_message")
-            
-            if char_key in CHARACTER_DATA and trigger_msg:
-                char_data = CHARACTER_DATA[char_key]
+        async def run(history_turn):
+            if action_type == "director_note":
+                # Director narrative/guidance message
+                message = data.get("message", "The investigation continues...")
+                
+                # Log director note
+                log_message(0, "director_note", message, participant_code)
+                
+                yield _message_event({
+                    "type": "system",
+                    "content": message
+                })
                 
-                # Get current language level
-                current_language_level = state.get("current_language_level", "B1")
-                system_prompt = combine_character_prompt(char_key, current_language_level)
+            elif action_type in ["character_reply", "character_reaction"]:
+                char_key = data.get("character_key")
+                trigger_msg = data.get("trigger_message")
                 
-                try:
-                    reply_text = await ask_for_dialogue(
-                        participant_code,
-                        trigger_msg,
-                        system_prompt,
-                        char_key
-                    )
+                if char_key in CHARACTER_DATA and trigger_msg:
+                    system_prompt = combine_character_prompt(char_key, current_language_level)
                     
-                    if reply_text:
-                        message_id = generate_message_id()
-                        save_message_to_cache(message_id, reply_text, char_key)
-                        
-                        # Log character response
-                        log_message(0, f"character_{char_key}", reply_text, participant_code)
-                        
-                        messages.append({
-                            "type": "character",
-                            "character": char_key,
-                            "character_name": char_data["full_name"],
-                            "character_emoji": char_data["emoji"],
-                            "character_image": char_data.get("image"),
-                            "content": reply_text,
-                            "message_id": message_id,
-                            "show_explain": True
-                        })
-                        
-                        # Mark character as having spoken on this topic
-                        state["topic_memory"]["spoken"].append(char_key)
-                    else:
-                        logger.error(f"Character '{char_key}' generated empty reply")
-                        messages.append({
-                            "type": "character",
-                            "character": char_key,
-                            "character_name": char_data["full_name"],
-                            "character_emoji": char_data["emoji"],
-                            "character_image": char_data.get("image"),
-                            "content": "[Character is thinking...]",
-                            "show_explain": False
-                        })
-                        
-                except Exception as e:
-                    logger.error(f"Failed to get character reply from '{char_key}': {e}")
-                    messages.append({
-                        "type": "character",
-                        "character": char_key,
-                        "character_name": char_data["full_name"],
-                        "character_emoji": char_data["emoji"],
-                        "character_image": char_data.get("image"),
-                        "content": "[Character is thinking...]",
-                        "show_explain": False
-                    })
+                    async for event in _character_reply_events(participant_code, char_key, trigger_msg,
+                                                               system_prompt, stream, history_turn):
+                        if event["event"] == "message" and event["data"].get("message_id"):
+                            # Mark character as having spoken on this topic
+                            state["topic_memory"]["spoken"].append(char_key)
+                        yield event
+        return run
+    
+    async for event in run_scene([scene_action_runner(action) for action in scene], dependencies):
+        yield event
     
     # Save state
     await game_state_manager.save_game_state(participant_code, state)
-    
-    return messages
+
+
+async def handle_public_message(participant_code: str, message_text: str) -> List[Dict]:
+    """Handle message in public conversation mode using director logic."""
+    return await _collect_messages(stream_public_message(participant_code, message_text, stream=False))
 
 
 async def handle_mode_public(participant_code: str) -> List[Dict]:
     """Switch to public mode."""
     messages = []
-    state = GAME_STATE.get(participant_code)
+    state = await GAME_STATE.get_or_load(participant_code)
     
     if not state:
         return [{"type": "error", "content": "Game not initialized."}]
@@ -838,7 +789,7 @@ async def handle_mode_public(participant_code: str) -> List[Dict]:
 async def handle_menu_evidence(participant_code: str) -> List[Dict]:
     """Show evidence/clue selection menu."""
     messages = []
-    state = GAME_STATE.get(participant_code)
+    state = await GAME_STATE.get_or_load(participant_code)
     
     if not state:
         return [{"type": "error", "content": "Game not initialized."}]
@@ -870,7 +821,7 @@ async def handle_menu_evidence(participant_code: str) -> List[Dict]:
 async def handle_clue_examination(participant_code: str, clue_id: str) -> List[Dict]:
     """Handle examination of a specific clue."""
     messages = []
-    state = GAME_STATE.get(participant_code)
+    state = await GAME_STATE.get_or_load(participant_code)
     
     if not state:
         return [{"type": "error", "content": "Game not initialized."}]
@@ -907,7 +858,7 @@ async def handle_clue_examination(participant_code: str, clue_id: str) -> List[D
 async def handle_language_menu_difficulty(participant_code: str) -> List[Dict]:
     """Show difficulty selection menu for language level."""
     messages = []
-    state = GAME_STATE.get(participant_code)
+    state = await GAME_STATE.get_or_load(participant_code)
     
     if not state:
         return [{"type": "error", "content": "Game not initialized."}]
@@ -949,7 +900,7 @@ async def handle_language_menu_difficulty(participant_code: str) -> List[Dict]:
 async def handle_difficulty_set(participant_code: str, new_level: str) -> List[Dict]:
     """Set language difficulty level."""
     messages = []
-    state = GAME_STATE.get(participant_code)
+    state = await GAME_STATE.get_or_load(participant_code)
     
     if not state:
         return [{"type": "error", "content": "Game not initialized."}]
@@ -989,7 +940,7 @@ async def handle_difficulty_set(participant_code: str, new_level: str) -> List[D
 async def handle_language_menu_progress(participant_code: str) -> List[Dict]:
     """Show language progress report."""
     messages = []
-    state = GAME_STATE.get(participant_code)
+    state = await GAME_STATE.get_or_load(participant_code)
     
     if not state:
         return [{"type": "error", "content": "Game not initialized."}]
@@ -1076,27 +1027,61 @@ async def handle_language_menu_back(participant_code: str) -> List[Dict]:
     return []
 
 
-async def analyze_and_log_user_text(participant_code: str, text: str):
+async def analyze_and_log_user_text(participant_code: str, text: str) -> Optional[str]:
     """Silently analyze user text and log feedback if improvements are needed.
     
+    Returns the feedback, or None if no improvement is needed. Runs as a
+    background job; a failed tutor call is raised so the job is retried.
+    
     Note: This analyzes only text from the web version user, identified by participant_code.
     Data is stored in participant_logs/language_progress/web_{participant_code}_language_progress.json
     (Note: 'web_' prefix separates web version data from Telegram bot data)
     """
     from ai_services import ask_tutor_for_analysis
+    from analysis_filter import analysis_filter
     
     logger.info(f"Participant {participant_code}: Analyzing text from WEB version: '{text[:100]}...'")
     
     # Use 0 as user_id since we're using participant_code for identification in web version
-    analysis_result = await ask_tutor_for_analysis(0, text)
+    analysis_result = await ask_tutor_for_analysis(0, text, raise_errors=True)
+    analysis_filter.mark_analyzed(participant_code, text)
     
     if analysis_result.get("improvement_needed"):
         feedback = analysis_result.get("feedback", "")
-        logger.info(f"Participant {participant_code}: Tutor feedback needed. Saving to: participant_logs/language_progress/web_{participant_code}_language_progress.json")
-        logger.info(f"Feedback: '{feedback[:100]}...'")
-        # Use progress manager to save feedback - will use participant_code for file path
-        success = progress_manager.add_writing_feedback(0, text, feedback, participant_code)
-        if success:
-            logger.info(f"Participant {participant_code}: Successfully saved feedback to progress manager")
-        else:
-            logger.error(f"Participant {participant_code}: Failed to save feedback to progress manager")
+        _save_writing_feedback(participant_code, text, feedback)
+        return feedback
+    return None
+
+
+async def analyze_and_log_user_texts(items: List[Dict]) -> Dict[str, Optional[str]]:
+    """Batched variant of analyze_and_log_user_text for texts of one or more participants.
+
+    ``items`` are ``{"id", "participant_code", "text"}``; returns the feedback
+    (or None) per item id. All texts are analyzed in a single tutor call.
+    """
+    from ai_services import ask_tutor_for_batch_analysis
+    from analysis_filter import analysis_filter
+    
+    logger.info(f"Analyzing a batch of {len(items)} texts from WEB version")
+    results = await ask_tutor_for_batch_analysis([item["text"] for item in items])
+    
+    feedback_by_id = {}
+    for item, analysis_result in zip(items, results):
+        analysis_filter.mark_analyzed(item["participant_code"], item["text"])
+        feedback = None
+        if analysis_result.get("improvement_needed"):
+            feedback = analysis_result.get("feedback", "")
+            _save_writing_feedback(item["participant_code"], item["text"], feedback)
+        feedback_by_id[item["id"]] = feedback
+    return feedback_by_id
+
+
+def _save_writing_feedback(participant_code: str, text: str, feedback: str):
+    logger.info(f"Participant {participant_code}: Tutor feedback needed. Saving to: participant_logs/language_progress/web_{participant_code}_language_progress.json")
+    logger.info(f"Feedback: '{feedback[:100]}...'")
+    # Use progress manager to save feedback - will use participant_code for file path
+    success = progress_manager.add_writing_feedback(0, text, feedback, participant_code)
+    if success:
+        logger.info(f"Participant {participant_code}: Successfully saved feedback to progress manager")
+    else:
+        logger.error(f"Participant {participant_code}: Failed to save feedback to progress manager")
@@ -1,65 +1,216 @@
 import json
+import asyncio
+import hashlib
 import datetime
 import logging
 from typing import Dict, Any, Optional
-from google.cloud import storage
-from config import GCS_BUCKET_NAME
+from config import GAME_STATE, GAME_STATE_WRITE_BEHIND, GAME_STATE_SAVE_DELAY_SECONDS, GAME_STATE_SAVE_MAX_ATTEMPTS
+from participant_locks import ParticipantLocks
+from shared.backend.storage_backend import GenerationMismatch, get_storage_backend
 import pytz
 
 logger = logging.getLogger(__name__)
 
+# Flags that never go back to False and counters that only grow, merged as OR and max
+_MONOTONIC_FLAGS = {"game_completed", "accuse_unlocked"}
+_COUNTERS = {"accusation_attempts", "reveal_step", "custom_reveal_step"}
+
+
+def merge_states(local: Dict[str, Any], remote: Dict[str, Any]) -> Dict[str, Any]:
+    """Merge a state written by another instance into this instance's state.
+
+    Collected items (sets, lists) are united, flags and counters combined;
+    for everything else the local value wins, as this instance is the one
+    handling the participant's requests now.
+    """
+    merged = dict(local)
+    for key, remote_value in remote.items():
+        if key not in local:
+            merged[key] = remote_value
+            continue
+        value = local[key]
+        if isinstance(value, set) and isinstance(remote_value, (set, list)):
+            merged[key] = value | set(remote_value)
+        elif isinstance(value, list) and isinstance(remote_value, list):
+            merged[key] = value + [item for item in remote_value if item not in value]
+        elif isinstance(value, dict) and isinstance(remote_value, dict):
+            merged[key] = merge_states(value, remote_value)
+        elif key in _MONOTONIC_FLAGS:
+            merged[key] = bool(value) or bool(remote_value)
+        elif key in _COUNTERS and isinstance(value, int) and isinstance(remote_value, int):
+            merged[key] = max(value, remote_value)
+    return merged
+
 class GameStateManager:
-    """Manages persistent storage and retrieval of game state for users."""
+    """Manages persistent storage and retrieval of game state for users.
+    
+    In write-behind mode, save_game_state only marks the state dirty; the
+    upload happens once per save window in the background, and is skipped
+    entirely when the serialized state has not changed since the last upload.
+    
+    Uploads are conditional on the storage generation seen at the last load
+    or upload, so two instances can't silently overwrite each other: on a
+    conflict the stored state is merged in (see merge_states) and the upload
+    retried.
+    """
     
-    def __init__(self):
-        self.storage_client = None
-        self.bucket = None
+    def __init__(self, write_behind: bool = GAME_STATE_WRITE_BEHIND, save_delay: float = GAME_STATE_SAVE_DELAY_SECONDS,
+                 max_attempts: int = GAME_STATE_SAVE_MAX_ATTEMPTS):
+        self.write_behind = write_behind
+        self.save_delay = save_delay
+        self.max_attempts = max(1, max_attempts)
         
-        if not GCS_BUCKET_NAME:
-            logger.warning("GCS_BUCKET_NAME is not set. Game state persistence is disabled.")
+        # Write-behind bookkeeping
+        self._dirty: Dict[Any, Dict[str, Any]] = {}
+        self._flush_tasks: Dict[Any, asyncio.Task] = {}
+        self._saved_hashes: Dict[Any, str] = {}
+        # Uploads of one user run in order, so an older state never overwrites a newer one
+        self._upload_locks = ParticipantLocks("state upload")
+        # Storage generation of each user's state as last read or written (0: no stored state)
+        self._generations: Dict[Any, int] = {}
+        self.stats = {"save_requests": 0, "uploads": 0, "skipped_unchanged": 0, "conflicts": 0,
+                      "conflict_failures": 0}
     
-    def _get_bucket(self):
-        """Lazy initialization of storage client and bucket."""
-        if self.storage_client is None and GCS_BUCKET_NAME:
-            try:
-                self.storage_client = storage.Client()
-                self.bucket = self.storage_client.bucket(GCS_BUCKET_NAME)
-            except Exception as e:
-                logger.error(f"Failed to initialize GCS bucket '{GCS_BUCKET_NAME}': {e}")
-                self.bucket = None
-        return self.bucket
+    def _get_storage(self):
+        """Return the configured storage backend, or None if persistence is disabled."""
+        return get_storage_backend()
     
     def _get_state_blob_name(self, user_id: int) -> str:
         """Get the blob name for storing user's game state."""
         return f"game_states/user_{user_id}_state.json"
     
     async def save_game_state(self, user_id: int, state: Dict[str, Any]) -> bool:
-        """Save the current game state for a user to persistent storage."""
-        bucket = self._get_bucket()
-        if not bucket:
-            logger.warning(f"Cannot save game state for user {user_id}: No storage bucket configured")
+        """Save the current game state for a user to persistent storage.
+        
+        With write-behind enabled the state is only marked dirty here and
+        uploaded after the save window; the return value then reports that
+        the save was scheduled.
+        """
+        storage = self._get_storage()
+        if not storage:
+            logger.warning(f"Cannot save game state for user {user_id}: No storage backend configured")
             return False
         
+        self.stats["save_requests"] += 1
+        
+        if not self.write_behind:
+            return await self._write_state(user_id, state)
+        
+        self._dirty[user_id] = state
+        if user_id not in self._flush_tasks:
+            self._flush_tasks[user_id] = asyncio.create_task(self._delayed_flush(user_id))
+        return True
+    
+    async def _delayed_flush(self, user_id: int):
+        """Wait for the save window to close, then upload the latest state."""
         try:
-            # Add timestamp for when state was saved
-            cet_tz = pytz.timezone('Europe/Berlin')
-            data = {
-                "state": state,
-                "last_saved": datetime.datetime.now(cet_tz).isoformat(),
-                "user_id": user_id
-            }
+            await asyncio.sleep(self.save_delay)
+        except asyncio.CancelledError:
+            return
+        self._flush_tasks.pop(user_id, None)
+        await self.flush_game_state(user_id)
+    
+    async def flush_game_state(self, user_id: int) -> bool:
+        """Upload a user's pending state immediately, if there is one."""
+        task = self._flush_tasks.pop(user_id, None)
+        if task is not None and task is not asyncio.current_task():
+            task.cancel()
+        
+        state = self._dirty.pop(user_id, None)
+        if state is None:
+            return True
+        return await self._write_state(user_id, state)
+    
+    def persist_evicted(self, user_id: int, state: Dict[str, Any]) -> None:
+        """Eviction callback for GAME_STATE: save the state before it leaves memory."""
+        if state.get("game_completed"):
+            return
+        self._dirty[user_id] = state
+        task = self._flush_tasks.pop(user_id, None)
+        if task is not None:
+            task.cancel()
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            asyncio.run(self.flush_game_state(user_id))
+            return
+        self._flush_tasks[user_id] = loop.create_task(self.flush_game_state(user_id))
+    
+    async def load_active_state(self, user_id: int) -> Optional[Dict[str, Any]]:
+        """Reload callback for GAME_STATE: the saved state of an unfinished game, if any."""
+        saved_data = await self.load_game_state(user_id)
+        if not saved_data:
+            return None
+        state = saved_data.get("state")
+        if not state or state.get("game_completed"):
+            return None
+        logger.info(f"Reloaded game state for user {user_id} from storage")
+        return state
+    
+    async def flush_all(self) -> None:
+        """Upload all pending states (called on application shutdown)."""
+        pending_users = list(self._dirty.keys())
+        if pending_users:
+            logger.info(f"Flushing {len(pending_users)} pending game states")
+        for user_id in pending_users:
+            await self.flush_game_state(user_id)
+    
+    def _hash_state(self, serializable_state: Dict[str, Any]) -> str:
+        """Stable hash of a serialized state, used to skip unchanged uploads."""
+        canonical = json.dumps(serializable_state, sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+    
+    async def _write_state(self, user_id: int, state: Dict[str, Any]) -> bool:
+        """Serialize and upload a state, skipping the upload if nothing changed."""
+        storage = self._get_storage()
+        if not storage:
+            return False
+        
+        async with self._upload_locks.hold(user_id):
+            return await self._upload_state(storage, user_id, state)
+    
+    async def _upload_state(self, storage, user_id: int, state: Dict[str, Any]) -> bool:
+        try:
+            # Convert sets to lists for JSON serialization
+            serializable_state = self._prepare_state_for_storage(state)
+            state_hash = self._hash_state(serializable_state)
             
-            blob_name = self._get_state_blob_name(user_id)
-            blob = bucket.blob(blob_name)
+            if self._saved_hashes.get(user_id) == state_hash:
+                self.stats["skipped_unchanged"] += 1
+                logger.debug(f"Game state for user {user_id} unchanged, skipping upload")
+                return True
             
-            # Convert sets to lists for JSON serialization
-            serializable_state = self._prepare_state_for_storage(data)
+            blob_name = self._get_state_blob_name(user_id)
+            generation = self._generations.get(user_id, 0)
             
-            blob.upload_from_string(
-                json.dumps(serializable_state, indent=2, ensure_ascii=False),
-                content_type="application/json; charset=utf-8"
-            )
+            for attempt in range(1, self.max_attempts + 1):
+                try:
+                    generation = await asyncio.to_thread(
+                        storage.write_if_generation,
+                        blob_name,
+                        self._serialize(user_id, serializable_state),
+                        generation,
+                        content_type="application/json; charset=utf-8"
+                    )
+                    break
+                except GenerationMismatch:
+                    self.stats["conflicts"] += 1
+                    if attempt == self.max_attempts:
+                        self.stats["conflict_failures"] += 1
+                        logger.error(f"Game state for user {user_id} still conflicting after {attempt} attempts")
+                        return False
+                    # Another instance saved in between: merge its state into ours and retry
+                    content, generation = await asyncio.to_thread(storage.read_versioned, blob_name)
+                    if content:
+                        remote_state = self._restore_state_from_storage(json.loads(content)).get("state") or {}
+                        state.update(merge_states(state, remote_state))
+                    logger.warning(f"Game state for user {user_id} was changed by another instance, merged and retrying")
+                    serializable_state = self._prepare_state_for_storage(state)
+                    state_hash = self._hash_state(serializable_state)
             
+            self._generations[user_id] = generation
+            self._saved_hashes[user_id] = state_hash
+            self.stats["uploads"] += 1
             logger.info(f"Successfully saved game state for user {user_id}")
             return True
             
@@ -67,23 +218,37 @@ class GameStateManager:
             logger.error(f"Failed to save game state for user {user_id}: {e}")
             return False
     
+    def _serialize(self, user_id: int, serializable_state: Dict[str, Any]) -> str:
+        # Add timestamp for when state was saved
+        cet_tz = pytz.timezone('Europe/Berlin')
+        data = {
+            "state": serializable_state,
+            "last_saved": datetime.datetime.now(cet_tz).isoformat(),
+            "user_id": user_id
+        }
+        return json.dumps(data, ensure_ascii=False, separators=(",", ":"))
+    
     async def load_game_state(self, user_id: int) -> Optional[Dict[str, Any]]:
         """Load the saved game state for a user from persistent storage."""
-        bucket = self._get_bucket()
-        if not bucket:
-            logger.warning(f"Cannot load game state for user {user_id}: No storage bucket configured")
+        storage = self._get_storage()
+        if not storage:
+            logger.warning(f"Cannot load game state for user {user_id}: No storage backend configured")
             return None
         
+        # Make sure a pending write is not shadowed by an older stored copy
+        if user_id in self._dirty:
+            await self.flush_game_state(user_id)
+        
         try:
             blob_name = self._get_state_blob_name(user_id)
-            blob = bucket.blob(blob_name)
             
-            if not blob.exists():
+            # Download the state together with its generation for the next conditional upload
+            content, generation = await asyncio.to_thread(storage.read_versioned, blob_name)
+            self._generations[user_id] = generation
+            if content is None:
                 logger.info(f"No saved game state found for user {user_id}")
                 return None
             
-            # Download and parse the state
-            content = blob.download_as_text(encoding="utf-8")
             saved_data = json.loads(content)
             
             # Convert lists back to sets where appropriate
@@ -98,26 +263,35 @@ class GameStateManager:
     
     async def delete_game_state(self, user_id: int) -> bool:
         """Delete the saved game state for a user (e.g., when game is completed)."""
-        bucket = self._get_bucket()
-        if not bucket:
-            logger.warning(f"Cannot delete game state for user {user_id}: No storage bucket configured")
+        storage = self._get_storage()
+        if not storage:
+            logger.warning(f"Cannot delete game state for user {user_id}: No storage backend configured")
             return False
         
-        try:
-            blob_name = self._get_state_blob_name(user_id)
-            blob = bucket.blob(blob_name)
-            
-            if blob.exists():
-                blob.delete()
-                logger.info(f"Successfully deleted game state for user {user_id}")
-            else:
-                logger.info(f"No game state to delete for user {user_id}")
-            
-            return True
+        # Drop any pending write so it cannot resurrect the deleted state
+        task = self._flush_tasks.pop(user_id, None)
+        if task is not None:
+            task.cancel()
+        self._dirty.pop(user_id, None)
+        
+        # Wait for an upload already in progress, so it cannot finish after the delete
+        async with self._upload_locks.hold(user_id):
+            self._saved_hashes.pop(user_id, None)
+            self._generations[user_id] = 0
             
-        except Exception as e:
-            logger.error(f"Failed to delete game state for user {user_id}: {e}")
-            return False
+            try:
+                blob_name = self._get_state_blob_name(user_id)
+                
+                if await asyncio.to_thread(storage.delete, blob_name):
+                    logger.info(f"Successfully deleted game state for user {user_id}")
+                else:
+                    logger.info(f"No game state to delete for user {user_id}")
+                
+                return True
+                
+            except Exception as e:
+                logger.error(f"Failed to delete game state for user {user_id}: {e}")
+                return False
     
     def _prepare_state_for_storage(self, state: Dict[str, Any]) -> Dict[str, Any]:
         """Prepare state for JSON serialization by converting sets to lists."""
@@ -125,7 +299,7 @@ class GameStateManager:
             prepared = {}
             for key, value in state.items():
                 if isinstance(value, set):
-                    prepared[key] = list(value)
+                    prepared[key] = sorted(value)
                 elif isinstance(value, dict):
                     prepared[key] = self._prepare_state_for_storage(value)
                 else:
@@ -172,3 +346,5 @@ class GameStateManager:
 
 # Global instance
 game_state_manager = GameStateManager()
+GAME_STATE.on_evict = game_state_manager.persist_evicted
+GAME_STATE.loader = game_state_manager.load_active_state
@@ -0,0 +1,208 @@
+"""
+Resized, re-encoded image variants with HTTP caching.
+
+Originals in images/ are up to 2.4 MB. Each request is served a variant
+instead: the width is rounded up to one of IMAGE_VARIANT_WIDTHS (never
+larger than the original), and the format is negotiated from the Accept
+header (AVIF, then WebP, then JPEG, or PNG for images with transparency).
+Variants are generated on first request, or ahead of time by
+scripts/build_image_variants.py, and stored under IMAGE_VARIANT_DIR with the
+original's content hash in the name, so an edited original never serves a
+stale variant.
+
+Responses carry a strong ETag and Vary: Accept, are cached for
+IMAGE_CACHE_MAX_AGE_SECONDS and then revalidated (304 Not Modified).
+
+Pillow is optional: without it the originals are served, still with ETags
+and cache headers.
+"""
+
+import asyncio
+import hashlib
+import logging
+import os
+from typing import Dict, NamedTuple, Optional, Tuple
+
+try:
+    from PIL import Image, features
+except ImportError:  # pragma: no cover - depends on the deployment
+    Image = None
+    features = None
+    print("WARNING: Pillow not installed. Images are served without resizing or WebP/AVIF variants.")
+
+logger = logging.getLogger(__name__)
+
+# --- Image Settings ---
+# Read here rather than in config, so the build-time variant script runs without
+# config's side effects (Secret Manager lookups need credentials a build doesn't have)
+# Width buckets of the generated image variants (requests are rounded up to the next bucket)
+IMAGE_VARIANT_WIDTHS = tuple(int(width) for width in os.getenv("IMAGE_VARIANT_WIDTHS", "160,320,640,1280,1920").split(",") if width.strip())
+# Where generated variants are stored
+IMAGE_VARIANT_DIR = os.getenv("IMAGE_VARIANT_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "image_variants"))
+# Serve AVIF to browsers that accept it (slower to generate than WebP)
+IMAGE_AVIF_ENABLED = os.getenv("IMAGE_AVIF_ENABLED", "true").lower() in ("1", "true", "yes")
+# Browser cache lifetime of image responses, after which they are revalidated
+IMAGE_CACHE_MAX_AGE_SECONDS = int(os.getenv("IMAGE_CACHE_MAX_AGE_SECONDS", "86400"))
+
+IMAGES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "images")
+
+MEDIA_TYPES = {
+    "avif": "image/avif",
+    "webp": "image/webp",
+    "jpeg": "image/jpeg",
+    "png": "image/png",
+}
+_EXTENSIONS = {"avif": "avif", "webp": "webp", "jpeg": "jpg", "png": "png"}
+_SAVE_OPTIONS = {
+    "avif": {"quality": 55},
+    "webp": {"quality": 80, "method": 6},
+    "jpeg": {"quality": 82, "optimize": True, "progressive": True},
+    "png": {"optimize": True},
+}
+
+
+class ImageVariant(NamedTuple):
+    path: str
+    media_type: str
+    etag: str
+
+
+class ImageSource(NamedTuple):
+    path: str
+    hash: str
+    width: int
+    has_alpha: bool
+
+
+def _has_alpha(image) -> bool:
+    return image.mode in ("RGBA", "LA") or (image.mode == "P" and "transparency" in image.info)
+
+
+class ImagePipeline:
+    """Resolves an image request to a (possibly newly generated) variant file."""
+
+    def __init__(self, images_dir: str = IMAGES_DIR, variant_dir: str = IMAGE_VARIANT_DIR,
+                 widths: Tuple[int, ...] = IMAGE_VARIANT_WIDTHS, avif: bool = IMAGE_AVIF_ENABLED):
+        self.images_dir = images_dir
+        self.variant_dir = variant_dir
+        self.widths = tuple(sorted(set(widths)))
+        self.enabled = Image is not None
+        self.formats = ["webp"] if self.enabled and features.check("webp") else []
+        if self.enabled and avif and features.check("avif"):
+            self.formats.insert(0, "avif")
+        self._sources: Dict[str, Tuple[float, ImageSource]] = {}
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self.stats = {"requests": 0, "not_modified": 0, "generated": 0, "generation_errors": 0}
+
+    def source(self, image_name: str) -> Optional[ImageSource]:
+        """The original image, or None for names that aren't a file directly in the images directory."""
+        if not image_name or os.path.basename(image_name) != image_name or image_name.startswith("."):
+            return None
+        path = os.path.join(self.images_dir, image_name)
+        if not os.path.isfile(path):
+            return None
+        try:
+            mtime = os.path.getmtime(path)
+        except OSError:
+            return None
+        cached = self._sources.get(image_name)
+        if cached and cached[0] == mtime:
+            return cached[1]
+
+        with open(path, "rb") as file:
+            content_hash = hashlib.sha256(file.read()).hexdigest()[:16]
+        width, has_alpha = 0, False
+        if self.enabled:
+            try:
+                with Image.open(path) as image:
+                    width, has_alpha = image.width, _has_alpha(image)
+            except Exception as e:
+                logger.warning(f"Cannot read image {image_name}: {e}")
+        source = ImageSource(path, content_hash, width, has_alpha)
+        self._sources[image_name] = (mtime, source)
+        return source
+
+    def negotiate(self, source: ImageSource, accept: str, width: Optional[int]) -> Tuple[str, int]:
+        """Pick the output format from the Accept header and the width bucket for a requested width."""
+        accept = (accept or "").lower()
+        fmt = next((fmt for fmt in self.formats if MEDIA_TYPES[fmt] in accept),
+                   "png" if source.has_alpha else "jpeg")
+        target = min(width or source.width, source.width)
+        bucket = next((bucket for bucket in self.widths if bucket >= target), source.width)
+        return fmt, min(bucket, source.width)
+
+    async def variant(self, image_name: str, accept: str = "", width: Optional[int] = None) -> Optional[ImageVariant]:
+        """The variant to serve, generating it if needed. None if the image doesn't exist."""
+        source = self.source(image_name)
+        if source is None:
+            return None
+        self.stats["requests"] += 1
+        original_type = MEDIA_TYPES.get(os.path.splitext(image_name)[1].lower().lstrip(".").replace("jpg", "jpeg"),
+                                        "application/octet-stream")
+        original = ImageVariant(source.path, original_type, f'"{source.hash}"')
+        if not self.enabled or not source.width:
+            return original
+
+        fmt, bucket = self.negotiate(source, accept, width)
+        stem = os.path.splitext(image_name)[0]
+        path = os.path.join(self.variant_dir, f"{stem}-{source.hash}-{bucket}.{_EXTENSIONS[fmt]}")
+        if not os.path.exists(path):
+            # One generation per variant even if many requests arrive at once
+            lock = self._locks.setdefault(path, asyncio.Lock())
+            async with lock:
+                if not os.path.exists(path):
+                    try:
+                        await asyncio.to_thread(self._generate, source.path, path, fmt, bucket)
+                        self.stats["generated"] += 1
+                    except Exception as e:
+                        self.stats["generation_errors"] += 1
+                        logger.error(f"Failed to generate {os.path.basename(path)}: {e}")
+                        return original
+            self._locks.pop(path, None)
+        return ImageVariant(path, MEDIA_TYPES[fmt], f'"{source.hash}-{bucket}-{fmt}"')
+
+    def _generate(self, source_path: str, path: str, fmt: str, width: int):
+        with Image.open(source_path) as image:
+            image.load()
+            if image.width > width:
+                height = max(1, round(image.height * width / image.width))
+                image = image.resize((width, height), Image.LANCZOS)
+            if fmt == "jpeg":
+                image = image.convert("RGB")
+            elif image.mode not in ("RGB", "RGBA"):
+                image = image.convert("RGBA" if _has_alpha(image) else "RGB")
+            os.makedirs(self.variant_dir, exist_ok=True)
+            # Write to a temporary name first so a half-written file is never served
+            temp_path = f"{path}.{os.getpid()}.tmp"
+            image.save(temp_path, format=fmt.upper(), **_SAVE_OPTIONS[fmt])
+        os.replace(temp_path, path)
+
+    def cache_control(self) -> str:
+        return f"public, max-age={IMAGE_CACHE_MAX_AGE_SECONDS}"
+
+    async def pregenerate(self) -> int:
+        """Generate every variant of every image (used at build time). Returns the number generated."""
+        before = self.stats["generated"]
+        accepts = [MEDIA_TYPES[fmt] for fmt in self.formats] + [""]
+        for image_name in sorted(os.listdir(self.images_dir)):
+            source = self.source(image_name)
+            if source is None or not source.width:
+                continue
+            for width in self.widths + (source.width,):
+                for accept in accepts:
+                    await self.variant(image_name, accept, width)
+        return self.stats["generated"] - before
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """True if an If-None-Match header matches the ETag (weak comparison, as RFC 9110 requires for it)."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    candidates = [candidate.strip() for candidate in if_none_match.split(",")]
+    return any(candidate.removeprefix("W/") == etag for candidate in candidates)
+
+
+# Global instance
+image_pipeline = ImagePipeline()
@@ -0,0 +1,251 @@
+"""
+Bounded background job queue with a fixed worker pool.
+
+Work that doesn't block a response (tutor analysis of the player's text) is
+submitted here instead of being spawned as a free-standing task. A fixed
+number of workers run the jobs, the queue has a maximum size (new jobs are
+dropped and counted when it is full), failed jobs are retried with
+exponential backoff, and their LLM calls use background priority so they
+never hold up interactive replies. Jobs still pending at shutdown are
+written to storage and picked up again by the next instance that starts.
+
+Handlers are registered per job kind and receive the job payload as keyword
+arguments; a job's result is delivered to the future returned by submit().
+"""
+
+import asyncio
+import json
+import logging
+import random
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from config import (
+    BACKGROUND_JOB_MAX_ATTEMPTS,
+    BACKGROUND_JOB_PERSIST,
+    BACKGROUND_JOB_RETRY_BASE_SECONDS,
+    BACKGROUND_QUEUE_MAX_SIZE,
+    BACKGROUND_WORKERS,
+)
+from shared.backend.storage_backend import GenerationMismatch, get_storage_backend
+
+logger = logging.getLogger(__name__)
+
+PENDING_JOBS_BLOB = "job_queue/pending_jobs.json"
+# Attempts of a read-modify-write of the pending jobs blob that races with another instance
+_PERSIST_ATTEMPTS = 5
+
+
+class JobQueue:
+    """Fixed pool of workers draining a bounded queue of JSON-serializable jobs."""
+
+    def __init__(self, workers: int = BACKGROUND_WORKERS, max_size: int = BACKGROUND_QUEUE_MAX_SIZE,
+                 max_attempts: int = BACKGROUND_JOB_MAX_ATTEMPTS,
+                 retry_base: float = BACKGROUND_JOB_RETRY_BASE_SECONDS, persist: bool = BACKGROUND_JOB_PERSIST):
+        self.workers = max(1, workers)
+        self.max_size = max_size
+        self.max_attempts = max(1, max_attempts)
+        self.retry_base = retry_base
+        self.persist = persist
+        self._handlers: Dict[str, Callable[..., Awaitable[Any]]] = {}
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers: List[asyncio.Task] = []
+        self._futures: Dict[str, asyncio.Future] = {}
+        self._delayed: Dict[str, Dict[str, Any]] = {}  # jobs waiting for a retry
+        self._delayed_handles: Dict[str, asyncio.TimerHandle] = {}
+        self._running: Dict[str, Dict[str, Any]] = {}
+        self._interrupted: List[Dict[str, Any]] = []  # running when the workers were stopped
+        self._durations: List[float] = []
+        self.stats = {"submitted": 0, "completed": 0, "failed": 0, "retried": 0, "dropped": 0, "restored": 0}
+
+    def register(self, kind: str, handler: Callable[..., Awaitable[Any]]):
+        """Run ``handler(**payload)`` for jobs of this kind."""
+        self._handlers[kind] = handler
+
+    @property
+    def started(self) -> bool:
+        return bool(self._workers)
+
+    # --- Submitting ---
+
+    def submit(self, kind: str, **payload) -> Optional[asyncio.Future]:
+        """Queue a job. Returns a future for its result, or None if the queue is full or not running."""
+        if kind not in self._handlers:
+            raise ValueError(f"No handler registered for job kind '{kind}'")
+        if not self.started:
+            logger.warning(f"Job queue not running, dropping {kind} job")
+            self.stats["dropped"] += 1
+            return None
+        job = {"id": uuid.uuid4().hex, "kind": kind, "payload": payload, "attempts": 0, "enqueued_at": time.time()}
+        future = asyncio.get_running_loop().create_future()
+        if not self._enqueue(job):
+            return None
+        self._futures[job["id"]] = future
+        self.stats["submitted"] += 1
+        return future
+
+    def _enqueue(self, job: Dict[str, Any]) -> bool:
+        try:
+            self._queue.put_nowait(job)
+            return True
+        except asyncio.QueueFull:
+            self.stats["dropped"] += 1
+            logger.warning(f"Background queue full ({self.max_size} jobs), dropping {job['kind']} job")
+            self._resolve(job["id"], None)
+            return False
+
+    def _resolve(self, job_id: str, result: Any):
+        future = self._futures.pop(job_id, None)
+        if future is not None and not future.done():
+            future.set_result(result)
+
+    # --- Workers ---
+
+    async def _worker(self):
+        while True:
+            job = await self._queue.get()
+            self._running[job["id"]] = job
+            started = time.monotonic()
+            try:
+                result = await self._handlers[job["kind"]](**job["payload"])
+            except asyncio.CancelledError:
+                # Shutdown: the job stays pending and is persisted
+                self._interrupted.append(job)
+                raise
+            except Exception as e:
+                self._retry_or_fail(job, e)
+            else:
+                self.stats["completed"] += 1
+                self._record_duration(time.monotonic() - started)
+                self._resolve(job["id"], result)
+            finally:
+                self._running.pop(job["id"], None)
+                self._queue.task_done()
+
+    def _retry_or_fail(self, job: Dict[str, Any], error: Exception):
+        job["attempts"] += 1
+        if job["attempts"] >= self.max_attempts:
+            self.stats["failed"] += 1
+            logger.error(f"Background {job['kind']} job failed after {job['attempts']} attempts: {error}")
+            self._resolve(job["id"], None)
+            return
+        # Exponential backoff with jitter
+        delay = self.retry_base * (2 ** (job["attempts"] - 1)) * random.uniform(0.8, 1.2)
+        self.stats["retried"] += 1
+        logger.warning(f"Background {job['kind']} job failed ({error}), retrying in {delay:.1f}s")
+        self._delayed[job["id"]] = job
+        self._delayed_handles[job["id"]] = asyncio.get_running_loop().call_later(delay, self._requeue, job["id"])
+
+    def _requeue(self, job_id: str):
+        self._delayed_handles.pop(job_id, None)
+        job = self._delayed.pop(job_id, None)
+        if job is not None:
+            self._enqueue(job)
+
+    def _record_duration(self, seconds: float):
+        self._durations.append(seconds)
+        if len(self._durations) > 200:
+            del self._durations[:100]
+
+    # --- Lifecycle and persistence ---
+
+    async def start(self):
+        """Start the workers and queue the jobs left pending by the previous instance."""
+        if self.started:
+            return
+        self._queue = asyncio.Queue(maxsize=self.max_size)
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        for job in await asyncio.to_thread(self._claim_persisted):
+            if job.get("kind") in self._handlers and self._enqueue(job):
+                self.stats["restored"] += 1
+        if self.stats["restored"]:
+            logger.info(f"Restored {self.stats['restored']} pending background jobs")
+
+    async def stop(self, drain_timeout: float = 5.0):
+        """Give queued jobs a moment to finish, then stop the workers and persist what is left."""
+        if not self.started:
+            return
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout=drain_timeout)
+        except asyncio.TimeoutError:
+            pass
+        for task in self._workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        for handle in self._delayed_handles.values():
+            handle.cancel()
+        self._delayed_handles.clear()
+
+        pending = self._interrupted + list(self._delayed.values())
+        self._interrupted = []
+        self._delayed.clear()
+        while not self._queue.empty():
+            pending.append(self._queue.get_nowait())
+        for job in pending:
+            self._resolve(job["id"], None)
+        if pending:
+            await asyncio.to_thread(self._persist, pending)
+
+    def _claim_persisted(self) -> List[Dict[str, Any]]:
+        storage = get_storage_backend() if self.persist else None
+        if storage is None:
+            return []
+        try:
+            for _ in range(_PERSIST_ATTEMPTS):
+                content, generation = storage.read_versioned(PENDING_JOBS_BLOB)
+                jobs = json.loads(content) if content else []
+                if not jobs:
+                    return []
+                try:
+                    # Claim by emptying the blob at the generation we read: if another
+                    # instance claimed or added jobs meanwhile, read again
+                    storage.write_if_generation(PENDING_JOBS_BLOB, "[]", generation,
+                                                content_type="application/json; charset=utf-8")
+                except GenerationMismatch:
+                    continue
+                return jobs if isinstance(jobs, list) else []
+            logger.warning("Pending background jobs kept changing, not claimed")
+        except Exception as e:
+            logger.warning(f"Failed to load pending background jobs: {e}")
+        return []
+
+    def _persist(self, jobs: List[Dict[str, Any]]):
+        storage = get_storage_backend() if self.persist else None
+        if storage is None:
+            logger.warning(f"Dropping {len(jobs)} pending background jobs (no storage backend)")
+            return
+        try:
+            for _ in range(_PERSIST_ATTEMPTS):
+                # Another instance may have shut down with pending jobs too
+                content, generation = storage.read_versioned(PENDING_JOBS_BLOB)
+                existing = json.loads(content) if content else []
+                try:
+                    storage.write_if_generation(PENDING_JOBS_BLOB, json.dumps(existing + jobs, ensure_ascii=False),
+                                                generation, content_type="application/json; charset=utf-8")
+                except GenerationMismatch:
+                    continue
+                logger.info(f"Persisted {len(jobs)} pending background jobs")
+                return
+            logger.error(f"Dropping {len(jobs)} pending background jobs: the pending jobs blob kept changing")
+        except Exception as e:
+            logger.error(f"Failed to persist pending background jobs: {e}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Counters plus queue depth, jobs waiting for a retry, running jobs and job latency."""
+        queued = self._queue.qsize() if self._queue is not None else 0
+        oldest = min((job["enqueued_at"] for job in self._running.values()), default=None)
+        return dict(
+            self.stats,
+            workers=len(self._workers),
+            queued=queued,
+            delayed=len(self._delayed),
+            running=len(self._running),
+            oldest_running_age=round(time.time() - oldest, 1) if oldest else 0.0,
+            avg_duration=round(sum(self._durations) / len(self._durations), 3) if self._durations else None,
+        )
+
+
+# Global instance
+job_queue = JobQueue()
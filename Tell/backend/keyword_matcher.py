@@ -0,0 +1,103 @@
+"""
+Compiled whole-word keyword matching.
+
+All keywords are merged into one regex shaped like a trie (common prefixes
+share a branch), so a message is scanned once regardless of how many
+keywords there are, and each alternative is only tried where its prefix
+actually matches. Keywords only match as whole words, so "time" no longer
+fires inside "sometimes" and "tim" not inside "time". Matchers built with
+``plurals`` also accept an "s"/"es" ending, so "card" still matches "cards".
+"""
+
+import re
+from typing import Dict, Iterable, List, NamedTuple, Tuple
+
+
+class KeywordHit(NamedTuple):
+    keyword: str
+    label: str
+    start: int
+    end: int
+
+
+class LabelMatch(NamedTuple):
+    label: str
+    score: float
+    hits: Tuple[KeywordHit, ...]
+
+    @property
+    def first_position(self) -> int:
+        return self.hits[0].start
+
+
+def _trie_pattern(words: Iterable[str]) -> str:
+    """Regex matching exactly the given words, with shared prefixes factored out."""
+    trie: Dict[str, dict] = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[""] = {}  # end of a word
+
+    def build(node: Dict[str, dict]) -> str:
+        terminal = "" in node
+        branches = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ""
+        if len(branches) == 1 and not terminal:
+            return branches[0]
+        # Greedy: longer keywords are preferred, shorter ones are the fallback
+        return "(?:" + "|".join(branches) + ")" + ("?" if terminal else "")
+
+    return build(trie)
+
+
+class KeywordMatcher:
+    """Find every labelled keyword in a text in one pass.
+
+    ``keywords`` maps a label (e.g. a topic) to its keywords. A keyword may
+    belong to several labels. Each hit adds the keyword's weight to its
+    labels' score; by default the weight is the number of words in the
+    keyword, so specific phrases outweigh single generic words. With
+    ``plurals``, a keyword followed by "s" or "es" counts as a hit too.
+    """
+
+    def __init__(self, keywords: Dict[str, Iterable[str]], weights: Dict[str, float] = None,
+                 plurals: bool = False):
+        self._labels: Dict[str, List[str]] = {}
+        self._order = {label: index for index, label in enumerate(keywords)}
+        for label, label_keywords in keywords.items():
+            for keyword in label_keywords:
+                keyword = keyword.strip().lower()
+                if keyword and label not in self._labels.setdefault(keyword, []):
+                    self._labels[keyword].append(label)
+        self._weights = {keyword: (weights or {}).get(keyword, float(len(keyword.split())))
+                         for keyword in self._labels}
+        if self._labels:
+            suffix = "(?:e?s)?" if plurals else ""
+            self._regex = re.compile(rf"(?<!\w)({_trie_pattern(self._labels)}){suffix}(?!\w)")
+        else:
+            self._regex = None
+
+    def find_all(self, text: str) -> List[KeywordHit]:
+        """All non-overlapping keyword hits, leftmost-longest, in text order."""
+        if self._regex is None or not text:
+            return []
+        hits = []
+        for match in self._regex.finditer(text.lower()):
+            keyword = match.group(1)
+            for label in self._labels[keyword]:
+                hits.append(KeywordHit(keyword, label, match.start(), match.end()))
+        return hits
+
+    def match(self, text: str) -> List[LabelMatch]:
+        """Labels found in text, best first (by score, then table order)."""
+        by_label: Dict[str, List[KeywordHit]] = {}
+        for hit in self.find_all(text):
+            by_label.setdefault(hit.label, []).append(hit)
+        matches = [
+            LabelMatch(label, sum(self._weights[hit.keyword] for hit in hits), tuple(hits))
+            for label, hits in by_label.items()
+        ]
+        matches.sort(key=lambda m: (-m.score, self._order[m.label]))
+        return matches
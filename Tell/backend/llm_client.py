@@ -0,0 +1,208 @@
+"""
+Non-blocking LLM client shared by all AI services.
+
+Wraps the async Groq SDK with a pooled HTTP connection, a per-instance
+concurrency limit and a per-call timeout, so a slow completion never blocks
+the event loop for other participants. When all slots are busy, waiting
+interactive calls get the next free slot before background work.
+"""
+
+import asyncio
+import contextlib
+import heapq
+import itertools
+import logging
+import sys
+from typing import AsyncIterator, Dict, List, Optional
+
+import httpx
+from groq import AsyncGroq
+
+from config import (
+    GROQ_API_KEY,
+    LLM_MODEL,
+    LLM_MAX_CONCURRENCY,
+    LLM_TIMEOUT_SECONDS,
+    LLM_MAX_CONNECTIONS,
+)
+
+logger = logging.getLogger(__name__)
+
+
+# Slot priorities; lower is served first
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BACKGROUND = 10
+
+
+class LLMUnavailableError(RuntimeError):
+    """Raised when no LLM client is configured."""
+
+
+class PrioritySemaphore:
+    """Semaphore that hands a freed slot to the waiter with the lowest priority number (FIFO within a priority)."""
+
+    def __init__(self, value: int):
+        self._value = value
+        self._waiters: List[tuple] = []  # heap of (priority, order, future)
+        self._order = itertools.count()
+
+    @property
+    def waiting(self) -> int:
+        return sum(1 for _, _, future in self._waiters if not future.done())
+
+    async def acquire(self, priority: int = PRIORITY_INTERACTIVE):
+        if self._value > 0 and not self.waiting:
+            self._value -= 1
+            return
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._order), future))
+        try:
+            await future
+        except asyncio.CancelledError:
+            # The slot may have been handed over just before the cancellation
+            if future.done() and not future.cancelled():
+                self.release()
+            raise
+
+    def release(self):
+        while self._waiters:
+            _, _, future = heapq.heappop(self._waiters)
+            if not future.done():
+                future.set_result(None)
+                return
+        self._value += 1
+
+    @contextlib.asynccontextmanager
+    async def slot(self, priority: int = PRIORITY_INTERACTIVE):
+        await self.acquire(priority)
+        try:
+            yield
+        finally:
+            self.release()
+
+
+class LLMClient:
+    """Async chat-completion client with connection pooling and a concurrency limit."""
+
+    def __init__(self, api_key: Optional[str], model: str = LLM_MODEL,
+                 max_concurrency: int = LLM_MAX_CONCURRENCY,
+                 timeout: float = LLM_TIMEOUT_SECONDS,
+                 max_connections: int = LLM_MAX_CONNECTIONS):
+        self.api_key = api_key
+        self.model = model
+        self.max_concurrency = max(1, max_concurrency)
+        self.timeout = timeout
+        self.max_connections = max(1, max_connections)
+        self._client: Optional[AsyncGroq] = None
+        self._http_client: Optional[httpx.AsyncClient] = None
+        self._semaphore: Optional[PrioritySemaphore] = None
+        self._disabled = not api_key
+
+        if self._disabled:
+            print("WARNING: GROQ_API_KEY not configured. Groq-powered features will be disabled.", file=sys.stderr)
+
+    @property
+    def available(self) -> bool:
+        """True if completions can be requested."""
+        return not self._disabled
+
+    def _get_client(self) -> AsyncGroq:
+        """Lazy initialization of the pooled HTTP client and the Groq SDK client."""
+        if self._disabled:
+            raise LLMUnavailableError("Groq client not available")
+        if self._client is None:
+            try:
+                self._http_client = httpx.AsyncClient(
+                    limits=httpx.Limits(
+                        max_connections=self.max_connections,
+                        max_keepalive_connections=self.max_connections,
+                    ),
+                    timeout=httpx.Timeout(self.timeout),
+                )
+                self._client = AsyncGroq(
+                    api_key=self.api_key,
+                    http_client=self._http_client,
+                    timeout=self.timeout,
+                    max_retries=1,
+                )
+            except Exception as exc:
+                print(f"WARNING: Failed to initialise Groq client: {exc}. Features will be disabled.", file=sys.stderr)
+                self._disabled = True
+                raise LLMUnavailableError(str(exc)) from exc
+        return self._client
+
+    def _get_semaphore(self) -> PrioritySemaphore:
+        if self._semaphore is None:
+            self._semaphore = PrioritySemaphore(self.max_concurrency)
+        return self._semaphore
+
+    async def complete(self, messages: List[Dict[str, str]], temperature: float = 0.7,
+                       model: Optional[str] = None, timeout: Optional[float] = None,
+                       priority: int = PRIORITY_INTERACTIVE) -> str:
+        """Run one chat completion and return the content of the first choice.
+
+        Raises LLMUnavailableError if no client is configured and
+        asyncio.TimeoutError if the call (including waiting for a free slot)
+        exceeds the timeout. Background work passes PRIORITY_BACKGROUND so it
+        only gets a slot no interactive call is waiting for.
+        """
+        client = self._get_client()
+        call_timeout = timeout if timeout is not None else self.timeout
+
+        async def _call() -> str:
+            async with self._get_semaphore().slot(priority):
+                chat_completion = await client.chat.completions.create(
+                    model=model or self.model,
+                    messages=messages,
+                    temperature=temperature,
+                )
+            return chat_completion.choices[0].message.content
+
+        return await asyncio.wait_for(_call(), timeout=call_timeout)
+
+    async def stream(self, messages: List[Dict[str, str]], temperature: float = 0.7,
+                     model: Optional[str] = None, timeout: Optional[float] = None) -> AsyncIterator[str]:
+        """Run one chat completion and yield content deltas as they arrive.
+
+        The concurrency slot is held until the stream is exhausted or closed
+        (callers should close it when they stop early). The timeout applies to
+        getting a slot and the response, and then to each chunk read, never to
+        the time the caller spends between chunks.
+        """
+        client = self._get_client()
+        call_timeout = timeout if timeout is not None else self.timeout
+
+        async with contextlib.AsyncExitStack() as stack:
+            async with asyncio.timeout(call_timeout):
+                await stack.enter_async_context(self._get_semaphore().slot())
+                response = await client.chat.completions.create(
+                    model=model or self.model,
+                    messages=messages,
+                    temperature=temperature,
+                    stream=True,
+                )
+            stack.push_async_callback(response.close)
+
+            chunks = response.__aiter__()
+            while True:
+                try:
+                    async with asyncio.timeout(call_timeout):
+                        chunk = await anext(chunks)
+                except StopAsyncIteration:
+                    break
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    yield delta
+
+    async def aclose(self):
+        """Close the pooled HTTP connections (called on application shutdown)."""
+        if self._http_client is not None:
+            await self._http_client.aclose()
+        self._client = None
+        self._http_client = None
+
+
+# Global instance
+llm_client = LLMClient(GROQ_API_KEY)
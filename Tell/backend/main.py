@@ -2,11 +2,13 @@
 FastAPI main application for the web version of Teach or Tell.
 """
 
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect, Header, HTTPException, Depends
+from fastapi import FastAPI, WebSocket, WebSocketDisconnect, Header, HTTPException, Depends, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, Response, StreamingResponse
 from pydantic import BaseModel
 from typing import Optional
+import asyncio
+import json
 import logging
 import uvicorn
 import os
@@ -91,6 +93,39 @@ async def get_current_user(authorization: str = Header(...)):
     return session
 
 
+@app.on_event("startup")
+async def startup_event():
+    """Precompile character prompts (and watch them for changes if hot reload is enabled) and start background workers."""
+    from analysis_batcher import BATCH_JOB_KIND
+    from game_handlers import analyze_and_log_user_text, analyze_and_log_user_texts
+    from job_queue import job_queue
+    from prompt_registry import prompt_registry
+    prompt_registry.start()
+    job_queue.register("text_analysis", analyze_and_log_user_text)
+    job_queue.register(BATCH_JOB_KIND, analyze_and_log_user_texts)
+    await job_queue.start()
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Persist pending background jobs, flush game states and buffered logs and release pooled connections."""
+    from analysis_batcher import analysis_batcher
+    from job_queue import job_queue
+    from prompt_registry import prompt_registry
+    prompt_registry.stop()
+    # Send the open batch so its texts are analyzed or persisted with the other jobs
+    analysis_batcher.flush()
+    await job_queue.stop()
+    from llm_client import llm_client
+    from chat_log import chat_log_writer
+    from game_state_manager import game_state_manager
+    from participant_locks import participant_locks
+    await game_state_manager.flush_all()
+    logger.info(f"Participant lock stats: {participant_locks.get_stats()}")
+    await llm_client.aclose()
+    chat_log_writer.close()
+
+
 # API Routes
 
 @app.get("/")
@@ -131,20 +166,26 @@ async def session_status(authorization: str = Header(...)):
 
 
 @app.get("/api/images/{image_name}")
-async def get_image(image_name: str):
-    """Serve images from the images directory."""
-    # Base directory where images are stored
-    base_dir = os.path.dirname(os.path.abspath(__file__))
-    image_path = os.path.join(base_dir, "images", image_name)
-    
-    # Security check: ensure the path is within the images directory
-    if not os.path.commonpath([base_dir, os.path.abspath(image_path)]) == base_dir:
-        raise HTTPException(status_code=403, detail="Access denied")
+async def get_image(image_name: str, request: Request, w: Optional[int] = Query(None, ge=1, le=4096)):
+    """Serve an image, resized to width ``w`` in the best format the browser accepts.
+
+    Responses have a strong ETag and answer a matching If-None-Match with 304.
+    """
+    from image_pipeline import image_pipeline, etag_matches
     
-    if not os.path.exists(image_path):
+    variant = await image_pipeline.variant(image_name, request.headers.get("accept", ""), w)
+    if variant is None:
         raise HTTPException(status_code=404, detail="Image not found")
     
-    return FileResponse(image_path)
+    headers = {
+        "ETag": variant.etag,
+        "Cache-Control": image_pipeline.cache_control(),
+        "Vary": "Accept",
+    }
+    if etag_matches(request.headers.get("if-none-match"), variant.etag):
+        image_pipeline.stats["not_modified"] += 1
+        return Response(status_code=304, headers=headers)
+    return FileResponse(variant.path, media_type=variant.media_type, headers=headers)
 
 
 @app.get("/api/game/start")
@@ -156,8 +197,10 @@ async def start_game(current_user=Depends(get_current_user)):
     
     # Import and use game handlers
     from game_handlers import start_game_handler
+    from participant_locks import participant_locks
     
-    messages = await start_game_handler(participant_code)
+    async with participant_locks.hold(participant_code):
+        messages = await start_game_handler(participant_code)
     
     return {"messages": messages, "participant_code": participant_code}
 
@@ -172,9 +215,39 @@ async def handle_game_action(request: ActionRequest, current_user=Depends(get_cu
     participant_code = current_user["participant_code"]
     logger.info(f"Action from {participant_code}: {request.action}")
     
+    messages = await run_game_action(participant_code, request.action)
+    return {"messages": messages}
+
+
+# Actions that only read the game state; they don't wait for the participant's lock
+READ_ONLY_ACTIONS = {
+    "show_main_menu",
+    "menu_talk",
+    "menu_evidence",
+    "language_menu_difficulty",
+    "language_menu_progress",
+    "language_menu_back",
+}
+
+
+async def run_game_action(participant_code: str, action: str) -> list:
+    """Run a game action (shared by the HTTP and WebSocket transports).
+
+    Actions that change the game state run one at a time per participant.
+    """
+    from participant_locks import participant_locks
+    
     # Log user action to chat history
-    log_message(0, "action", request.action, participant_code)
+    log_message(0, "action", action, participant_code)
     
+    if action in READ_ONLY_ACTIONS:
+        return await _route_game_action(participant_code, action)
+    async with participant_locks.hold(participant_code):
+        return await _route_game_action(participant_code, action)
+
+
+async def _route_game_action(participant_code: str, action: str) -> list:
+    """Route a game action to its handler."""
     from game_handlers import (
         handle_onboarding_button,
         handle_language_adjustment,
@@ -194,44 +267,90 @@ async def handle_game_action(request: ActionRequest, current_user=Depends(get_cu
     )
     
     # Route actions to appropriate handlers
-    if request.action.startswith("onboarding_"):
-        messages = await handle_onboarding_button(participant_code, request.action)
-    elif request.action in ["language_adjust_easier", "language_adjust_more_advanced"]:
-        messages = await handle_language_adjustment(participant_code, request.action)
-    elif request.action == "language_confirm":
+    if action.startswith("onboarding_"):
+        messages = await handle_onboarding_button(participant_code, action)
+    elif action in ["language_adjust_easier", "language_adjust_more_advanced"]:
+        messages = await handle_language_adjustment(participant_code, action)
+    elif action == "language_confirm":
         messages = await handle_language_confirmation(participant_code)
-    elif request.action.startswith("case_intro_"):
-        messages = await handle_case_intro(participant_code, request.action)
-    elif request.action == "start_investigation":
+    elif action.startswith("case_intro_"):
+        messages = await handle_case_intro(participant_code, action)
+    elif action == "start_investigation":
         messages = await start_investigation(participant_code)
-    elif request.action == "show_main_menu":
+    elif action == "show_main_menu":
         messages = await handle_main_menu(participant_code)
-    elif request.action == "menu_talk":
+    elif action == "menu_talk":
         messages = await handle_menu_talk(participant_code)
-    elif request.action.startswith("talk_"):
+    elif action.startswith("talk_"):
         # Extract character key from action (e.g., "talk_tim" -> "tim")
-        character_key = request.action.split("_", 1)[1]
+        character_key = action.split("_", 1)[1]
         messages = await handle_character_talk(participant_code, character_key)
-    elif request.action == "mode_public":
+    elif action == "mode_public":
         messages = await handle_mode_public(participant_code)
-    elif request.action == "menu_evidence":
+    elif action == "menu_evidence":
         messages = await handle_menu_evidence(participant_code)
-    elif request.action.startswith("examine_clue_"):
-        clue_id = request.action.split("_", 2)[2]
+    elif action.startswith("examine_clue_"):
+        clue_id = action.split("_", 2)[2]
         messages = await handle_clue_examination(participant_code, clue_id)
-    elif request.action == "language_menu_difficulty":
+    elif action == "language_menu_difficulty":
         messages = await handle_language_menu_difficulty(participant_code)
-    elif request.action.startswith("difficulty_set_"):
-        new_level = request.action.split("_", 2)[2]  # Extract A2, B1, or B2
+    elif action.startswith("difficulty_set_"):
+        new_level = action.split("_", 2)[2]  # Extract A2, B1, or B2
         messages = await handle_difficulty_set(participant_code, new_level)
-    elif request.action == "language_menu_progress":
+    elif action == "language_menu_progress":
         messages = await handle_language_menu_progress(participant_code)
-    elif request.action == "language_menu_back":
+    elif action == "language_menu_back":
         messages = await handle_language_menu_back(participant_code)
     else:
         messages = [{"type": "error", "content": "Unknown action"}]
     
-    return {"messages": messages}
+    return messages
+
+
+def schedule_text_analysis(participant_code: str, text: str) -> Optional[asyncio.Future]:
+    """Queue a background analysis of the user's text for grammar errors.
+
+    Returns a future resolving to the tutor feedback (or None), or None if the
+    local pre-filter decided the text needs no analysis or the job couldn't be
+    queued.
+    """
+    from config import TUTOR_BATCH_ANALYSIS
+    from analysis_batcher import analysis_batcher
+    from analysis_filter import analysis_filter
+    from job_queue import job_queue
+    try:
+        if not analysis_filter.should_analyze(participant_code, text):
+            return None
+        if TUTOR_BATCH_ANALYSIS:
+            return analysis_batcher.submit(participant_code, text)
+        return job_queue.submit("text_analysis", participant_code=participant_code, text=text)
+    except Exception as e:
+        logger.warning(f"Failed to schedule text analysis: {e}")
+        return None
+
+
+async def message_events(participant_code: str, text: str, stream: bool = True):
+    """Event stream for a chat message in the participant's current mode.
+
+    The participant's lock is held until the reply is complete, so a second
+    message or a state-changing action waits for it.
+    """
+    from config import GAME_STATE
+    from game_handlers import stream_private_message, stream_public_message
+    from participant_locks import participant_locks
+    
+    async with participant_locks.hold(participant_code):
+        state = await GAME_STATE.get_or_load(participant_code, {})
+        mode = state.get("mode", "public")
+        
+        # Handle private conversation mode
+        if mode == "private":
+            events = stream_private_message(participant_code, text, stream=stream)
+        else:
+            # Handle public mode with director logic
+            events = stream_public_message(participant_code, text, stream=stream)
+        async for event in events:
+            yield event
 
 
 @app.post("/api/game/message")
@@ -240,30 +359,42 @@ async def send_message(request: MessageRequest, current_user=Depends(get_current
     participant_code = current_user["participant_code"]
     logger.info(f"Message from {participant_code}: {request.text}")
     
-    from config import GAME_STATE
-    from game_handlers import handle_private_message, handle_public_message, analyze_and_log_user_text
+    # Don't await the analysis to avoid blocking the response
+    schedule_text_analysis(participant_code, request.text)
     
-    state = GAME_STATE.get(participant_code, {})
-    mode = state.get("mode", "public")
+    messages = [event["data"] async for event in message_events(participant_code, request.text, stream=False)
+                if event["event"] == "message"]
+    return {"messages": messages}
+
+
+@app.post("/api/game/message/stream")
+async def send_message_stream(request: MessageRequest, current_user=Depends(get_current_user)):
+    """Send a message in the game and stream the reply as Server-Sent Events.
+
+    Emits ``message`` events for finished messages (same objects as
+    /api/game/message returns), ``character_start`` and ``token`` events while
+    a character reply is being generated, and a final ``done`` event.
+    """
+    participant_code = current_user["participant_code"]
+    logger.info(f"Streamed message from {participant_code}: {request.text}")
     
-    # Automatically analyze user's text for grammar errors (background task)
-    # Don't await to avoid blocking the response
-    try:
-        # Run analysis in background (fire and forget)
-        # In production, you might want to use background tasks
-        import asyncio
-        asyncio.create_task(analyze_and_log_user_text(participant_code, request.text))
-    except Exception as e:
-        logger.warning(f"Failed to schedule text analysis: {e}")
+    schedule_text_analysis(participant_code, request.text)
     
-    # Handle private conversation mode
-    if mode == "private":
-        messages = await handle_private_message(participant_code, request.text)
-        return {"messages": messages}
+    async def event_source():
+        try:
+            async for event in message_events(participant_code, request.text):
+                yield f"event: {event['event']}\ndata: {json.dumps(event['data'], ensure_ascii=False)}\n\n"
+        except Exception as e:
+            logger.error(f"Message stream failed for {participant_code}: {e}")
+            error = {"type": "error", "content": "Sorry, a server error occurred."}
+            yield f"event: message\ndata: {json.dumps(error)}\n\n"
+        yield "event: done\ndata: {}\n\n"
     
-    # Handle public mode with director logic
-    messages = await handle_public_message(participant_code, request.text)
-    return {"messages": messages}
+    return StreamingResponse(
+        event_source(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 
 @app.post("/api/game/explain")
@@ -272,21 +403,37 @@ async def handle_explain(request: ExplainRequest, current_user=Depends(get_curre
     participant_code = current_user["participant_code"]
     logger.info(f"Explain action from {participant_code}: {request.action}")
     
+    return await run_explain(participant_code, request)
+
+
+async def run_explain(participant_code: str, request: ExplainRequest) -> dict:
+    """Run an explain action (shared by the HTTP and WebSocket transports).
+
+    Explanations only read the game state, so they don't wait for the participant's lock.
+    """
     from config import message_cache
     from utils import save_message_to_cache
     from ai_services import ask_word_spotter, ask_tutor_for_explanation
+    from word_spots import word_spot_index
     from config import CHARACTER_DATA
     
     messages = []
     tutor_data = CHARACTER_DATA["tutor"]
     
+    # Explanations are cached per language level
+    state = await GAME_STATE.get_or_load(participant_code, {})
+    language_level = state.get("current_language_level", "B1")
+    
     if request.action == "init":
         # Get difficult words to explain
         original_text = request.original_text
         if not original_text:
             return {"error": "No text provided"}
         
-        words_to_explain = await ask_word_spotter(original_text)
+        # Static game texts are precomputed; only dynamic text needs the LLM
+        words_to_explain = word_spot_index.words_for(original_text)
+        if words_to_explain is None:
+            words_to_explain = await ask_word_spotter(original_text)
         
         return {
             "message": "init_response",
@@ -302,12 +449,15 @@ async def handle_explain(request: ExplainRequest, current_user=Depends(get_curre
         if not word:
             return {"error": "No word provided"}
         
-        # Use 0 as user_id since we're using participant_code for identification
-        explanation_data = await ask_tutor_for_explanation(
-            0,  # user_id (not used in web version, participant_code is used instead)
-            word, 
-            original_text
-        )
+        explanation_data = word_spot_index.definition_for(word, original_text)
+        if not explanation_data:
+            # Use 0 as user_id since we're using participant_code for identification
+            explanation_data = await ask_tutor_for_explanation(
+                0,  # user_id (not used in web version, participant_code is used instead)
+                word, 
+                original_text,
+                language_level
+            )
         
         definition = explanation_data.get("definition", "No definition available")
         examples = explanation_data.get("examples", [])
@@ -350,7 +500,8 @@ async def handle_explain(request: ExplainRequest, current_user=Depends(get_curre
         explanation_data = await ask_tutor_for_explanation(
             participant_code,
             original_text,
-            original_text
+            original_text,
+            language_level
         )
         
         definition = explanation_data.get("definition", "No definition available")
@@ -385,32 +536,144 @@ async def handle_explain(request: ExplainRequest, current_user=Depends(get_curre
     return {"error": "Unknown action"}
 
 
-@app.websocket("/ws/{participant_code}")
-async def websocket_endpoint(websocket: WebSocket, participant_code: str):
-    """WebSocket endpoint for real-time communication."""
+@app.websocket("/ws")
+async def websocket_endpoint(websocket: WebSocket):
+    """Persistent game channel multiplexing actions, messages and explanations.
+
+    The first frame must be ``{"type": "auth", "token": ...}``; the server
+    answers with a ``ready`` event. Requests are ``{"id", "type", ...}`` with
+    type ``start``, ``action`` (``action``), ``message`` (``text``) or
+    ``explain`` (the ExplainRequest fields). Each request is answered with
+    frames ``{"id", "event", "data"}``: streamed ``message``,
+    ``character_start`` and ``token`` events for chat messages, a ``result``
+    holding the body the HTTP endpoint would return, or an ``error``, and
+    always a final ``done``. Tutor feedback from the background analysis is
+    pushed as a ``tutor_feedback`` event without an id. Requests run
+    concurrently, so an explanation doesn't wait behind a character reply.
+    """
+    from config import WS_AUTH_TIMEOUT_SECONDS
+    from game_handlers import start_game_handler
+    from participant_locks import participant_locks
+    
     await websocket.accept()
-    logger.info(f"WebSocket connection opened for participant: {participant_code}")
     
     try:
-        while True:
-            data = await websocket.receive_json()
+        frame = await asyncio.wait_for(websocket.receive(), timeout=WS_AUTH_TIMEOUT_SECONDS)
+    except asyncio.TimeoutError:
+        frame = {}
+    if frame.get("type") == "websocket.disconnect":
+        return
+    try:
+        # A binary or malformed first frame is a failed authentication
+        auth = json.loads(frame["text"]) if frame.get("text") is not None else None
+    except ValueError:
+        auth = None
+    
+    token = auth.get("token") if isinstance(auth, dict) and auth.get("type") == "auth" else None
+    session = validate_session_token(token) if isinstance(token, str) else None
+    if not session:
+        await websocket.send_json({"event": "error", "data": {"detail": "Invalid or expired token"}})
+        await websocket.close(code=4401)
+        return
+    
+    participant_code = session["participant_code"]
+    logger.info(f"WebSocket connection opened for participant: {participant_code}")
+    
+    send_lock = asyncio.Lock()
+    tasks = set()
+    closed = False
+    
+    async def send(frame: dict):
+        # Requests that finish after the client left still run to completion (state is saved),
+        # their frames are just dropped
+        if closed:
+            return
+        async with send_lock:
+            try:
+                await websocket.send_json(frame)
+            except Exception as e:
+                logger.info(f"WebSocket send to {participant_code} failed: {e}")
+    
+    def spawn(coro):
+        task = asyncio.create_task(coro)
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+    
+    async def push_tutor_feedback(analysis: asyncio.Future):
+        try:
+            feedback = await asyncio.shield(analysis)
+        except Exception as e:
+            logger.warning(f"Tutor analysis for {participant_code} failed, no feedback pushed: {e}")
+            return
+        if feedback:
+            await send({"event": "tutor_feedback", "data": {"feedback": feedback}})
+    
+    async def serve(request: dict):
+        request_id = request.get("id")
+        kind = request.get("type")
+        try:
+            # The token may expire or be revoked while the connection is open
+            if not validate_session_token(token):
+                await send({"id": request_id, "event": "error", "data": {"detail": "Invalid or expired token"}})
+                await websocket.close(code=4401)
+                return
             
-            # Handle incoming message
-            if "message" in data:
-                text = data["message"]
+            if kind == "message":
+                text = str(request.get("text") or "")
                 logger.info(f"WebSocket message from {participant_code}: {text}")
-                
-                # TODO: Process through game handlers
-                response = {
-                    "type": "message",
-                    "content": f"Echo: {text}",
-                    "sender": "bot"
-                }
-                
-                await websocket.send_json(response)
-            
+                analysis = schedule_text_analysis(participant_code, text)
+                if analysis is not None:
+                    spawn(push_tutor_feedback(analysis))
+                async for event in message_events(participant_code, text):
+                    await send({"id": request_id, **event})
+            elif kind == "action":
+                action = str(request.get("action") or "")
+                logger.info(f"WebSocket action from {participant_code}: {action}")
+                messages = await run_game_action(participant_code, action)
+                await send({"id": request_id, "event": "result", "data": {"messages": messages}})
+            elif kind == "explain":
+                explain_request = ExplainRequest(**{
+                    key: request.get(key) for key in ("action", "message_id", "word", "original_text")
+                })
+                logger.info(f"WebSocket explain action from {participant_code}: {explain_request.action}")
+                result = await run_explain(participant_code, explain_request)
+                await send({"id": request_id, "event": "result", "data": result})
+            elif kind == "start":
+                async with participant_locks.hold(participant_code):
+                    messages = await start_game_handler(participant_code)
+                await send({"id": request_id, "event": "result",
+                            "data": {"messages": messages, "participant_code": participant_code}})
+            elif kind == "ping":
+                await send({"id": request_id, "event": "pong", "data": {}})
+            else:
+                await send({"id": request_id, "event": "error", "data": {"detail": f"Unknown request type: {kind}"}})
+        except Exception as e:
+            logger.error(f"WebSocket request {kind} from {participant_code} failed: {e}")
+            await send({"id": request_id, "event": "error", "data": {"detail": "Sorry, a server error occurred."}})
+        await send({"id": request_id, "event": "done", "data": {}})
+    
+    await send({"event": "ready", "data": {"participant_code": participant_code}})
+    
+    try:
+        while True:
+            frame = await websocket.receive()
+            if frame["type"] == "websocket.disconnect":
+                raise WebSocketDisconnect(frame.get("code", 1000))
+            if frame.get("text") is None:
+                # Requests are JSON text frames; binary frames are rejected, not fatal
+                await send({"event": "error", "data": {"detail": "Binary frames are not supported"}})
+                continue
+            try:
+                request = json.loads(frame["text"])
+            except ValueError:
+                await send({"event": "error", "data": {"detail": "Malformed frame"}})
+                continue
+            if isinstance(request, dict):
+                spawn(serve(request))
     except WebSocketDisconnect:
         logger.info(f"WebSocket connection closed for participant: {participant_code}")
+    finally:
+        closed = True
 
 
 if __name__ == "__main__":
@@ -0,0 +1,96 @@
+"""
+Per-participant serialization of state-mutating work.
+
+A participant's game state and dialogue history are plain dicts mutated
+across ``await`` points. Without serialization, a double-clicked action or
+an action sent over the WebSocket while a character reply is still
+streaming interleaves with the running handler, and whichever save runs
+last wins with a stale view. Work that mutates the state runs under the
+participant's lock; read-only work (menus, the progress report,
+explanations) skips it.
+
+Locks exist only while they are held or awaited. Wait times are recorded,
+and waits longer than PARTICIPANT_LOCK_WARN_SECONDS are logged.
+"""
+
+import asyncio
+import logging
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Deque, Dict
+
+from config import PARTICIPANT_LOCK_WARN_SECONDS
+
+logger = logging.getLogger(__name__)
+
+
+class ParticipantLocks:
+    """One asyncio lock per participant, with wait-time metrics."""
+
+    def __init__(self, name: str, warn_after: float = PARTICIPANT_LOCK_WARN_SECONDS):
+        self.name = name
+        self.warn_after = warn_after
+        self._locks: Dict[Any, asyncio.Lock] = {}
+        self._users: Dict[Any, int] = {}  # holders and waiters per key
+        self._waits: Deque[float] = deque(maxlen=500)
+        self.stats = {"acquired": 0, "contended": 0, "slow_waits": 0, "max_wait": 0.0}
+
+    @asynccontextmanager
+    async def hold(self, key: Any) -> AsyncIterator[float]:
+        """Hold the lock of ``key``; yields the seconds spent waiting for it."""
+        lock = self._locks.get(key)
+        if lock is None:
+            lock = self._locks[key] = asyncio.Lock()
+        self._users[key] = self._users.get(key, 0) + 1
+        contended = lock.locked()
+        started = time.monotonic()
+        try:
+            await lock.acquire()
+        except BaseException:
+            self._leave(key)
+            raise
+
+        wait = time.monotonic() - started
+        self._record(key, wait, contended)
+        try:
+            yield wait
+        finally:
+            lock.release()
+            self._leave(key)
+
+    def _leave(self, key: Any):
+        remaining = self._users.get(key, 1) - 1
+        if remaining:
+            self._users[key] = remaining
+        else:
+            self._users.pop(key, None)
+            self._locks.pop(key, None)
+
+    def _record(self, key: Any, wait: float, contended: bool):
+        self.stats["acquired"] += 1
+        self._waits.append(wait)
+        if contended:
+            self.stats["contended"] += 1
+        self.stats["max_wait"] = max(self.stats["max_wait"], round(wait, 3))
+        if wait >= self.warn_after:
+            self.stats["slow_waits"] += 1
+            logger.warning(f"Waited {wait:.2f}s for the {self.name} lock of participant {key}")
+
+    def is_locked(self, key: Any) -> bool:
+        lock = self._locks.get(key)
+        return lock is not None and lock.locked()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Counters plus mean and 95th percentile of recent wait times in seconds."""
+        waits = sorted(self._waits)
+        return dict(
+            self.stats,
+            active=len(self._locks),
+            avg_wait=round(sum(waits) / len(waits), 4) if waits else None,
+            p95_wait=round(waits[min(len(waits) - 1, int(len(waits) * 0.95))], 4) if waits else None,
+        )
+
+
+# Global instance
+participant_locks = ParticipantLocks("game state")
@@ -8,6 +8,7 @@ import json
 import random
 from typing import Dict, List, Optional, Any
 from config import GAME_STATE
+from keyword_matcher import KeywordMatcher, LabelMatch
 
 # Dictionary of keywords for main investigation topics
 KEYWORD_PATTERNS = {
@@ -206,75 +207,58 @@ KEYWORD_PATTERNS = {
     }
 }
 
-def detect_topic_from_keywords(message: str) -> Optional[str]:
+# Name forms used to address each character
+CHARACTER_NAMES = {
+    "tim": ["tim", "тим"],
+    "pauline": ["pauline", "полин"],
+    "fiona": ["fiona", "фиона"],
+    "ronnie": ["ronnie", "ронни"]
+}
 
-    message_lower = message.lower()
-    
-    # Check each topic
-    for topic_key, topic_data in KEYWORD_PATTERNS.items():
-        keywords = topic_data["keywords"]
-        
-        # Look for keyword matches
-        for keyword in keywords:
-            if keyword.lower() in message_lower:
-                return topic_key
-    
-    return None
+# Question words that make "Tim where..." a direct address
+QUESTION_WORDS = ["what", "where", "when", "why", "how", "who", "which", "whose", 
+                  "что", "где", "когда", "почему", "как", "кто", "чей", "какой"]
+
+# Compiled once at import; matching is a single pass over the message
+TOPIC_MATCHER = KeywordMatcher({topic_key: topic_data["keywords"] for topic_key, topic_data in KEYWORD_PATTERNS.items()},
+                               plurals=True)
+CHARACTER_MATCHER = KeywordMatcher(CHARACTER_NAMES)
+
+_NAME_TO_CHARACTER = {name: char_key for char_key, names in CHARACTER_NAMES.items() for name in names}
+_NAMES = "|".join(re.escape(name) for name in sorted(_NAME_TO_CHARACTER, key=len, reverse=True))
+_QUESTIONS = "|".join(re.escape(word) for word in QUESTION_WORDS)
+_STRICT_ADDRESS_PATTERNS = [
+    # Pattern 1: "Tim, question..." - name at start with comma
+    re.compile(rf"^({_NAMES}),"),
+    # Pattern 2: "question..., Tim?" - name at end with comma
+    re.compile(rf", ({_NAMES})\??$"),
+    # Pattern 3: "Tim what/where/when/why/how..." - name at start + question word
+    re.compile(rf"^({_NAMES}) +(?:{_QUESTIONS})[ ,]"),
+]
+
+def match_topics(message: str) -> List[LabelMatch]:
+    """All topics whose keywords occur in the message as whole words, with hit positions and scores, best first."""
+    return TOPIC_MATCHER.match(message)
+
+def detect_topic_from_keywords(message: str) -> Optional[str]:
+    """Returns the best matching topic for a message, or None."""
+    matches = match_topics(message)
+    return matches[0].label if matches else None
 
 def extract_character_from_message(message: str) -> Optional[str]:
     """Extracts character name from message, including various forms of address."""
-    message_lower = message.lower()
-    
-    character_names = {
-        "tim": ["tim", "тим"],
-        "pauline": ["pauline", "полин"],
-        "fiona": ["fiona", "фиона"],
-        "ronnie": ["ronnie", "ронни"]
-    }
-    
-    # Search anywhere in message (old logic for predefined responses)
-    for char_key, names in character_names.items():
-        for name in names:
-            if name in message_lower:
-                return char_key
-    
-    return None
+    # Search anywhere in message (old logic for predefined responses); the first name mentioned wins
+    hits = CHARACTER_MATCHER.find_all(message)
+    return hits[0].label if hits else None
 
 def extract_character_from_message_strict(message: str) -> Optional[str]:
     """Strictly determines direct addresses to characters, excluding random mentions."""
     message_lower = message.lower().strip()
     
-    character_names = {
-        "tim": ["tim", "тим"],
-        "pauline": ["pauline", "полин"],
-        "fiona": ["fiona", "фиона"],
-        "ronnie": ["ronnie", "ронни"]
-    }
-    
-    # Pattern 1: "Tim, question..." - name at start with comma
-    for char_key, names in character_names.items():
-        for name in names:
-            if message_lower.startswith(f"{name},"):
-                return char_key
-    
-    # Pattern 2: "question..., Tim?" - name at end with comma
-    for char_key, names in character_names.items():
-        for name in names:
-            if message_lower.endswith(f", {name}?") or message_lower.endswith(f", {name}"):
-                return char_key
-    
-    # Pattern 3: "Tim what/where/when/why/how..." - name at start + question word
-    question_words = ["what", "where", "when", "why", "how", "who", "which", "whose", 
-                     "что", "где", "когда", "почему", "как", "кто", "чей", "какой"]
-    
-    for char_key, names in character_names.items():
-        for name in names:
-            if message_lower.startswith(f"{name} "):
-                # Check if there's a question word after the name
-                remaining_text = message_lower[len(name):].strip()
-                for q_word in question_words:
-                    if remaining_text.startswith(q_word + " ") or remaining_text.startswith(q_word + ","):
-                        return char_key
+    for pattern in _STRICT_ADDRESS_PATTERNS:
+        match = pattern.search(message_lower)
+        if match:
+            return _NAME_TO_CHARACTER[match.group(1)]
     
     return None
 
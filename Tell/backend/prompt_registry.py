@@ -0,0 +1,137 @@
+"""
+Registry of final character system prompts.
+
+Every (character, language level) system prompt — character prompt,
+language requirements for the level and the identity reminder — is built
+once at startup instead of on every dialogue call. Each compiled prompt
+carries its token estimate and a content hash that downstream caches can use
+in their keys; ``file_hash`` gives the same hash for single prompt files.
+
+With PROMPT_HOT_RELOAD set (for development), the prompt files are polled
+for changes and changed prompts are recompiled without a restart.
+"""
+
+import asyncio
+import hashlib
+import logging
+import os
+from typing import Dict, NamedTuple, Optional, Tuple
+
+from config import CHARACTER_DATA, PROMPT_HOT_RELOAD, PROMPT_RELOAD_INTERVAL_SECONDS
+from utils import clear_prompt_cache, estimate_tokens, load_system_prompt
+
+logger = logging.getLogger(__name__)
+
+_BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+PROMPTS_DIR = "prompts"
+LANGUAGE_LEVELS = ("A2", "B1", "B2")
+# Characters that speak in the game and get language requirements and the identity reminder
+GAME_CHARACTERS = ("narrator", "tim", "fiona", "pauline", "ronnie")
+
+
+class CompiledPrompt(NamedTuple):
+    text: str
+    tokens: int
+    hash: str
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:16]
+
+
+def _compile(character_key: str, language_level: str) -> CompiledPrompt:
+    character_prompt = load_system_prompt(f"{PROMPTS_DIR}/prompt_{character_key}.md")
+    if character_key in GAME_CHARACTERS:
+        language_requirements = load_system_prompt(f"{PROMPTS_DIR}/language_learning/{language_level.lower()}.md")
+        char_name = CHARACTER_DATA.get(character_key, {}).get("full_name", character_key)
+        text = (
+            f"{character_prompt}\n\n---\n\n## Language Requirements\n{language_requirements}"
+            f"\n\nIMPORTANT: You are {char_name}. You must respond ONLY as {char_name}, speaking in first person "
+            f"about YOUR OWN experiences and observations. Do not speak for other characters or describe their actions."
+        )
+    else:
+        # Non-game characters (like the tutor) use their prompt file as is
+        text = character_prompt
+    return CompiledPrompt(text, estimate_tokens(text), text_hash(text))
+
+
+class PromptRegistry:
+    """Compiled (character, level) system prompts, recompiled when their files change."""
+
+    def __init__(self, hot_reload: bool = PROMPT_HOT_RELOAD, interval: float = PROMPT_RELOAD_INTERVAL_SECONDS):
+        self.hot_reload = hot_reload
+        self.interval = interval
+        self._prompts: Dict[Tuple[str, str], CompiledPrompt] = {}
+        self._mtimes: Dict[str, float] = {}
+        self._watcher: Optional[asyncio.Task] = None
+
+    def compile_all(self):
+        """Compile the prompt of every game character at every language level."""
+        for character_key in GAME_CHARACTERS:
+            for language_level in LANGUAGE_LEVELS:
+                self._prompts[(character_key, language_level)] = _compile(character_key, language_level)
+        self._mtimes = self._scan()
+        total = sum(prompt.tokens for prompt in self._prompts.values())
+        logger.info(f"Compiled {len(self._prompts)} character prompts (~{total} tokens)")
+
+    def get(self, character_key: str, language_level: str = "B1") -> CompiledPrompt:
+        """The final system prompt for a character at a language level, compiled on first use."""
+        key = (character_key, (language_level or "B1").upper())
+        prompt = self._prompts.get(key)
+        if prompt is None:
+            prompt = self._prompts[key] = _compile(*key)
+        return prompt
+
+    def file_hash(self, filepath: str) -> str:
+        """Content hash of a single prompt file, e.g. for cache keys of tutor answers."""
+        return text_hash(load_system_prompt(filepath))
+
+    # --- Hot reload ---
+
+    def _scan(self) -> Dict[str, float]:
+        mtimes = {}
+        for root, _, names in os.walk(os.path.join(_BASE_DIR, PROMPTS_DIR)):
+            for name in names:
+                path = os.path.join(root, name)
+                try:
+                    mtimes[os.path.relpath(path, _BASE_DIR).replace(os.sep, "/")] = os.path.getmtime(path)
+                except OSError:
+                    pass
+        return mtimes
+
+    def reload_if_changed(self) -> bool:
+        """Recompile if any prompt file was added, removed or modified. Returns True if it did."""
+        mtimes = self._scan()
+        changed = {path for path in mtimes.keys() | self._mtimes.keys() if mtimes.get(path) != self._mtimes.get(path)}
+        if not changed:
+            return False
+        for path in changed:
+            clear_prompt_cache(path)
+        self._prompts.clear()
+        self.compile_all()
+        logger.info(f"Reloaded prompts after changes to {sorted(changed)}")
+        return True
+
+    async def _watch(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await asyncio.to_thread(self.reload_if_changed)
+            except Exception as e:
+                logger.warning(f"Prompt reload failed: {e}")
+
+    def start(self):
+        """Compile all prompts and, with hot reload enabled, start watching the prompt files."""
+        self.compile_all()
+        if self.hot_reload and self._watcher is None:
+            self._watcher = asyncio.get_running_loop().create_task(self._watch())
+            logger.info(f"Watching {PROMPTS_DIR}/ for changes every {self.interval}s")
+
+    def stop(self):
+        if self._watcher is not None:
+            self._watcher.cancel()
+            self._watcher = None
+
+
+# Global instance
+prompt_registry = PromptRegistry()
@@ -0,0 +1,246 @@
+"""
+Linear-time corruption checks for LLM responses.
+
+The corruption patterns are compiled once at import and each one sits behind
+a cheap substring or character-count prefilter, so a clean response is
+checked with a handful of C-level scans instead of a dozen regex searches.
+Repeated words and phrases are found in one pass over the word list with a
+hash-based trigram counter instead of re-counting every trigram over the
+whole text. StreamingValidator applies the same checks incrementally to a
+token stream so a corrupted generation can be abandoned early.
+"""
+
+import re
+from collections import deque
+from typing import Dict, List, Optional, Tuple
+
+# Telegram's message length limit
+TELEGRAM_MAX_MESSAGE_LENGTH = 4096
+# Responses longer than this get the character variety check
+LONG_RESPONSE_CHARS = 2000
+# Fewer distinct characters than this in a long response suggests repetition
+MIN_CHAR_VARIETY = 20
+# The same word repeated this many times in a row indicates a broken generation
+REPEATED_WORD_RUN = 11
+# Phrase repetition is only checked for responses with more words than this
+PHRASE_CHECK_MIN_WORDS = 50
+# A three-word phrase may appear at most this many times
+PHRASE_REPEAT_LIMIT = 5
+# Average word length is only checked for responses with more words than this
+GIBBERISH_CHECK_MIN_WORDS = 10
+# Unusually long average word length indicates gibberish
+MAX_AVG_WORD_LENGTH = 15
+
+# Patterns of the form x{n,} are plain substring tests for x repeated n times
+# (checked against the lowercased text, which makes them case-insensitive)
+_LITERAL_RUNS: List[Tuple[str, str]] = [
+    ("dashes", "-" * 20),  # Excessive dashes
+    ("commas", "," * 10),  # 10+ consecutive commas
+    ("test_repeat", "test" * 8),  # "test" repeated 8+ times
+    ("option_repeat", "option" * 8),  # "option" repeated 8+ times
+]
+
+# Regex patterns that only run when one of their literal parts occurs in the lowercased text
+_KEYWORD_PATTERNS: List[Tuple[str, "re.Pattern", Tuple[str, ...]]] = [
+    # Random code-like patterns
+    ("code_tokens",
+     re.compile(r'(?:BuilderFactory|externalActionCode|RODUCTION|\.visitInsn){5,}', re.IGNORECASE),
+     ("builderfactory", "externalactioncode", "roduction", ".visitinsn")),
+    # Random programming terms repeated
+    ("programming_terms",
+     re.compile(r'(?:PSI|MAV|Basel|Toastr|contaminants|roscope){5,}', re.IGNORECASE),
+     ("psi", "mav", "basel", "toastr", "contaminants", "roscope")),
+]
+
+# Regex patterns that only run when the text has enough of the relevant characters
+_COUNTED_PATTERNS: List[Tuple[str, "re.Pattern", Tuple[str, ...], int]] = [
+    # Excessive parentheses or brackets
+    ("brackets", re.compile(r'[\(\)\[\]]{10,}'), ("(", ")", "[", "]"), 10),
+    # Excessive quotes
+    ("quotes", re.compile(r'["\']{15,}'), ('"', "'"), 15),  # 15+ consecutive quote characters
+    # Comma-separated repeated words
+    ("quoted_list", re.compile(r'(?:"[^"]*",\s*){20,}'), ('",',), 20),  # 20+ comma-separated quoted items
+]
+
+# Special tokens and fragments that indicate a broken generation
+_SUSPICIOUS_TOKENS = [token.lower() for token in (
+    'AssistantClass', '<|python_tag|>', '<|reserved_special_token_', '"}"}"}"}',
+    'scalablytyped', 'надлеж', 'кто-то', '...",",",",",",",",",",",",",",",",",",",",'
+)]
+
+
+def find_pattern(text: str, lowered: Optional[str] = None) -> Optional[str]:
+    """Check text for every corruption pattern and suspicious token."""
+    if lowered is None:
+        lowered = text.lower()
+
+    for name, run in _LITERAL_RUNS:
+        if run in lowered:
+            return f"pattern '{name}'"
+
+    for name, pattern, keywords in _KEYWORD_PATTERNS:
+        if any(keyword in lowered for keyword in keywords):
+            match = pattern.search(text)
+            if match:
+                return f"pattern '{name}': '{match.group(0)[:20]}...'"
+
+    for name, pattern, chars, minimum in _COUNTED_PATTERNS:
+        if sum(text.count(char) for char in chars) >= minimum:
+            match = pattern.search(text)
+            if match:
+                return f"pattern '{name}': '{match.group(0)[:20]}...'"
+
+    for token in _SUSPICIOUS_TOKENS:
+        if token in lowered:
+            return f"suspicious token '{token[:20]}'"
+
+    return None
+
+
+def find_repeated_word(words: List[str], run_length: int = REPEATED_WORD_RUN) -> Optional[str]:
+    """Return a word repeated run_length or more times in a row (case-insensitive)."""
+    previous = None
+    run = 0
+    for word in words:
+        folded = word.casefold()
+        if folded == previous:
+            run += 1
+            if run >= run_length:
+                return word
+        else:
+            previous = folded
+            run = 1
+    return None
+
+
+def find_repeated_phrase(words: List[str], limit: int = PHRASE_REPEAT_LIMIT) -> Optional[str]:
+    """Return the first three-word phrase occurring more than limit times, in one pass."""
+    counts: Dict[Tuple[str, str, str], int] = {}
+    for i in range(len(words) - 2):
+        trigram = (words[i], words[i + 1], words[i + 2])
+        count = counts.get(trigram, 0) + 1
+        if count > limit:
+            return " ".join(trigram)
+        counts[trigram] = count
+    return None
+
+
+def find_corruption(response: str) -> Optional[str]:
+    """Return a short description of the first problem found in a stripped response, or None."""
+    # Check for suspiciously long responses that might indicate corruption
+    if len(response) > LONG_RESPONSE_CHARS:
+        char_variety = len(set(response) - {' ', '\n', '\t'})
+        if char_variety < MIN_CHAR_VARIETY:  # Very low character variety suggests repetition
+            return f"long response with low character variety ({char_variety} unique chars)"
+
+    problem = find_pattern(response)
+    if problem:
+        return problem
+
+    words = response.split()
+    repeated_word = find_repeated_word(words)
+    if repeated_word:
+        return f"same word repeated: '{repeated_word[:20]}'"
+
+    if len(words) > PHRASE_CHECK_MIN_WORDS:
+        phrase = find_repeated_phrase(words)
+        if phrase:
+            return f"excessive phrase repetition: '{phrase}'"
+
+    # Check for reasonable character-to-word ratio (detect gibberish)
+    if len(words) > GIBBERISH_CHECK_MIN_WORDS:
+        avg_word_length = (len(response) - response.count(' ')) / len(words)
+        if avg_word_length > MAX_AVG_WORD_LENGTH:
+            return f"suspicious word length pattern (avg: {avg_word_length})"
+
+    return None
+
+
+class StreamingValidator:
+    """Incremental corruption checks for a response arriving as a token stream.
+
+    feed() returns False as soon as a problem is detected. Pattern checks run
+    every ``scan_interval`` characters over the new text plus a bounded tail
+    of earlier text, and word runs and phrase repetition are tracked with
+    running counters, so total work stays linear in the response length. The
+    complete text should still go through the regular validation once the
+    stream ends.
+    """
+
+    def __init__(self, window: int = 256, scan_interval: int = 256):
+        self.window = window
+        self.scan_interval = scan_interval
+        self.problem: Optional[str] = None
+        self.length = 0
+        self.word_count = 0
+        self._parts: List[str] = []
+        self._unscanned = ""
+        self._tail = ""
+        self._partial_word = ""
+        self._previous_word: Optional[str] = None
+        self._word_run = 0
+        self._recent_words: deque = deque(maxlen=2)
+        self._trigram_counts: Dict[Tuple[str, str, str], int] = {}
+        self._repeated_phrase: Optional[str] = None
+
+    @property
+    def text(self) -> str:
+        return "".join(self._parts)
+
+    def feed(self, chunk: str) -> bool:
+        """Consume the next chunk. Returns False once the stream looks corrupted."""
+        if not chunk:
+            return self.problem is None
+        self._parts.append(chunk)
+        self.length += len(chunk)
+        if self.problem:
+            return False
+
+        problem = None
+        self._unscanned += chunk
+        if len(self._unscanned) >= self.scan_interval:
+            problem = self._scan()
+
+        text = self._partial_word + chunk
+        words = text.split()
+        if words and not text[-1].isspace():
+            # The last word may continue in the next chunk
+            self._partial_word = words.pop()
+        else:
+            self._partial_word = ""
+        for word in words:
+            problem = self._add_word(word) or problem
+
+        if problem is None and self._repeated_phrase and self.word_count > PHRASE_CHECK_MIN_WORDS:
+            problem = f"excessive phrase repetition: '{self._repeated_phrase}'"
+
+        self.problem = problem
+        return problem is None
+
+    def _scan(self) -> Optional[str]:
+        scan = self._tail + self._unscanned
+        self._tail = scan[-self.window:]
+        self._unscanned = ""
+        return find_pattern(scan)
+
+    def _add_word(self, word: str) -> Optional[str]:
+        problem = None
+        self.word_count += 1
+
+        folded = word.casefold()
+        if folded == self._previous_word:
+            self._word_run += 1
+            if self._word_run >= REPEATED_WORD_RUN:
+                problem = f"same word repeated: '{word[:20]}'"
+        else:
+            self._previous_word = folded
+            self._word_run = 1
+
+        if len(self._recent_words) == 2:
+            trigram = (self._recent_words[0], self._recent_words[1], word)
+            count = self._trigram_counts.get(trigram, 0) + 1
+            self._trigram_counts[trigram] = count
+            if count > PHRASE_REPEAT_LIMIT and self._repeated_phrase is None:
+                self._repeated_phrase = " ".join(trigram)
+        self._recent_words.append(word)
+        return problem
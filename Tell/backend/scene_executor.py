@@ -0,0 +1,140 @@
+"""
+Concurrent execution of director scenes.
+
+A director scene is a list of actions (character replies, reactions and
+director notes). Replies that don't refer to what another character in the
+same scene said are independent and can be generated at the same time;
+reactions and replies that mention an earlier speaker wait for that speaker.
+Events are still emitted so that every action appears in scene order, and
+dialogue is appended to the shared history in scene order.
+"""
+
+import asyncio
+import logging
+import re
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Set
+
+from config import CHARACTER_DATA, SCENE_CONCURRENT_ACTIONS
+
+logger = logging.getLogger(__name__)
+
+# Phrases in a trigger message that refer to everything said before it in the scene
+_ALL_PREVIOUS_MARKERS = (
+    "the others", "others have", "everyone", "both ", "after hearing", "all of them",
+    "someone just", "what was said",
+)
+
+_CHARACTER_ACTIONS = ("character_reply", "character_reaction")
+
+# Strong references to action tasks that are still running
+_running: Set[asyncio.Task] = set()
+
+# Builds the event stream for one action; receives the action's history turn
+ActionRunner = Callable[[Callable[[], Awaitable]], AsyncIterator[Dict]]
+
+
+def _name_patterns(char_key: str) -> List["re.Pattern"]:
+    names = {char_key.lower()}
+    full_name = CHARACTER_DATA.get(char_key, {}).get("full_name")
+    if full_name:
+        names.add(full_name.split()[0].lower())
+    return [re.compile(rf"\b{re.escape(name)}\b") for name in names]
+
+
+def scene_dependencies(scene: List[Dict]) -> List[Set[int]]:
+    """For each scene action, the indexes of earlier actions it has to wait for.
+
+    A character action depends on an earlier character action if it is a
+    ``character_reaction``, lists it in ``data.depends_on`` (by index or
+    character key), mentions that character by name, or refers to "the
+    others"/"everyone". An explicit ``depends_on`` (even an empty one)
+    replaces the guesses from names and phrases. Director notes depend on
+    nothing.
+    """
+    dependencies: List[Set[int]] = []
+    speakers: List[tuple] = []  # (index, character key) of earlier character actions
+
+    for index, action in enumerate(scene):
+        data = action.get("data") or {}
+        deps: Set[int] = set()
+
+        if action.get("action") in _CHARACTER_ACTIONS:
+            trigger = str(data.get("trigger_message") or "").lower()
+            has_explicit = data.get("depends_on") is not None
+            explicit = data.get("depends_on") if has_explicit else []
+            if not isinstance(explicit, list):
+                explicit = [explicit]
+
+            if not SCENE_CONCURRENT_ACTIONS or action.get("action") == "character_reaction" \
+                    or (not has_explicit and any(marker in trigger for marker in _ALL_PREVIOUS_MARKERS)):
+                deps = {earlier for earlier, _ in speakers}
+            else:
+                for earlier, char_key in speakers:
+                    if earlier in explicit or char_key in explicit or (
+                            not has_explicit and any(pattern.search(trigger) for pattern in _name_patterns(char_key))):
+                        deps.add(earlier)
+
+            speakers.append((index, data.get("character_key")))
+
+        dependencies.append(deps)
+    return dependencies
+
+
+async def run_scene(runners: List[ActionRunner], dependencies: List[Set[int]]) -> AsyncIterator[Dict]:
+    """Run scene actions concurrently as their dependencies allow and merge their events.
+
+    Each runner is called with a ``history_turn`` coroutine function that
+    waits until every earlier action has finished, and should await it right
+    before appending to the shared history. The first event of each action is
+    held back until all earlier actions have produced theirs, so messages (or
+    streamed message placeholders) appear in scene order; later events of an
+    action that is already placed are passed through as they arrive.
+    """
+    count = len(runners)
+    finished = [asyncio.Event() for _ in range(count)]
+    queue: asyncio.Queue = asyncio.Queue()
+    end = object()
+
+    def history_turn(index: int) -> Callable[[], Awaitable]:
+        async def wait():
+            for earlier in range(index):
+                await finished[earlier].wait()
+        return wait
+
+    async def run(index: int):
+        try:
+            for dependency in dependencies[index]:
+                await finished[dependency].wait()
+            async for event in runners[index](history_turn(index)):
+                await queue.put((index, event))
+        except Exception as e:
+            logger.error(f"Scene action {index} failed: {e}")
+        finally:
+            finished[index].set()
+            await queue.put((index, end))
+
+    for index in range(count):
+        # If the client goes away, running generations still finish so the history stays consistent
+        task = asyncio.create_task(run(index))
+        _running.add(task)
+        task.add_done_callback(_running.discard)
+    buffered: List[List[Dict]] = [[] for _ in range(count)]
+    ended = [False] * count
+    placed = 0  # actions before this index already emitted their first event
+    remaining = count
+
+    while remaining:
+        index, event = await queue.get()
+        if event is end:
+            ended[index] = True
+            remaining -= 1
+        elif index < placed:
+            yield event
+        else:
+            buffered[index].append(event)
+
+        while placed < count and (buffered[placed] or ended[placed]):
+            for pending in buffered[placed]:
+                yield pending
+            buffered[placed] = []
+            placed += 1
@@ -0,0 +1,105 @@
+"""
+Microbenchmark for the response validator.
+
+Compares the single-pass checks in response_validator with the previous
+implementation (per-call regex compilation plus response.count() for every
+trigram) on clean responses from 512 bytes up to the 4 KB message limit.
+The new validator's time per KB should stay flat while the old one grows
+with input size.
+
+Usage (from Tell/backend):
+    python scripts/bench_validate_response.py
+"""
+
+import os
+import random
+import re
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from response_validator import find_corruption, StreamingValidator  # noqa: E402
+
+_WORDS = (
+    "the detective asked about card party night apartment guitar drive money alibi honda "
+    "remember quiet kitchen balcony music friends coffee rain evening street taxi door "
+    "worried nervous honest careful strange suddenly later earlier maybe probably"
+).split()
+
+
+def legacy_find_corruption(response: str):
+    """The checks as they were before the rewrite, for comparison."""
+    if len(response) > 2000:
+        if len(set(response.replace(' ', '').replace('\n', '').replace('\t', ''))) < 20:
+            return "variety"
+    corruption_patterns = [
+        r'\b(\w+)(\s+\1){10,}',
+        r'(BuilderFactory|externalActionCode|RODUCTION|\.visitInsn){5,}',
+        r'[-]{20,}',
+        r'(PSI|MAV|Basel|Toastr|contaminants|roscope){5,}',
+        r'[\(\)\[\]]{10,}',
+        r'["\'"]{15,}',
+        r'(test){8,}',
+        r'(option){8,}',
+        r'("[^"]*",\s*){20,}',
+        r'[,]{10,}',
+    ]
+    for pattern in corruption_patterns:
+        if re.search(pattern, response, re.IGNORECASE):
+            return pattern
+    words = response.split()
+    if len(words) > 50:
+        for i in range(len(words) - 2):
+            phrase = ' '.join(words[i:i + 3])
+            if response.count(phrase) > 5:
+                return phrase
+    if len(words) > 10:
+        if len(response.replace(' ', '')) / len(words) > 15:
+            return "gibberish"
+    suspicious_endings = [
+        'AssistantClass', '<|python_tag|>', '<|reserved_special_token_', '"}"}"}"}',
+        'scalablytyped', 'надлеж', 'кто-то', '...",",",",",",",",",",",",",",",",",",",",'
+    ]
+    for ending in suspicious_endings:
+        if ending.lower() in response.lower():
+            return ending
+    return None
+
+
+def make_response(size: int, seed: int = 0) -> str:
+    """A clean, non-repetitive response of roughly size characters."""
+    rng = random.Random(seed)
+    words = []
+    length = 0
+    while length < size:
+        word = rng.choice(_WORDS)
+        words.append(word)
+        length += len(word) + 1
+    return " ".join(words)[:size].strip()
+
+
+def stream(text: str, chunk_size: int = 8):
+    validator = StreamingValidator()
+    for i in range(0, len(text), chunk_size):
+        if not validator.feed(text[i:i + chunk_size]):
+            break
+    return validator.problem
+
+
+def main():
+    print(f"{'size':>6} {'legacy ms':>10} {'new ms':>8} {'stream ms':>10} {'legacy us/KB':>13} {'new us/KB':>10}")
+    for size in (512, 1024, 2048, 3072, 4096):
+        text = make_response(size)
+        assert find_corruption(text) is None, find_corruption(text)
+        runs = 200
+        legacy = timeit.timeit(lambda: legacy_find_corruption(text), number=runs) / runs
+        new = timeit.timeit(lambda: find_corruption(text), number=runs) / runs
+        streamed = timeit.timeit(lambda: stream(text), number=runs) / runs
+        kb = size / 1024
+        print(f"{size:>6} {legacy * 1e3:>10.3f} {new * 1e3:>8.3f} {streamed * 1e3:>10.3f} "
+              f"{legacy * 1e6 / kb:>13.1f} {new * 1e6 / kb:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
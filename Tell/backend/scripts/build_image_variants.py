@@ -0,0 +1,36 @@
+"""
+Generate the resized WebP/AVIF/JPEG variants of every image in images/.
+
+The server generates a missing variant on its first request; running this at
+build time (the Dockerfile does) means no player ever waits for one.
+Variants are written to IMAGE_VARIANT_DIR and named after the original's
+content hash, so rerunning after an image changed only adds the new ones.
+
+Only image_pipeline is imported (not config), so it runs at docker build time
+without credentials.
+
+Usage (from Tell/backend):
+    python scripts/build_image_variants.py
+"""
+
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from image_pipeline import image_pipeline  # noqa: E402
+
+
+def main():
+    if not image_pipeline.enabled:
+        sys.exit("Pillow is not installed, cannot generate image variants")
+    generated = asyncio.run(image_pipeline.pregenerate())
+    print(f"Generated {generated} image variants in {image_pipeline.variant_dir} "
+          f"(formats: {', '.join(image_pipeline.formats + ['jpeg/png'])})")
+    if image_pipeline.stats["generation_errors"]:
+        sys.exit(f"{image_pipeline.stats['generation_errors']} variants failed")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""
+Build the precomputed word-spotter artifact for the static game texts.
+
+Runs the word spotter over every text in game_texts/ (including the
+intro-A2/B1/B2 variants and the level confirmation for each level) and
+writes game_texts/word_spots.json, keyed by content hash. With
+--definitions the tutor explanation of every spotted word is stored too.
+Rerun it after editing a game text or the lexicographer/tutor prompt;
+the server ignores an artifact built with a different prompt.
+
+Requires GROQ_API_KEY.
+
+Usage (from Tell/backend):
+    python scripts/precompute_word_spots.py [--definitions] [--concurrency 4]
+"""
+
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ai_services import ask_word_spotter, ask_tutor_for_explanation  # noqa: E402
+from config import LLM_MODEL  # noqa: E402
+from llm_client import llm_client  # noqa: E402
+from utils import load_system_prompt  # noqa: E402
+from word_spots import (  # noqa: E402
+    ARTIFACT_PATH,
+    ARTIFACT_VERSION,
+    LEXICOGRAPHER_PROMPT_FILE,
+    TUTOR_PROMPT_FILE,
+    content_hash,
+    prompt_hash,
+)
+
+GAME_TEXTS_DIR = "game_texts"
+LANGUAGE_LEVELS = ("A2", "B1", "B2")
+
+
+def collect_texts() -> dict:
+    """Map a label to every text the game shows verbatim."""
+    base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    texts = {}
+    for name in sorted(os.listdir(os.path.join(base_dir, GAME_TEXTS_DIR))):
+        if not name.endswith(".txt"):
+            continue
+        text = load_system_prompt(f"{GAME_TEXTS_DIR}/{name}")
+        if name == "level_confirmed.txt":
+            # Shown with the chosen level filled in
+            for level in LANGUAGE_LEVELS:
+                texts[f"{name}[{level}]"] = text.replace("[LEVEL]", level)
+        else:
+            texts[name] = text
+    return texts
+
+
+async def precompute(definitions: bool, concurrency: int) -> dict:
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def process(label: str, text: str) -> dict:
+        async with semaphore:
+            words = await ask_word_spotter(text)
+        entry = {"file": label, "words": words}
+        if definitions:
+            entry["definitions"] = {}
+            for word in words:
+                async with semaphore:
+                    explanation = await ask_tutor_for_explanation(0, word, text)
+                if explanation:
+                    entry["definitions"][word] = explanation
+        print(f"{label}: {len(words)} words")
+        return entry
+
+    texts = collect_texts()
+    entries = await asyncio.gather(*(process(label, text) for label, text in texts.items()))
+
+    artifact = {
+        "version": ARTIFACT_VERSION,
+        "generated_at": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "model": LLM_MODEL,
+        "lexicographer_prompt_hash": prompt_hash(LEXICOGRAPHER_PROMPT_FILE),
+        "texts": {content_hash(text): entry for text, entry in zip(texts.values(), entries)},
+    }
+    if definitions:
+        artifact["tutor_prompt_hash"] = prompt_hash(TUTOR_PROMPT_FILE)
+    return artifact
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--definitions", action="store_true", help="also precompute tutor definitions")
+    parser.add_argument("--concurrency", type=int, default=4, help="LLM calls in flight at once")
+    parser.add_argument("--output", default=ARTIFACT_PATH, help="artifact path")
+    args = parser.parse_args()
+
+    if not llm_client.available:
+        sys.exit("GROQ_API_KEY is required to precompute word spots")
+
+    artifact = asyncio.run(precompute(args.definitions, max(1, args.concurrency)))
+    with open(args.output, "w", encoding="utf-8") as file:
+        json.dump(artifact, file, ensure_ascii=False, indent=1, sort_keys=True)
+        file.write("\n")
+    print(f"Wrote {len(artifact['texts'])} texts to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
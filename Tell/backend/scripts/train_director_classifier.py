@@ -0,0 +1,169 @@
+"""
+Train the local director intent classifier from chat history logs.
+
+Reads chat history files (download them from the bucket first, e.g.
+``gsutil -m cp -r gs://<bucket>/participant_logs/chat_history logs/``),
+pairs every player message with the LLM director decision that followed it,
+and writes the naive Bayes model to models/director_classifier.json.
+Older deployments logged director decisions to
+``user_logs/chat_history_<code>.txt``; download that folder too and the
+files of one participant are joined by timestamp.
+
+Before writing, a held-out share of the decisions is used to report the
+accuracy and coverage (share of messages answered locally) at several
+confidence thresholds, to pick DIRECTOR_CLASSIFIER_THRESHOLD.
+
+Usage (from Tell/backend):
+    python scripts/train_director_classifier.py logs/ [--holdout 0.2] [--output PATH]
+    python scripts/train_director_classifier.py --self-check
+"""
+
+import argparse
+import json
+import os
+import random
+import re
+import sys
+import tempfile
+from typing import Dict, List, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import DIRECTOR_CLASSIFIER_MODEL_PATH  # noqa: E402
+from director_classifier import DirectorClassifier, scene_for_label, scene_label  # noqa: E402
+from utils import chat_history_blob_name  # noqa: E402
+
+# "[2025-01-01 12:00:00 CET] (role): content", content may span several lines
+_ENTRY = re.compile(r"^\[([^\]]+)\] \(([\w-]+)\): ", re.MULTILINE)
+# participant_logs/chat_history/<code>_chat_history.txt or user_logs/chat_history_<code>.txt
+_LOG_NAME = re.compile(r"^(?:(.+)_chat_history|chat_history_(.+))\.txt$")
+THRESHOLDS = (0.5, 0.7, 0.8, 0.9, 0.95, 0.99)
+
+
+def parse_log(text: str) -> List[Tuple[str, str, str]]:
+    """(timestamp, role, content) entries of one chat history file."""
+    matches = list(_ENTRY.finditer(text))
+    return [
+        (match.group(1), match.group(2),
+         text[match.end():matches[i + 1].start() if i + 1 < len(matches) else len(text)].strip())
+        for i, match in enumerate(matches)
+    ]
+
+
+def parse_decision(content: str):
+    start, end = content.find("{"), content.rfind("}")
+    if start < 0 or end < start:
+        return None
+    try:
+        return json.loads(content[start:end + 1])
+    except ValueError:
+        return None
+
+
+def collect_examples(paths: List[str]) -> List[Tuple[str, str]]:
+    """(player message, decision label) pairs from every log file under the given paths."""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, names in os.walk(path):
+                files.extend(os.path.join(root, name) for name in sorted(names) if name.endswith(".txt"))
+        else:
+            files.append(path)
+
+    # Join the files of one participant, wherever each entry was logged
+    participants: Dict[str, list] = {}
+    for file_path in files:
+        match = _LOG_NAME.match(os.path.basename(file_path))
+        participant = (match.group(1) or match.group(2)) if match else file_path
+        with open(file_path, "r", encoding="utf-8", errors="replace") as file:
+            participants.setdefault(participant, []).extend(parse_log(file.read()))
+
+    examples = []
+    for entries in participants.values():
+        # Stable sort: entries of the same second keep their order within a file
+        entries.sort(key=lambda entry: entry[0][:19])
+        last_user_message = None
+        for _, role, content in entries:
+            if role == "user":
+                last_user_message = content
+            elif role == "director" and last_user_message:
+                label = scene_label(parse_decision(content) or {})
+                if label:
+                    examples.append((last_user_message, label))
+                last_user_message = None
+    return examples
+
+
+def self_check():
+    """Check that logs in the layout the server writes yield training pairs."""
+    label = "tim"
+    decision = json.dumps(scene_for_label(label, "fixture"))
+    with tempfile.TemporaryDirectory() as directory:
+        for user_id, participant_code, lines in (
+            (0, "P1", ["[2025-01-01 12:00:00 CET] (user): Where were you last night?\n",
+                       f"[2025-01-01 12:00:01 CET] (director): {decision}\n"]),
+            # Older deployments logged the decision under user_logs
+            (0, "P2", ["[2025-01-01 12:00:00 CET] (user): Who owns the knife?\n"]),
+            ("P2", None, [f"[2025-01-01 12:00:02 CET] (director): {decision}\n"]),
+        ):
+            path = os.path.join(directory, chat_history_blob_name(user_id, participant_code))
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "a", encoding="utf-8") as file:
+                file.writelines(lines)
+        examples = collect_examples([directory])
+    expected = [("Where were you last night?", label), ("Who owns the knife?", label)]
+    if sorted(examples) != expected:
+        sys.exit(f"Self-check failed: expected pairs for {sorted(expected)}, got {examples}")
+    print(f"Self-check passed: {examples}")
+
+
+def report(train, holdout):
+    classifier = DirectorClassifier(path="", mode="shadow")
+    classifier.set_model(DirectorClassifier.train(train))
+    predictions = [(classifier.predict(message), label) for message, label in holdout]
+    print(f"Held-out decisions: {len(holdout)}")
+    for threshold in THRESHOLDS:
+        confident = [(predicted, label) for (predicted, confidence), label in predictions if confidence >= threshold]
+        correct = sum(predicted == label for predicted, label in confident)
+        accuracy = f"{correct / len(confident):.3f}" if confident else "-"
+        print(f"  threshold {threshold:.2f}: coverage {len(confident) / len(holdout):.3f}, accuracy {accuracy}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("paths", nargs="*", help="chat history files or directories")
+    parser.add_argument("--holdout", type=float, default=0.2, help="share of decisions held out for the report")
+    parser.add_argument("--seed", type=int, default=0, help="shuffle seed for the held-out split")
+    parser.add_argument("--output", default=DIRECTOR_CLASSIFIER_MODEL_PATH, help="model path")
+    parser.add_argument("--self-check", action="store_true", help="check the log parsing on a fixture and exit")
+    args = parser.parse_args()
+
+    if args.self_check:
+        self_check()
+        return
+    if not args.paths:
+        parser.error("no chat history paths given")
+
+    examples = collect_examples(args.paths)
+    if not examples:
+        sys.exit("No director decisions found in the given logs")
+    labels = {}
+    for _, label in examples:
+        labels[label] = labels.get(label, 0) + 1
+    print(f"Found {len(examples)} director decisions: {dict(sorted(labels.items(), key=lambda item: -item[1]))}")
+
+    shuffled = examples[:]
+    random.Random(args.seed).shuffle(shuffled)
+    split = int(len(shuffled) * (1 - args.holdout))
+    if 0 < split < len(shuffled):
+        report(shuffled[:split], shuffled[split:])
+
+    model = DirectorClassifier.train(examples)
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, "w", encoding="utf-8") as file:
+        json.dump(model, file, ensure_ascii=False, separators=(",", ":"))
+    print(f"Wrote model ({model['vocabulary_size']} features) to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""
+Coalescing of concurrent identical calls ("single flight").
+
+A double click on Explain, or the same word spotted in two messages at
+once, would otherwise start the same LLM call several times. Callers pass a
+key built from the function name, its normalized inputs and the prompt
+hash; while a call with that key is in flight, further callers wait for it
+and get a copy of its result instead of starting their own.
+
+The call runs as its own task, so a caller that disconnects doesn't cancel
+it for the others. Nothing is cached after the call finishes; that is the
+job of caches such as explanation_cache.
+"""
+
+import asyncio
+import copy
+import hashlib
+import logging
+from typing import Any, Awaitable, Callable, Dict
+
+logger = logging.getLogger(__name__)
+
+
+def make_key(function_name: str, *parts: Any) -> str:
+    """Key for a call of function_name with the given (already normalized) inputs."""
+    digest = hashlib.sha256("\x1f".join(str(part) for part in parts).encode("utf-8")).hexdigest()
+    return f"{function_name}:{digest}"
+
+
+def _consume_exception(task: asyncio.Task):
+    # Mark the exception as retrieved even if every caller went away
+    if not task.cancelled():
+        task.exception()
+
+
+class SingleFlight:
+    """Runs at most one call per key at a time and shares its result with concurrent callers."""
+
+    def __init__(self):
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self.stats = {"calls": 0, "coalesced": 0}
+
+    async def run(self, key: str, call: Callable[[], Awaitable[Any]]) -> Any:
+        """Await ``call()``, or the call already in flight for this key."""
+        task = self._inflight.get(key)
+        if task is not None:
+            self.stats["coalesced"] += 1
+            logger.debug(f"Coalesced duplicate call {key[:40]}")
+            # Callers may modify what they get back
+            return copy.deepcopy(await asyncio.shield(task))
+
+        self.stats["calls"] += 1
+        task = asyncio.ensure_future(call())
+        self._inflight[key] = task
+        task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        task.add_done_callback(_consume_exception)
+        return await asyncio.shield(task)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return dict(self.stats, in_flight=len(self._inflight))
+
+
+# Global instance
+single_flight = SingleFlight()
@@ -0,0 +1,102 @@
+"""
+Precomputed word-spotter results for the static game texts.
+
+The artifact (game_texts/word_spots.json) is produced offline by
+scripts/precompute_word_spots.py and maps a content hash of every game text
+to its difficult words and, optionally, tutor definitions of those words.
+The explain endpoint looks texts up by hash and only calls the LLM for text
+that isn't in the artifact, such as character replies.
+
+The hash ignores whitespace and markdown emphasis markers, so the text a
+browser sends back (rendered, with line breaks and ``*``/``_`` removed)
+matches the file it came from.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import re
+from typing import Any, Dict, List, Optional
+
+from config import CHARACTER_DATA
+
+logger = logging.getLogger(__name__)
+
+ARTIFACT_VERSION = 1
+ARTIFACT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "game_texts", "word_spots.json")
+LEXICOGRAPHER_PROMPT_FILE = "prompts/prompt_lexicographer.md"
+TUTOR_PROMPT_FILE = CHARACTER_DATA["tutor"]["prompt_file"]
+
+_IGNORED_CHARS = re.compile(r"[\s*_]+")
+
+
+def content_hash(text: str) -> str:
+    """Hash of a text that is stable across whitespace and markdown rendering."""
+    canonical = _IGNORED_CHARS.sub("", text or "").casefold()
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def prompt_hash(prompt_file: str) -> str:
+    from prompt_registry import prompt_registry
+    return prompt_registry.file_hash(prompt_file)
+
+
+class WordSpotIndex:
+    """Read-only lookup over the precomputed artifact, loaded on first use."""
+
+    def __init__(self, path: str = ARTIFACT_PATH):
+        self.path = path
+        self._texts: Optional[Dict[str, Dict[str, Any]]] = None
+        self._definitions_valid = False
+        self.stats = {"word_hits": 0, "definition_hits": 0, "misses": 0}
+
+    def _load(self) -> Dict[str, Dict[str, Any]]:
+        if self._texts is not None:
+            return self._texts
+        self._texts = {}
+        try:
+            with open(self.path, "r", encoding="utf-8") as file:
+                artifact = json.load(file)
+        except FileNotFoundError:
+            logger.info(f"No precomputed word spots at {self.path}, using the LLM for all texts")
+            return self._texts
+        except (OSError, ValueError) as e:
+            logger.warning(f"Could not read precomputed word spots: {e}")
+            return self._texts
+
+        if artifact.get("version") != ARTIFACT_VERSION:
+            logger.warning(f"Ignoring word spots artifact with version {artifact.get('version')}")
+            return self._texts
+        # Results made with a different prompt are stale
+        if artifact.get("lexicographer_prompt_hash") != prompt_hash(LEXICOGRAPHER_PROMPT_FILE):
+            logger.warning("Ignoring word spots artifact built with a different lexicographer prompt")
+            return self._texts
+
+        self._texts = artifact.get("texts", {})
+        self._definitions_valid = artifact.get("tutor_prompt_hash") == prompt_hash(TUTOR_PROMPT_FILE)
+        logger.info(f"Loaded precomputed word spots for {len(self._texts)} game texts")
+        return self._texts
+
+    def words_for(self, text: str) -> Optional[List[str]]:
+        """Difficult words of a static game text, or None if the text isn't precomputed."""
+        entry = self._load().get(content_hash(text))
+        if entry is None:
+            self.stats["misses"] += 1
+            return None
+        self.stats["word_hits"] += 1
+        return list(entry.get("words", []))
+
+    def definition_for(self, word: str, text: str) -> Optional[Dict[str, Any]]:
+        """Precomputed tutor explanation of a word in a static game text, if available."""
+        entry = self._load().get(content_hash(text))
+        if entry is None or not self._definitions_valid:
+            return None
+        definition = entry.get("definitions", {}).get(word.strip().lower())
+        if definition:
+            self.stats["definition_hits"] += 1
+        return definition
+
+
+# Global instance
+word_spot_index = WordSpotIndex()
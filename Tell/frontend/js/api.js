@@ -3,6 +3,123 @@ const apiClient = window.apiClient;
 if (!apiClient) {
     throw new Error('apiClient must be loaded before Tell API module');
 }
+
+// Persistent game channel: one authenticated WebSocket that carries actions, messages
+// and explanations, with HTTP as the fallback when it cannot be opened.
+const gameSocket = {
+    socket: null,
+    connecting: null,
+    nextId: 1,
+    pending: new Map()
+};
+
+function connectGameSocket() {
+    if (gameSocket.socket && gameSocket.socket.readyState === WebSocket.OPEN) {
+        return Promise.resolve(true);
+    }
+    if (gameSocket.connecting) {
+        return gameSocket.connecting;
+    }
+    if (!('WebSocket' in window) || !sessionToken) {
+        return Promise.resolve(false);
+    }
+
+    gameSocket.connecting = new Promise((resolve) => {
+        let socket;
+        try {
+            socket = new WebSocket(`${API_URL.replace(/^http/, 'ws')}/ws`);
+        } catch (error) {
+            console.warn('Game socket unavailable:', error);
+            gameSocket.connecting = null;
+            resolve(false);
+            return;
+        }
+
+        socket.onopen = () => {
+            socket.send(JSON.stringify({ type: 'auth', token: sessionToken }));
+        };
+
+        socket.onmessage = (event) => {
+            const frame = JSON.parse(event.data);
+
+            if (frame.event === 'ready') {
+                gameSocket.socket = socket;
+                gameSocket.connecting = null;
+                resolve(true);
+                return;
+            }
+            if (frame.event === 'tutor_feedback') {
+                // Background grammar feedback; the chat stays silent, listeners may show it
+                window.dispatchEvent(new CustomEvent('tutorFeedback', { detail: frame.data }));
+                return;
+            }
+
+            const pending = gameSocket.pending.get(frame.id);
+            if (!pending) return;
+
+            if (frame.event === 'done') {
+                gameSocket.pending.delete(frame.id);
+                pending.resolve({ result: pending.result, error: pending.error });
+            } else if (frame.event === 'result') {
+                pending.result = frame.data;
+            } else if (frame.event === 'error') {
+                pending.error = frame.data;
+            } else {
+                pending.onEvent(frame.event, frame.data);
+            }
+        };
+
+        socket.onclose = () => {
+            if (gameSocket.socket === socket) {
+                gameSocket.socket = null;
+            }
+            gameSocket.connecting = null;
+            for (const pending of gameSocket.pending.values()) {
+                pending.reject(new Error('Game socket closed'));
+            }
+            gameSocket.pending.clear();
+            resolve(false);
+        };
+    });
+
+    return gameSocket.connecting;
+}
+
+function closeGameSocket() {
+    if (gameSocket.socket) {
+        gameSocket.socket.close();
+        gameSocket.socket = null;
+    }
+}
+
+// Send one request over the game socket. Resolves to { result, error } once the server
+// reports it done, or to null if the socket is not open yet (a connection attempt is started).
+async function socketRequest(type, payload = {}, onEvent = () => {}) {
+    if (!gameSocket.socket || gameSocket.socket.readyState !== WebSocket.OPEN) {
+        connectGameSocket();
+        return null;
+    }
+
+    const id = gameSocket.nextId++;
+    return new Promise((resolve, reject) => {
+        gameSocket.pending.set(id, { resolve, reject, onEvent, result: null, error: null });
+        gameSocket.socket.send(JSON.stringify(Object.assign({ id, type }, payload)));
+    });
+}
+
+// Send a request over the game socket, or POST it to the HTTP endpoint if the socket is unavailable.
+// Resolves to { ok, data, statusText } like an HTTP response.
+async function gameRequest(type, path, payload) {
+    const reply = await socketRequest(type, payload);
+    if (reply) {
+        return { ok: !reply.error, data: reply.error || reply.result, statusText: '' };
+    }
+
+    const { response, data } = await apiClient.postJson(path, payload, {
+        token: sessionToken
+    });
+    return { ok: response.ok, data, statusText: response.statusText };
+}
 async function login() {
     const code = document.getElementById('participantCode').value;
     const errorDiv = document.getElementById('loginError');
@@ -99,6 +216,9 @@ async function loadGame() {
         }
 
         console.log('Game data received:', data);
+
+        // Open the game channel in the background; requests use HTTP until it is ready
+        connectGameSocket();
         
         // Remove the loading message
         removeLoadingMessage();
@@ -158,12 +278,10 @@ async function handleAction(action, closeDrawersOnSuccess = true) {
     }
     
     try {
-        const { response, data } = await apiClient.postJson('/api/game/action', { action: action }, {
-            token: sessionToken
-        });
+        const { ok, data, statusText } = await gameRequest('action', '/api/game/action', { action: action });
         console.log('Action response:', data);
 
-        if (!response.ok) {
+        if (!ok) {
             if (isLanguageAdjustment && oldIntroMessage) {
                 const messageText = oldIntroMessage.querySelector('.message-text');
                 const buttonRow = oldIntroMessage.querySelector('.button-row');
@@ -186,7 +304,7 @@ async function handleAction(action, closeDrawersOnSuccess = true) {
                 }
             }
 
-            const errorMessage = (data && (data.detail || data.error || data.message)) || response.statusText || 'Failed to process action';
+            const errorMessage = (data && (data.detail || data.error || data.message)) || statusText || 'Failed to process action';
             addMessage('error', 'Error', errorMessage);
             return;
         }
@@ -307,6 +425,41 @@ async function sendMessage() {
         typingMsg = showTypingIndicator(randomCharacter);
     }
 
+    const removeTyping = () => {
+        if (typingMsg) {
+            typingMsg.remove();
+            typingMsg = null;
+        }
+    };
+
+    const renderEvent = createStreamRenderer(removeTyping);
+    try {
+        const reply = await socketRequest('message', { text }, renderEvent);
+        if (reply) {
+            renderEvent.finish();
+            removeTyping();
+            if (reply.error) {
+                addMessage('bot', 'Error', reply.error.detail || 'Failed to send message');
+            }
+            return;
+        }
+    } catch (error) {
+        renderEvent.finish();
+        removeTyping();
+        addMessage('bot', 'Error', 'Connection lost while receiving the reply');
+        return;
+    }
+
+    try {
+        const streamed = await sendMessageStream(text, removeTyping);
+        if (streamed) {
+            if (typingMsg) typingMsg.remove();
+            return;
+        }
+    } catch (error) {
+        console.warn('Message stream unavailable, falling back to JSON endpoint:', error);
+    }
+
     try {
         const { response, data } = await apiClient.postJson('/api/game/message', { text }, {
             token: sessionToken
@@ -332,18 +485,139 @@ async function sendMessage() {
     }
 }
 
+// Read a text/event-stream response body and call onEvent(name, data) for each event
+async function readEventStream(response, onEvent) {
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+
+    while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+
+        let boundary;
+        while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+            const rawEvent = buffer.slice(0, boundary);
+            buffer = buffer.slice(boundary + 2);
+
+            let name = 'message';
+            const dataLines = [];
+            for (const line of rawEvent.split('\n')) {
+                if (line.startsWith('event:')) {
+                    name = line.slice(6).trim();
+                } else if (line.startsWith('data:')) {
+                    dataLines.push(line.slice(5).trimStart());
+                }
+            }
+            if (dataLines.length > 0) {
+                onEvent(name, JSON.parse(dataLines.join('\n')));
+            }
+        }
+    }
+}
+
+// Send a message through the SSE endpoint, showing character replies while they are generated.
+// Returns false if the stream could not be started, so the caller can use the JSON endpoint instead.
+async function sendMessageStream(text, onFirstEvent) {
+    const { response } = await apiClient.request('/api/game/message/stream', {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json', 'Accept': 'text/event-stream' },
+        token: sessionToken,
+        body: JSON.stringify({ text }),
+        parseJson: false
+    });
+
+    if (!response.ok || !response.body) {
+        return false;
+    }
+
+    const renderEvent = createStreamRenderer(onFirstEvent);
+    let started = false;
+
+    try {
+        await readEventStream(response, (name, data) => {
+            started = true;
+            renderEvent(name, data);
+        });
+    } catch (error) {
+        if (!started) {
+            throw error;
+        }
+        console.error('Message stream interrupted:', error);
+        addMessage('bot', 'Error', 'Connection lost while receiving the reply');
+    }
+
+    renderEvent.finish();
+    return started;
+}
+
+// Build an event handler that shows character replies while they are generated
+// (used for both the game socket and the SSE endpoint)
+function createStreamRenderer(onFirstEvent) {
+    const liveMessages = new Map();
+    let started = false;
+
+    const renderEvent = (name, data) => {
+        if (!started) {
+            started = true;
+            onFirstEvent();
+        }
+
+        if (name === 'character_start') {
+            const messageDiv = displayMessage({
+                type: 'character',
+                character: data.character,
+                character_name: data.character_name,
+                character_image: data.character_image,
+                content: ''
+            });
+            liveMessages.set(data.stream_id, { messageDiv, text: '' });
+        } else if (name === 'token') {
+            const live = liveMessages.get(data.stream_id);
+            const messageText = live?.messageDiv?.querySelector('.message-text');
+            if (messageText) {
+                live.text += data.delta;
+                messageText.textContent = live.text;
+                const chatArea = document.getElementById('chatArea');
+                chatArea.scrollTop = chatArea.scrollHeight;
+            }
+        } else if (name === 'message') {
+            // The final message replaces the streamed draft with the validated text
+            const live = data.stream_id !== undefined ? liveMessages.get(data.stream_id) : null;
+            const messageDiv = displayMessage(data);
+            if (live && live.messageDiv) {
+                if (messageDiv) {
+                    live.messageDiv.replaceWith(messageDiv);
+                } else {
+                    live.messageDiv.remove();
+                }
+                liveMessages.delete(data.stream_id);
+            }
+        }
+    };
+
+    // Drop drafts whose final message never arrived
+    renderEvent.finish = () => {
+        for (const live of liveMessages.values()) {
+            if (live.messageDiv) live.messageDiv.remove();
+        }
+        liveMessages.clear();
+    };
+
+    return renderEvent;
+}
+
 async function explainWord(wordOrPhrase, originalText) {
     try {
-        const { response, data } = await apiClient.postJson('/api/game/explain', {
+        const { ok, data, statusText } = await gameRequest('explain', '/api/game/explain', {
             action: 'word',
             word: wordOrPhrase,
             original_text: originalText
-        }, {
-            token: sessionToken
         });
 
-        if (!response.ok) {
-            const errorMessage = (data && (data.detail || data.error || data.message)) || response.statusText || 'Failed to get explanation';
+        if (!ok) {
+            const errorMessage = (data && (data.detail || data.error || data.message)) || statusText || 'Failed to get explanation';
             addMessage('error', 'Error', errorMessage);
             return;
         }
@@ -362,6 +636,8 @@ async function explainWord(wordOrPhrase, originalText) {
 
 // Logout function
 function logout() {
+    closeGameSocket();
+
     // Clear localStorage
     localStorage.removeItem('sessionToken');
     localStorage.removeItem('participantCode');
@@ -11,7 +11,8 @@ const {
     addMessage,
     showTypingIndicator,
     autoResizeTextarea,
-    buildImageUrl
+    buildImageUrl,
+    IMAGE_WIDTHS
 } = sharedUI;
 
 // Drawer functions
@@ -89,7 +90,7 @@ function showClueDetail(clueId, content, imageUrl) {
     title.textContent = `🔍 Clue ${clueId}`;
     
     let html = '';
-    const clueImageUrl = buildImageUrl(imageUrl);
+    const clueImageUrl = buildImageUrl(imageUrl, IMAGE_WIDTHS.inline);
     if (clueImageUrl) {
         html += `<img src="${clueImageUrl}" alt="Clue ${clueId}" class="clue-detail-image" loading="lazy" onclick="openImageModal('${imageUrl}')" />`;
     }
@@ -142,7 +143,7 @@ function populateCharactersDrawer() {
         item.className = 'drawer-item';
         // Use image if available, otherwise use emoji
         let iconHTML = '';
-        const characterImageUrl = buildImageUrl(char.image);
+        const characterImageUrl = buildImageUrl(char.image, IMAGE_WIDTHS.avatar);
         if (characterImageUrl) {
             iconHTML = `<img src="${characterImageUrl}" alt="${char.name}" loading="lazy" />`;
         } else {
@@ -233,7 +234,7 @@ function openImageModal(imageUrl = null) {
     const overlay = document.getElementById('imageModalOverlay');
     const content = document.getElementById('imageModalContent');
     // Image URL is required - no default header image anymore
-    const resolvedUrl = buildImageUrl(imageUrl);
+    const resolvedUrl = buildImageUrl(imageUrl, IMAGE_WIDTHS.full);
     if (resolvedUrl) {
         content.src = resolvedUrl;
         overlay.classList.add('active');
@@ -32,12 +32,20 @@
             .join('');
     }
 
-    function buildImageUrl(imageFile) {
+    // Widths requested from the image endpoint, which serves a resized WebP/AVIF variant
+    const IMAGE_WIDTHS = {
+        avatar: 160,
+        inline: 640,
+        full: 1280
+    };
+
+    function buildImageUrl(imageFile, width = null) {
         if (!imageFile) {
             return null;
         }
         if (global.API_URL) {
-            return `${global.API_URL}/api/images/${imageFile}`;
+            const query = width ? `?w=${width}` : '';
+            return `${global.API_URL}/api/images/${imageFile}${query}`;
         }
         return imageFile;
     }
@@ -58,7 +66,7 @@
             messageDiv.classList.add('typewriter-intro');
         }
 
-        const avatarUrl = buildImageUrl(senderAvatar);
+        const avatarUrl = buildImageUrl(senderAvatar, IMAGE_WIDTHS.avatar);
         if (avatarUrl && type !== 'user') {
             const avatar = document.createElement('img');
             avatar.src = avatarUrl;
@@ -77,7 +85,7 @@
             <div class="message-text">${renderedContent}</div>
         `;
 
-        const clueImageUrl = buildImageUrl(imageUrl);
+        const clueImageUrl = buildImageUrl(imageUrl, IMAGE_WIDTHS.inline);
         if (clueImageUrl) {
             const imageDiv = document.createElement('div');
             const img = document.createElement('img');
@@ -135,7 +143,7 @@
         typingDiv.className = 'message character typing-message';
         typingDiv.id = options.typingIndicatorId || 'typing-indicator';
 
-        const avatarUrl = buildImageUrl(character?.image);
+        const avatarUrl = buildImageUrl(character?.image, IMAGE_WIDTHS.avatar);
         if (avatarUrl) {
             const avatar = document.createElement('img');
             avatar.src = avatarUrl;
@@ -187,7 +195,8 @@
         addMessage,
         showTypingIndicator,
         autoResizeTextarea,
-        buildImageUrl
+        buildImageUrl,
+        IMAGE_WIDTHS
     };
 })(window);
 
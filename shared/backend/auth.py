@@ -1,50 +1,143 @@
 """
 Authentication module for the web application.
 Simple participant code authentication for research purposes.
+
+Session tokens are self-contained and HMAC-signed, so any instance can
+validate them without a lookup:
+
+    v1.<key id>.<base64url payload>.<base64url signature>
+
+The payload holds the participant code, issue/expiry timestamps and a token
+id. Signing keys come from the ``session-signing-keys`` secret (or the
+SESSION_SIGNING_KEYS environment variable) as ``kid:secret`` pairs separated
+by commas; the first key signs new tokens and all listed keys are accepted,
+which allows rotation. Logged-out tokens are kept in a small revocation list
+until they expire.
 """
 
+import base64
+import hashlib
+import hmac
+import json
 import secrets
+import time
 from datetime import datetime, timedelta
 from typing import Optional, Dict
 import logging
 
+from .config import SESSION_SIGNING_KEYS, SESSION_TTL_DAYS
+
 logger = logging.getLogger(__name__)
 
+TOKEN_VERSION = "v1"
+
+
+def _parse_signing_keys(raw: Optional[str]) -> Dict[str, bytes]:
+    """Parse 'kid:secret,kid2:secret2' into an ordered {kid: key} dict."""
+    keys: Dict[str, bytes] = {}
+    for item in (raw or "").split(","):
+        item = item.strip()
+        if not item:
+            continue
+        kid, sep, secret = item.partition(":")
+        if not sep or not kid or not secret:
+            logger.warning("Ignoring malformed session signing key entry")
+            continue
+        keys[kid.strip()] = secret.strip().encode("utf-8")
+    return keys
+
+
+SIGNING_KEYS: Dict[str, bytes] = _parse_signing_keys(SESSION_SIGNING_KEYS)
+if not SIGNING_KEYS:
+    # Tokens signed with a random key only validate on this instance until restart
+    logger.warning("SESSION_SIGNING_KEYS not configured. Using an ephemeral per-process signing key.")
+    SIGNING_KEYS = {"ephemeral": secrets.token_bytes(32)}
+ACTIVE_KEY_ID = next(iter(SIGNING_KEYS))
+
+# Revocation list: token id -> expiry. Only logged-out, not yet expired tokens are kept.
+SESSION_DB: Dict[str, datetime] = {}
+
 
-# Session storage (in production, use Redis or database)
-SESSION_DB: Dict[str, Dict] = {}
+def _b64encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode("ascii")
+
+
+def _b64decode(data: str) -> bytes:
+    return base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+
+
+def _sign(key: bytes, message: str) -> str:
+    return _b64encode(hmac.new(key, message.encode("ascii"), hashlib.sha256).digest())
+
+
+def _prune_revoked():
+    now = datetime.now()
+    for token_id in [tid for tid, expires in SESSION_DB.items() if expires < now]:
+        del SESSION_DB[token_id]
+
+
+def _decode_token(token: str) -> Optional[Dict]:
+    """Verify a token's signature and return its payload, without checking expiry."""
+    try:
+        version, kid, payload_b64, signature = token.split(".")
+    except (AttributeError, ValueError):
+        return None
+
+    key = SIGNING_KEYS.get(kid)
+    if version != TOKEN_VERSION or key is None:
+        return None
+
+    expected = _sign(key, f"{version}.{kid}.{payload_b64}")
+    if not hmac.compare_digest(expected, signature):
+        return None
+
+    try:
+        return json.loads(_b64decode(payload_b64))
+    except (ValueError, UnicodeDecodeError):
+        return None
 
 
 def create_session_token(participant_code: str) -> str:
     """Create a session token for a participant."""
-    token = secrets.token_urlsafe(32)
-    expiry = datetime.now() + timedelta(days=7)  # 7 days session
-    
-    SESSION_DB[token] = {
-        "participant_code": participant_code,
-        "expires": expiry,
-        "created": datetime.now()
+    issued = int(time.time())
+    expiry = issued + int(timedelta(days=SESSION_TTL_DAYS).total_seconds())
+    payload = {
+        "pc": participant_code,
+        "iat": issued,
+        "exp": expiry,
+        "jti": secrets.token_urlsafe(12),
     }
-    
+    payload_b64 = _b64encode(json.dumps(payload, separators=(",", ":")).encode("utf-8"))
+    signing_input = f"{TOKEN_VERSION}.{ACTIVE_KEY_ID}.{payload_b64}"
+    token = f"{signing_input}.{_sign(SIGNING_KEYS[ACTIVE_KEY_ID], signing_input)}"
+
     logger.info(f"Created session token for participant: {participant_code}")
     return token
 
 
 def validate_session_token(token: str) -> Optional[Dict]:
     """Validate a session token and return participant info."""
-    session = SESSION_DB.get(token)
-    
-    if not session:
+    payload = _decode_token(token)
+
+    if not payload:
         logger.warning("Invalid session token")
         return None
-    
-    if datetime.now() > session["expires"]:
+
+    if time.time() > payload.get("exp", 0):
         # Token expired
-        logger.info(f"Session expired for participant: {session['participant_code']}")
-        del SESSION_DB[token]
+        logger.info(f"Session expired for participant: {payload.get('pc')}")
+        return None
+
+    if payload.get("jti") in SESSION_DB:
+        logger.info(f"Revoked session used for participant: {payload.get('pc')}")
         return None
-    
-    return session
+
+    return {
+        "participant_code": payload["pc"],
+        "expires": datetime.fromtimestamp(payload["exp"]),
+        "created": datetime.fromtimestamp(payload["iat"]),
+        "token_id": payload.get("jti"),
+    }
 
 
 def is_valid_participant_code(code: str) -> bool:
@@ -58,20 +151,22 @@ def is_valid_participant_code(code: str) -> bool:
 def login_participant(participant_code: str) -> Optional[str]:
     """Authenticate a participant and return session token."""
     code = participant_code.upper()
-    
+
     if not is_valid_participant_code(code):
         logger.warning(f"Invalid participant code attempted: {code}")
         return None
-    
+
     token = create_session_token(code)
     return token
 
 
 def logout_participant(token: str) -> bool:
-    """Logout a participant by removing their session."""
-    if token in SESSION_DB:
-        del SESSION_DB[token]
-        logger.info(f"Logged out participant with token")
-        return True
-    return False
+    """Logout a participant by revoking their session token."""
+    session = validate_session_token(token)
+    if not session:
+        return False
 
+    _prune_revoked()
+    SESSION_DB[session["token_id"]] = session["expires"]
+    logger.info(f"Logged out participant with token")
+    return True
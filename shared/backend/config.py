@@ -26,15 +26,28 @@ def get_secret(secret_name: str, default_env: str | None = None) -> str | None:
         return None
 
 
+# Storage backend used for game state, progress and chat logs: "gcs", "local" or "sqlite"
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "gcs").lower()
+# Root directory for the "local" backend
+STORAGE_LOCAL_DIR = os.getenv("STORAGE_LOCAL_DIR", os.path.join(os.getcwd(), ".local", "storage"))
+# Database file for the "sqlite" backend
+STORAGE_SQLITE_PATH = os.getenv("STORAGE_SQLITE_PATH", os.path.join(os.getcwd(), ".local", "storage.sqlite3"))
+# Participants whose learning progress is kept in memory between requests
+PROGRESS_CACHE_MAX_ENTRIES = int(os.getenv("PROGRESS_CACHE_MAX_ENTRIES", "2000"))
+
 # Optional secrets used by both applications
 TELEGRAM_TOKEN = None  # Included for backwards compatibility with bot version
 GROQ_API_KEY = get_secret("groq-api-key", "GROQ_API_KEY")
 GCS_BUCKET_NAME = get_secret("gcs-bucket-name", "GCS_BUCKET_NAME")
+# Comma-separated "kid:secret" pairs; the first key signs new session tokens
+SESSION_SIGNING_KEYS = get_secret("session-signing-keys", "SESSION_SIGNING_KEYS")
+# Lifetime of a session token in days
+SESSION_TTL_DAYS = int(os.getenv("SESSION_TTL_DAYS", "7"))
 
 if not GROQ_API_KEY:
     print("WARNING: GROQ_API_KEY not found. AI features will not work.", file=sys.stderr)
 
-if not GCS_BUCKET_NAME:
+if not GCS_BUCKET_NAME and STORAGE_BACKEND == "gcs":
     print("WARNING: GCS_BUCKET_NAME not found. Cloud storage features disabled.", file=sys.stderr)
 
 
@@ -43,5 +56,11 @@ __all__ = [
     "TELEGRAM_TOKEN",
     "GROQ_API_KEY",
     "GCS_BUCKET_NAME",
+    "SESSION_SIGNING_KEYS",
+    "SESSION_TTL_DAYS",
+    "STORAGE_BACKEND",
+    "STORAGE_LOCAL_DIR",
+    "STORAGE_SQLITE_PATH",
+    "PROGRESS_CACHE_MAX_ENTRIES",
 ]
 
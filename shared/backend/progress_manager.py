@@ -1,33 +1,47 @@
+import copy
 import json
 import datetime
 import logging
+from collections import OrderedDict
 from typing import Dict, Any, Optional, List
-from google.cloud import storage
-from .config import GCS_BUCKET_NAME
+from .config import PROGRESS_CACHE_MAX_ENTRIES
+from .storage_backend import GenerationMismatch, get_storage_backend
 import pytz
 
 logger = logging.getLogger(__name__)
 
+# Progress sections holding {"timestamp", "query", "feedback"} entries, unique per query
+PROGRESS_SECTIONS = ("words_learned", "writing_feedback")
+# Attempts of an upload that conflicts with a write by another instance
+_SAVE_ATTEMPTS = 3
+
+
+def _empty_progress() -> Dict[str, Any]:
+    return {section: [] for section in PROGRESS_SECTIONS}
+
+
 class ProgressManager:
-    """Manages user learning progress using Google Cloud Storage."""
+    """Manages user learning progress using the configured storage backend.
     
-    def __init__(self):
-        self.storage_client = None
-        self.bucket = None
-        
-        if not GCS_BUCKET_NAME:
-            logger.warning("GCS_BUCKET_NAME is not set. Progress tracking is disabled.")
+    Each participant's progress is kept in memory with the storage
+    generation it was read at, a local version that every change increments
+    and the entries not uploaded yet. Before the copy is used, the stored
+    generation is checked (a metadata lookup) and the file is downloaded
+    again only if another instance changed or removed it; a missing file
+    counts as empty progress. A change is uploaded in one conditional write;
+    on a conflict the stored file is read again, the pending entries are
+    added to it and the write retried, so entries removed by a clear are
+    never written back. Nothing is uploaded when an entry is already there.
+    """
     
-    def _get_bucket(self):
-        """Lazy initialization of storage client and bucket."""
-        if self.storage_client is None and GCS_BUCKET_NAME:
-            try:
-                self.storage_client = storage.Client()
-                self.bucket = self.storage_client.bucket(GCS_BUCKET_NAME)
-            except Exception as e:
-                logger.error(f"Failed to initialize GCS bucket '{GCS_BUCKET_NAME}': {e}")
-                self.bucket = None
-        return self.bucket
+    def __init__(self, max_entries: int = PROGRESS_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._cache: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self.stats = {"downloads": 0, "cache_hits": 0, "uploads": 0, "skipped_duplicates": 0, "conflicts": 0}
+    
+    def _get_storage(self):
+        """Return the configured storage backend, or None if progress tracking is disabled."""
+        return get_storage_backend()
     
     def _get_progress_blob_name(self, user_id: int, participant_code: str = None) -> str:
         """Get the blob name for storing user's learning progress.
@@ -44,143 +58,148 @@ class ProgressManager:
                 return f"participant_logs/language_progress/{participant_code}_language_progress.json"
         return f"user_progress/user_{user_id}_progress.json"
     
-    def add_word_learned(self, user_id: int, word: str, definition: str, participant_code: str = None) -> bool:
-        """Add a new word to the user's learned words list."""
-        bucket = self._get_bucket()
-        if not bucket:
-            logger.warning(f"Cannot save word progress for user {user_id}: No storage bucket configured")
-            return False
+    def _load(self, storage, blob_name: str) -> Dict[str, Any]:
+        """The progress entry of a blob, downloading it if the stored file changed since it was cached."""
+        entry = self._cache.get(blob_name)
+        if entry is not None:
+            if storage.get_generation(blob_name) == entry["generation"]:
+                self._cache.move_to_end(blob_name)
+                self.stats["cache_hits"] += 1
+                return entry
+            self._refresh(storage, blob_name, entry)
+            return entry
         
-        try:
-            # Load existing progress
-            progress_data = self.get_user_progress(user_id, participant_code)
-            
-            # Add new word entry
-            cet_tz = pytz.timezone('Europe/Berlin')
-            new_entry = {
-                "timestamp": datetime.datetime.now(cet_tz).isoformat(),
-                "query": word,
-                "feedback": definition
-            }
-            
-            # Check for duplicates
-            if not any(entry.get('query') == word for entry in progress_data.get("words_learned", [])):
-                progress_data.setdefault("words_learned", []).append(new_entry)
-                
-                # Save updated progress
-                return self._save_progress(user_id, progress_data, participant_code)
-            
-            return True  # Word already exists, no need to save
-            
-        except Exception as e:
-            logger.error(f"Failed to add word progress for user {user_id}: {e}")
-            return False
+        entry = {"data": _empty_progress(), "generation": 0, "version": 0, "pending": []}
+        self._refresh(storage, blob_name, entry)
+        self._cache[blob_name] = entry
+        while self.max_entries and len(self._cache) > self.max_entries:
+            self._cache.popitem(last=False)
+        return entry
     
-    def add_writing_feedback(self, user_id: int, user_text: str, feedback: str, participant_code: str = None) -> bool:
-        """Add writing feedback to the user's progress."""
-        bucket = self._get_bucket()
-        if not bucket:
-            logger.warning(f"Cannot save writing feedback for user {user_id}: No storage bucket configured")
+    def _refresh(self, storage, blob_name: str, entry: Dict[str, Any]):
+        """Replace the cached copy with the stored file plus the entries not uploaded yet."""
+        content, entry["generation"] = storage.read_versioned(blob_name)
+        self.stats["downloads"] += 1
+        data = json.loads(content) if content else _empty_progress()
+        # Ensure the structure exists
+        for section in PROGRESS_SECTIONS:
+            data.setdefault(section, [])
+        for section, item in entry["pending"]:
+            if not any(existing.get("query") == item["query"] for existing in data[section]):
+                data[section].append(item)
+        entry["data"] = data
+    
+    def _add_entry(self, user_id: int, section: str, query: str, feedback: str, participant_code: str = None) -> bool:
+        """Add an entry to a progress section unless one with the same query exists."""
+        storage = self._get_storage()
+        if not storage:
+            logger.warning(f"Cannot save {section} progress for user {user_id}: No storage backend configured")
             return False
         
         try:
-            # Load existing progress
-            progress_data = self.get_user_progress(user_id, participant_code)
+            blob_name = self._get_progress_blob_name(user_id, participant_code)
+            entry = self._load(storage, blob_name)
+            
+            # Check for duplicates
+            if any(item.get("query") == query for item in entry["data"][section]):
+                self.stats["skipped_duplicates"] += 1
+                if entry["pending"]:
+                    # An earlier upload failed, try again
+                    return self._save_progress(storage, user_id, blob_name, entry)
+                return True  # Entry already exists, no need to save
             
-            # Add new feedback entry
             cet_tz = pytz.timezone('Europe/Berlin')
-            new_entry = {
+            item = {
                 "timestamp": datetime.datetime.now(cet_tz).isoformat(),
-                "query": user_text,
+                "query": query,
                 "feedback": feedback
             }
-            
-            # Check for duplicates
-            if not any(entry.get('query') == user_text for entry in progress_data.get("writing_feedback", [])):
-                progress_data.setdefault("writing_feedback", []).append(new_entry)
-                
-                # Save updated progress
-                return self._save_progress(user_id, progress_data, participant_code)
-            
-            return True  # Feedback already exists, no need to save
+            entry["data"][section].append(item)
+            entry["pending"].append((section, item))
+            entry["version"] += 1
+            return self._save_progress(storage, user_id, blob_name, entry)
             
         except Exception as e:
-            logger.error(f"Failed to add writing feedback for user {user_id}: {e}")
+            logger.error(f"Failed to add {section} progress for user {user_id}: {e}")
             return False
     
+    def add_word_learned(self, user_id: int, word: str, definition: str, participant_code: str = None) -> bool:
+        """Add a new word to the user's learned words list."""
+        return self._add_entry(user_id, "words_learned", word, definition, participant_code)
+    
+    def add_writing_feedback(self, user_id: int, user_text: str, feedback: str, participant_code: str = None) -> bool:
+        """Add writing feedback to the user's progress."""
+        return self._add_entry(user_id, "writing_feedback", user_text, feedback, participant_code)
+    
     def get_user_progress(self, user_id: int, participant_code: str = None) -> Dict[str, Any]:
         """Get the user's learning progress data."""
-        bucket = self._get_bucket()
-        if not bucket:
-            logger.warning(f"Cannot load progress for user {user_id}: No storage bucket configured")
-            return {"words_learned": [], "writing_feedback": []}
+        storage = self._get_storage()
+        if not storage:
+            logger.warning(f"Cannot load progress for user {user_id}: No storage backend configured")
+            return _empty_progress()
         
         try:
             blob_name = self._get_progress_blob_name(user_id, participant_code)
-            blob = bucket.blob(blob_name)
-            
-            if not blob.exists():
-                logger.info(f"No progress data found for user {user_id}, creating new")
-                return {"words_learned": [], "writing_feedback": []}
-            
-            # Download and parse the progress data
-            content = blob.download_as_text(encoding="utf-8")
-            progress_data = json.loads(content)
-            
-            # Ensure the structure exists
-            if "words_learned" not in progress_data:
-                progress_data["words_learned"] = []
-            if "writing_feedback" not in progress_data:
-                progress_data["writing_feedback"] = []
-            
-            logger.info(f"Successfully loaded progress for user {user_id}")
-            return progress_data
+            # Callers get their own copy of the cached progress
+            return copy.deepcopy(self._load(storage, blob_name)["data"])
             
         except Exception as e:
             logger.error(f"Failed to load progress for user {user_id}: {e}")
-            return {"words_learned": [], "writing_feedback": []}
+            return _empty_progress()
     
-    def _save_progress(self, user_id: int, progress_data: Dict[str, Any], participant_code: str = None) -> bool:
-        """Save progress data to Google Cloud Storage."""
-        bucket = self._get_bucket()
-        if not bucket:
-            logger.warning(f"Cannot save progress for user {user_id}: No storage bucket configured")
-            return False
+    def _save_progress(self, storage, user_id: int, blob_name: str, entry: Dict[str, Any]) -> bool:
+        """Upload the cached progress, rebasing the pending entries on concurrent writes by other instances."""
+        for attempt in range(1, _SAVE_ATTEMPTS + 1):
+            try:
+                entry["generation"] = storage.write_if_generation(
+                    blob_name,
+                    json.dumps(entry["data"], indent=2, ensure_ascii=False),
+                    entry["generation"],
+                    content_type="application/json; charset=utf-8"
+                )
+                break
+            except GenerationMismatch:
+                self.stats["conflicts"] += 1
+                if attempt == _SAVE_ATTEMPTS:
+                    # The pending entries stay in memory and go out with the next change
+                    logger.error(f"Progress for user {user_id} still conflicting after {attempt} attempts")
+                    return False
+                # Start over from the stored file (empty if it was cleared) plus our pending entries
+                self._refresh(storage, blob_name, entry)
+            except Exception as e:
+                logger.error(f"Failed to save progress for user {user_id}: {e}")
+                return False
         
-        try:
-            blob_name = self._get_progress_blob_name(user_id, participant_code)
-            blob = bucket.blob(blob_name)
-            
-            blob.upload_from_string(
-                json.dumps(progress_data, indent=2, ensure_ascii=False),
-                content_type="application/json; charset=utf-8"
-            )
-            
-            logger.info(f"Successfully saved progress for user {user_id}")
-            return True
-            
-        except Exception as e:
-            logger.error(f"Failed to save progress for user {user_id}: {e}")
-            return False
+        entry["pending"] = []
+        self.stats["uploads"] += 1
+        logger.info(f"Successfully saved progress for user {user_id}")
+        return True
     
     def clear_user_progress(self, user_id: int, participant_code: str = None) -> bool:
         """Clear all progress data for a user."""
-        bucket = self._get_bucket()
-        if not bucket:
-            logger.warning(f"Cannot clear progress for user {user_id}: No storage bucket configured")
+        storage = self._get_storage()
+        if not storage:
+            logger.warning(f"Cannot clear progress for user {user_id}: No storage backend configured")
             return False
         
         try:
             blob_name = self._get_progress_blob_name(user_id, participant_code)
-            blob = bucket.blob(blob_name)
-            
-            if blob.exists():
-                blob.delete()
-                logger.info(f"Successfully cleared progress for user {user_id}")
-            else:
-                logger.info(f"No progress to clear for user {user_id}")
-            
-            return True
+            self._cache.pop(blob_name, None)
+            
+            # Delete the version we looked at; if another instance wrote meanwhile, look again
+            for _ in range(_SAVE_ATTEMPTS):
+                generation = storage.get_generation(blob_name)
+                try:
+                    if generation and storage.delete_if_generation(blob_name, generation):
+                        logger.info(f"Successfully cleared progress for user {user_id}")
+                    else:
+                        logger.info(f"No progress to clear for user {user_id}")
+                    return True
+                except GenerationMismatch:
+                    self.stats["conflicts"] += 1
+            
+            logger.error(f"Progress for user {user_id} kept changing, not cleared")
+            return False
             
         except Exception as e:
             logger.error(f"Failed to clear progress for user {user_id}: {e}")
@@ -0,0 +1,439 @@
+"""
+Pluggable object storage used by the game state, progress and chat log code.
+
+Three implementations share one small key/value interface:
+
+- ``gcs``    - Google Cloud Storage bucket (production default)
+- ``local``  - plain files under a directory, for offline runs and benchmarks
+- ``sqlite`` - a single SQLite database in WAL mode, for fast single-node deployments
+
+The backend is selected with the STORAGE_BACKEND setting.
+
+Objects also have a generation that changes on every write, for optimistic
+concurrency between instances: ``read_versioned`` returns it with the
+content, and ``write_if_generation`` only writes if the object is still at
+the generation that was read (0 meaning it must not exist yet), raising
+GenerationMismatch otherwise.
+"""
+
+import os
+import sqlite3
+import threading
+import time
+import uuid
+import logging
+from typing import Dict, Optional, Tuple
+
+from .config import GCS_BUCKET_NAME, STORAGE_BACKEND, STORAGE_LOCAL_DIR, STORAGE_SQLITE_PATH
+
+logger = logging.getLogger(__name__)
+
+TEXT_CONTENT_TYPE = "text/plain; charset=utf-8"
+# Attempts of a GCS append whose compose lost a race with another writer
+GCS_APPEND_ATTEMPTS = 5
+
+
+class GenerationMismatch(Exception):
+    """A conditional write found the object at a different generation than expected."""
+
+
+class StorageBackend:
+    """Interface for storing text objects under slash-separated keys."""
+
+    name = "base"
+
+    def exists(self, key: str) -> bool:
+        raise NotImplementedError
+
+    def read_text(self, key: str) -> Optional[str]:
+        """Return the object's content, or None if it does not exist."""
+        raise NotImplementedError
+
+    def write_text(self, key: str, text: str, content_type: str = TEXT_CONTENT_TYPE) -> None:
+        """Create or replace an object."""
+        raise NotImplementedError
+
+    def append_text(self, key: str, text: str, content_type: str = TEXT_CONTENT_TYPE) -> None:
+        """Append to an object, creating it if needed."""
+        raise NotImplementedError
+
+    def delete(self, key: str) -> bool:
+        """Delete an object. Returns False if it did not exist."""
+        raise NotImplementedError
+
+    def read_versioned(self, key: str) -> Tuple[Optional[str], int]:
+        """Return the object's content and generation, or (None, 0) if it does not exist."""
+        raise NotImplementedError
+
+    def write_if_generation(self, key: str, text: str, generation: int,
+                            content_type: str = TEXT_CONTENT_TYPE) -> int:
+        """Write the object if it is still at ``generation`` (0: if it doesn't exist).
+
+        Returns the new generation; raises GenerationMismatch if the precondition fails.
+        """
+        raise NotImplementedError
+
+    def get_generation(self, key: str) -> int:
+        """Return the object's current generation without downloading it (0 if it does not exist)."""
+        raise NotImplementedError
+
+    def delete_if_generation(self, key: str, generation: int) -> bool:
+        """Delete the object if it is still at ``generation``. Returns False if it did not exist.
+
+        Raises GenerationMismatch if it was written since.
+        """
+        raise NotImplementedError
+
+
+class GCSStorageBackend(StorageBackend):
+    """Objects stored as blobs in a Google Cloud Storage bucket."""
+
+    name = "gcs"
+
+    def __init__(self, bucket_name: str):
+        from google.cloud import storage
+
+        self.bucket_name = bucket_name
+        self.storage_client = storage.Client()
+        self.bucket = self.storage_client.bucket(bucket_name)
+        # Last generation this process wrote or saw per object, saves a metadata request per append
+        self._generations: Dict[str, int] = {}
+
+    def exists(self, key: str) -> bool:
+        return self.bucket.blob(key).exists()
+
+    def read_text(self, key: str) -> Optional[str]:
+        from google.api_core.exceptions import NotFound
+
+        try:
+            return self.bucket.blob(key).download_as_text(encoding="utf-8")
+        except NotFound:
+            return None
+
+    def write_text(self, key: str, text: str, content_type: str = TEXT_CONTENT_TYPE) -> None:
+        blob = self.bucket.blob(key)
+        blob.upload_from_string(text, content_type=content_type)
+        self._generations[key] = blob.generation
+
+    def append_text(self, key: str, text: str, content_type: str = TEXT_CONTENT_TYPE) -> None:
+        """Append with one segment upload plus a server-side compose.
+
+        The compose is conditional on the generation the object was seen at,
+        so two concurrent appends can't both build on the same base; the
+        loser looks up the new generation and composes again.
+        """
+        from google.api_core.exceptions import NotFound, PreconditionFailed
+
+        target = self.bucket.blob(key)
+        target.content_type = content_type
+        segment = None
+        generation = self._generations.get(key)
+        try:
+            for _ in range(GCS_APPEND_ATTEMPTS):
+                if generation is None:
+                    blob = self.bucket.get_blob(key)
+                    generation = blob.generation if blob is not None else 0
+                try:
+                    if generation == 0:
+                        # Create the object, unless another writer just did
+                        target.upload_from_string(text, content_type=content_type, if_generation_match=0)
+                    else:
+                        if segment is None:
+                            segment = self.bucket.blob(f"{key}.segments/{int(time.time() * 1000)}_{uuid.uuid4().hex[:8]}")
+                            segment.upload_from_string(text, content_type=content_type)
+                        target.compose(
+                            [self.bucket.blob(key, generation=generation), segment],
+                            if_generation_match=generation,
+                            if_source_generation_match=[generation, segment.generation],
+                        )
+                    self._generations[key] = target.generation
+                    return
+                except (PreconditionFailed, NotFound):
+                    # Another writer appended, or the object was removed: look it up again
+                    generation = None
+            self._generations.pop(key, None)
+            raise RuntimeError(f"Append to {key} kept conflicting after {GCS_APPEND_ATTEMPTS} attempts")
+        finally:
+            if segment is not None:
+                try:
+                    segment.delete()
+                except Exception as e:
+                    logger.warning(f"Failed to delete append segment {segment.name}: {e}")
+
+    def delete(self, key: str) -> bool:
+        from google.api_core.exceptions import NotFound
+
+        self._generations.pop(key, None)
+        try:
+            self.bucket.blob(key).delete()
+            return True
+        except NotFound:
+            return False
+
+    def read_versioned(self, key: str) -> Tuple[Optional[str], int]:
+        from google.api_core.exceptions import NotFound
+
+        blob = self.bucket.blob(key)
+        try:
+            # The download response headers carry the generation, no metadata request needed
+            text = blob.download_as_text(encoding="utf-8")
+        except NotFound:
+            return None, 0
+        return text, blob.generation or 0
+
+    def write_if_generation(self, key: str, text: str, generation: int,
+                            content_type: str = TEXT_CONTENT_TYPE) -> int:
+        from google.api_core.exceptions import PreconditionFailed
+
+        blob = self.bucket.blob(key)
+        try:
+            blob.upload_from_string(text, content_type=content_type, if_generation_match=generation)
+        except PreconditionFailed as e:
+            raise GenerationMismatch(f"{key} is no longer at generation {generation}") from e
+        self._generations[key] = blob.generation
+        return blob.generation
+
+    def get_generation(self, key: str) -> int:
+        blob = self.bucket.get_blob(key)
+        return blob.generation if blob is not None else 0
+
+    def delete_if_generation(self, key: str, generation: int) -> bool:
+        from google.api_core.exceptions import NotFound, PreconditionFailed
+
+        self._generations.pop(key, None)
+        try:
+            self.bucket.blob(key).delete(if_generation_match=generation)
+            return True
+        except NotFound:
+            return False
+        except PreconditionFailed as e:
+            raise GenerationMismatch(f"{key} is no longer at generation {generation}") from e
+
+
+class LocalStorageBackend(StorageBackend):
+    """Objects stored as files below a root directory."""
+
+    name = "local"
+
+    def __init__(self, root_dir: str):
+        self.root_dir = os.path.abspath(root_dir)
+        os.makedirs(self.root_dir, exist_ok=True)
+        self._lock = threading.Lock()
+
+    def _path(self, key: str) -> str:
+        path = os.path.abspath(os.path.join(self.root_dir, key))
+        if os.path.commonpath([self.root_dir, path]) != self.root_dir:
+            raise ValueError(f"Storage key escapes the storage directory: {key}")
+        return path
+
+    def exists(self, key: str) -> bool:
+        return os.path.isfile(self._path(key))
+
+    def read_text(self, key: str) -> Optional[str]:
+        try:
+            with open(self._path(key), "r", encoding="utf-8") as file:
+                return file.read()
+        except FileNotFoundError:
+            return None
+
+    def write_text(self, key: str, text: str, content_type: str = TEXT_CONTENT_TYPE) -> None:
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write to a temporary file first so readers never see a partial object
+        tmp_path = f"{path}.{uuid.uuid4().hex[:8]}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as file:
+            file.write(text)
+        os.replace(tmp_path, path)
+
+    def append_text(self, key: str, text: str, content_type: str = TEXT_CONTENT_TYPE) -> None:
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self._lock:
+            with open(path, "a", encoding="utf-8") as file:
+                file.write(text)
+
+    def delete(self, key: str) -> bool:
+        try:
+            os.remove(self._path(key))
+            return True
+        except FileNotFoundError:
+            return False
+
+    def _generation(self, path: str) -> int:
+        # The modification time stands in for a generation (checked within this process only)
+        try:
+            return os.stat(path).st_mtime_ns
+        except FileNotFoundError:
+            return 0
+
+    def read_versioned(self, key: str) -> Tuple[Optional[str], int]:
+        path = self._path(key)
+        with self._lock:
+            generation = self._generation(path)
+            text = self.read_text(key)
+        return (text, generation) if text is not None else (None, 0)
+
+    def write_if_generation(self, key: str, text: str, generation: int,
+                            content_type: str = TEXT_CONTENT_TYPE) -> int:
+        path = self._path(key)
+        with self._lock:
+            if self._generation(path) != generation:
+                raise GenerationMismatch(f"{key} is no longer at generation {generation}")
+            self.write_text(key, text, content_type)
+            new_generation = self._generation(path)
+            if new_generation == generation:
+                # Coarse filesystem timestamps: make sure the generation moves on
+                new_generation = generation + 1
+                os.utime(path, ns=(new_generation, new_generation))
+            return new_generation
+
+    def get_generation(self, key: str) -> int:
+        return self._generation(self._path(key))
+
+    def delete_if_generation(self, key: str, generation: int) -> bool:
+        path = self._path(key)
+        with self._lock:
+            current = self._generation(path)
+            if current == 0:
+                return False
+            if current != generation:
+                raise GenerationMismatch(f"{key} is no longer at generation {generation}")
+            return self.delete(key)
+
+
+class SQLiteStorageBackend(StorageBackend):
+    """Objects stored as rows of a single SQLite database in WAL mode."""
+
+    name = "sqlite"
+
+    def __init__(self, db_path: str):
+        self.db_path = os.path.abspath(db_path)
+        os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS objects ("
+            " key TEXT PRIMARY KEY,"
+            " content TEXT NOT NULL,"
+            " content_type TEXT NOT NULL,"
+            " updated REAL NOT NULL,"
+            " generation INTEGER NOT NULL DEFAULT 1)"
+        )
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(objects)")}
+        if "generation" not in columns:
+            self._conn.execute("ALTER TABLE objects ADD COLUMN generation INTEGER NOT NULL DEFAULT 1")
+
+    def exists(self, key: str) -> bool:
+        with self._lock:
+            row = self._conn.execute("SELECT 1 FROM objects WHERE key = ?", (key,)).fetchone()
+        return row is not None
+
+    def read_text(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute("SELECT content FROM objects WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def write_text(self, key: str, text: str, content_type: str = TEXT_CONTENT_TYPE) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO objects (key, content, content_type, updated) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET content = excluded.content, "
+                "content_type = excluded.content_type, updated = excluded.updated, "
+                "generation = objects.generation + 1",
+                (key, text, content_type, time.time()),
+            )
+
+    def append_text(self, key: str, text: str, content_type: str = TEXT_CONTENT_TYPE) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO objects (key, content, content_type, updated) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET content = objects.content || excluded.content, "
+                "updated = excluded.updated, generation = objects.generation + 1",
+                (key, text, content_type, time.time()),
+            )
+
+    def delete(self, key: str) -> bool:
+        with self._lock:
+            cursor = self._conn.execute("DELETE FROM objects WHERE key = ?", (key,))
+        return cursor.rowcount > 0
+
+    def read_versioned(self, key: str) -> Tuple[Optional[str], int]:
+        with self._lock:
+            row = self._conn.execute("SELECT content, generation FROM objects WHERE key = ?", (key,)).fetchone()
+        return (row[0], row[1]) if row else (None, 0)
+
+    def write_if_generation(self, key: str, text: str, generation: int,
+                            content_type: str = TEXT_CONTENT_TYPE) -> int:
+        with self._lock:
+            if generation == 0:
+                cursor = self._conn.execute(
+                    "INSERT INTO objects (key, content, content_type, updated, generation) VALUES (?, ?, ?, ?, 1) "
+                    "ON CONFLICT(key) DO NOTHING",
+                    (key, text, content_type, time.time()),
+                )
+            else:
+                cursor = self._conn.execute(
+                    "UPDATE objects SET content = ?, content_type = ?, updated = ?, generation = generation + 1 "
+                    "WHERE key = ? AND generation = ?",
+                    (text, content_type, time.time(), key, generation),
+                )
+        if cursor.rowcount == 0:
+            raise GenerationMismatch(f"{key} is no longer at generation {generation}")
+        return generation + 1
+
+    def get_generation(self, key: str) -> int:
+        with self._lock:
+            row = self._conn.execute("SELECT generation FROM objects WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else 0
+
+    def delete_if_generation(self, key: str, generation: int) -> bool:
+        with self._lock:
+            cursor = self._conn.execute("DELETE FROM objects WHERE key = ? AND generation = ?", (key, generation))
+            if cursor.rowcount == 0:
+                exists = self._conn.execute("SELECT 1 FROM objects WHERE key = ?", (key,)).fetchone()
+                if exists:
+                    raise GenerationMismatch(f"{key} is no longer at generation {generation}")
+                return False
+        return True
+
+
+_backend: Optional[StorageBackend] = None
+_backend_initialized = False
+_backend_lock = threading.Lock()
+
+
+def create_storage_backend(kind: str = STORAGE_BACKEND) -> Optional[StorageBackend]:
+    """Create a backend of the given kind. Returns None if storage is not configured."""
+    kind = (kind or "gcs").lower()
+    if kind == "local":
+        return LocalStorageBackend(STORAGE_LOCAL_DIR)
+    if kind == "sqlite":
+        return SQLiteStorageBackend(STORAGE_SQLITE_PATH)
+    if kind == "gcs":
+        if not GCS_BUCKET_NAME:
+            return None
+        return GCSStorageBackend(GCS_BUCKET_NAME)
+    logger.error(f"Unknown STORAGE_BACKEND '{kind}'. Storage is disabled.")
+    return None
+
+
+def get_storage_backend() -> Optional[StorageBackend]:
+    """Lazily create and return the process-wide storage backend (None if disabled).
+
+    Initialization errors are logged and retried on the next call.
+    """
+    global _backend, _backend_initialized
+    if not _backend_initialized:
+        with _backend_lock:
+            if not _backend_initialized:
+                try:
+                    _backend = create_storage_backend()
+                except Exception as e:
+                    logger.error(f"Failed to initialize '{STORAGE_BACKEND}' storage backend: {e}")
+                    return None
+                _backend_initialized = True
+                if _backend is not None:
+                    logger.info(f"Using '{_backend.name}' storage backend")
+    return _backend